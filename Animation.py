@@ -0,0 +1,425 @@
+"""
+Keyframe animation of Component hierarchies.
+A clip is a set of tracks, each animating one channel of one component addressed by its path (see
+Component.getComponent). Tracks of the same kind are packed into padded arrays, so sampling a clip at a time is a
+handful of array operations over all tracks: linear interpolation for angles, positions and scales, slerp for
+quaternion rotations. The player applies each sample to the hierarchy in one batched update.
+"""
+
+import time
+
+import numpy as np
+
+from Point import Point
+from Quaternion import Quaternion, QuaternionArray
+
+
+class Track:
+    """
+    Keyframes of one channel of one component
+    """
+    # channel -> number of floats per keyframe value
+    CHANNELS = {"u": 1, "v": 1, "w": 1, "position": 3, "scale": 3, "rotation": 4}
+
+    path = ""  # component path relative to the animated root
+    channel = None  # one of CHANNELS
+    times = None  # (K,) increasing keyframe times in seconds
+    values = None  # (K, D) keyframe values, angles in degrees, rotations as (s, v0, v1, v2)
+
+    def __init__(self, path, channel, times, values):
+        """
+        :param path: component path, e.g. "tail/needle"
+        :type path: str
+        :param channel: "u", "v" or "w" for the current angle about that axis, "position", "scale", \
+            or "rotation" for a quaternion
+        :type channel: str
+        :param times: keyframe times in seconds
+        :type times: list or numpy.ndarray
+        :param values: one value per keyframe
+        :type values: list or numpy.ndarray
+        """
+        if channel not in self.CHANNELS:
+            raise ValueError(f"unknown channel {channel}, expected one of {list(self.CHANNELS)}")
+        size = self.CHANNELS[channel]
+        if channel == "rotation":
+            values = [(q.s, *q.v) if isinstance(q, Quaternion) else q for q in values]
+        self.path = path
+        self.channel = channel
+        self.times = np.asarray(times, dtype=np.float64).reshape(-1)
+        self.values = np.asarray(values, dtype=np.float64).reshape(len(self.times), size)
+        if len(self.times) == 0:
+            raise ValueError("a track needs at least one keyframe")
+        order = np.argsort(self.times, kind="stable")
+        self.times = self.times[order]
+        self.values = self.values[order]
+        if channel == "rotation":
+            self.values = QuaternionArray(self.values, copy=False).normalize().data
+
+
+class TrackGroup:
+    """
+    Tracks with values of the same size, packed into arrays padded to the longest track
+    """
+    tracks = None  # list<Track>
+    times = None  # (T, K) keyframe times, padded with +inf
+    values = None  # (T, K, D) keyframe values, padded with each track's last value
+    keyCounts = None  # (T,) number of keyframes of every track
+
+    def __init__(self, tracks):
+        """
+        :param tracks: tracks whose values all have the same size
+        :type tracks: list<Track>
+        """
+        self.tracks = tracks
+        self.keyCounts = np.array([len(t.times) for t in tracks], dtype=np.intp)
+        keys = int(self.keyCounts.max())
+        size = tracks[0].values.shape[1]
+        self.times = np.full((len(tracks), keys), np.inf)
+        self.values = np.empty((len(tracks), keys, size))
+        for i, track in enumerate(tracks):
+            k = len(track.times)
+            self.times[i, :k] = track.times
+            self.values[i, :k] = track.values
+            self.values[i, k:] = track.values[-1]
+
+    def sample(self, t, spherical=False):
+        """
+        Value of every track at time t, holding the first and last keyframes outside their range
+
+        :param t: time in seconds
+        :type t: float
+        :param spherical: slerp quaternion values instead of interpolating linearly
+        :type spherical: bool
+        :rtype: numpy.ndarray (T, D)
+        """
+        rows = np.arange(len(self.tracks))
+        # index of the last keyframe at or before t, and the one after it
+        k0 = np.clip((self.times <= t).sum(axis=1) - 1, 0, self.keyCounts - 1)
+        k1 = np.minimum(k0 + 1, self.keyCounts - 1)
+        t0 = self.times[rows, k0]
+        t1 = self.times[rows, k1]
+        span = np.where(k1 > k0, t1 - t0, 1.0)
+        alpha = np.clip(np.where(k1 > k0, (t - t0) / span, 0.0), 0.0, 1.0)
+        v0 = self.values[rows, k0]
+        v1 = self.values[rows, k1]
+        if spherical:
+            return QuaternionArray(v0, copy=False).slerp(QuaternionArray(v1, copy=False), alpha).data
+        return v0 + alpha[:, None] * (v1 - v0)
+
+
+class Clip:
+    """
+    A named set of tracks, sampled all at once
+    """
+    name = ""
+    tracks = None  # list<Track>
+    duration = 0.0  # seconds, the last keyframe time unless given
+    fixedDuration = False  # duration was given explicitly and doesn't follow the tracks
+    groups = None  # dict, "angles", "position", "scale" or "rotation" -> TrackGroup, built on first sample
+
+    def __init__(self, name, tracks=None, duration=None):
+        """
+        :param name: clip name
+        :type name: str
+        :param tracks: initial tracks
+        :type tracks: list<Track>
+        :param duration: length of the clip in seconds, defaults to the last keyframe time
+        :type duration: float or None
+        """
+        self.name = name
+        self.tracks = []
+        self.groups = None
+        self.duration = 0.0 if duration is None else duration
+        self.fixedDuration = duration is not None
+        for track in tracks or []:
+            self.addTrack(track)
+
+    def addTrack(self, track):
+        """
+        :type track: Track
+        :return: the added track
+        :rtype: Track
+        """
+        self.tracks.append(track)
+        self.groups = None
+        if not self.fixedDuration:
+            self.duration = max(self.duration, float(track.times[-1]))
+        return track
+
+    @classmethod
+    def fromPoses(cls, name, keyframes, duration=None):
+        """
+        Build a clip from poses at given times. Every (path, channel) appearing in any pose becomes one track,
+        keyed at the times of the poses that mention it
+
+        :param name: clip name
+        :type name: str
+        :param keyframes: (time, pose) pairs. Poses use the format of Component.applyPose, plus "rotation" \
+            (a Quaternion or (s, v0, v1, v2)) as a channel
+        :type keyframes: list<tuple[float, dict]>
+        :param duration: see __init__
+        :rtype: Clip
+        """
+        keys = {}
+        for t, pose in keyframes:
+            for path, changes in pose.items():
+                for channel, value in changes.items():
+                    keys.setdefault((path, channel), []).append((t, value))
+        clip = cls(name, duration=duration)
+        for (path, channel), frames in keys.items():
+            clip.addTrack(Track(path, channel, [t for t, _ in frames], [value for _, value in frames]))
+        return clip
+
+    def getGroups(self):
+        """
+        Tracks packed by kind: the u, v and w angle tracks together, then one group per vector channel
+
+        :rtype: dict[str, TrackGroup]
+        """
+        if self.groups is None:
+            kinds = {}
+            for track in self.tracks:
+                kind = "angles" if track.channel in ("u", "v", "w") else track.channel
+                kinds.setdefault(kind, []).append(track)
+            self.groups = {kind: TrackGroup(tracks) for kind, tracks in kinds.items()}
+        return self.groups
+
+    def sample(self, t):
+        """
+        Values of every track at time t
+
+        :param t: time in seconds, clamped to the clip
+        :type t: float
+        :return: kind -> (T, D) values, in the track order of getGroups
+        :rtype: dict[str, numpy.ndarray]
+        """
+        t = min(max(t, 0.0), self.duration)
+        return {kind: group.sample(t, kind == "rotation") for kind, group in self.getGroups().items()}
+
+
+class AnimationPlayer:
+    """
+    Plays one clip at a time on a Component hierarchy.
+    Call tick() once per frame; isPlaying can be registered as a FrameScheduler animation source, so frames keep
+    coming only while a clip runs
+    """
+    root = None  # Component the clip paths are relative to
+    clip = None  # Clip
+    currentTime = 0.0  # position in the clip in seconds
+    speed = 1.0  # playback rate, negative plays backwards
+    loop = False
+    playing = False
+    lastTick = None  # clock time of the previous tick
+
+    # bound to the current clip and the scene storage it was resolved in
+    boundScene = None
+    angleRows = None  # (T,) scene rows of the angle tracks
+    angleAxes = None  # (T,) 0, 1 or 2 for u, v, w
+    angleRanges = None  # (T, 2) rotation extents the angles are clamped to
+    components = None  # kind -> list<Component>, one per track of that kind
+
+    # statistics
+    lastSampleTime = 0.0  # seconds spent sampling and applying the clip in the last tick
+    totalSampleTime = 0.0
+    samples = 0
+
+    def __init__(self, root, clock=time.perf_counter):
+        """
+        :param root: top of the animated hierarchy
+        :type root: Component
+        :param clock: function returning the current time in seconds
+        """
+        self.root = root
+        self.clock = clock
+        self.resetStats()
+
+    def play(self, clip, speed=None, loop=None, start=None):
+        """
+        Start playing a clip from its start (or end, when the speed is negative)
+
+        :type clip: Clip
+        :param speed: new playback rate, keeps the current one if None
+        :param loop: new loop setting, keeps the current one if None
+        :param start: clip time to start at
+        :type start: float or None
+        """
+        if speed is not None:
+            self.speed = speed
+        if loop is not None:
+            self.loop = loop
+        if clip is not self.clip:
+            self.clip = clip
+            self.boundScene = None
+        if start is None:
+            start = clip.duration if self.speed < 0 else 0.0
+        self.currentTime = start
+        self.playing = True
+        self.lastTick = None
+
+    def transition(self, pose, duration, name="transition"):
+        """
+        Animate from the current state of the components in pose to pose
+
+        :param pose: target pose, see Clip.fromPoses
+        :type pose: dict[str, dict]
+        :param duration: seconds
+        :type duration: float
+        :return: the clip being played
+        :rtype: Clip
+        """
+        current = {}
+        for path, changes in pose.items():
+            c = self.root.getComponent(path)
+            state = {}
+            for channel in changes:
+                if channel in ("u", "v", "w"):
+                    state[channel] = getattr(c, channel + "Angle")
+                elif channel == "position":
+                    state[channel] = np.array(c.currentPos.getCoords(), dtype=float)
+                elif channel == "scale":
+                    state[channel] = list(c.currentScaling)
+                elif channel == "rotation":
+                    state[channel] = c.quat if c.quat is not None else Quaternion()
+            current[path] = state
+        clip = Clip.fromPoses(name, [(0.0, current), (duration, pose)])
+        self.play(clip, speed=1.0, loop=False)
+        return clip
+
+    def stop(self):
+        self.playing = False
+        self.lastTick = None
+
+    def isPlaying(self):
+        return self.playing
+
+    def seek(self, t):
+        """
+        Jump to clip time t and apply the pose there right away
+        """
+        self.currentTime = t
+        self.apply()
+
+    def tick(self, now=None):
+        """
+        Advance by the time passed since the last tick, scaled by speed, and apply the pose
+
+        :param now: clock time, read from the clock if None
+        :type now: float
+        :return: True while the clip keeps playing
+        :rtype: bool
+        """
+        if not self.playing or self.clip is None:
+            return False
+        if now is None:
+            now = self.clock()
+        if self.lastTick is not None:
+            self.currentTime += (now - self.lastTick) * self.speed
+        self.lastTick = now
+
+        duration = self.clip.duration
+        if self.loop and duration > 0:
+            self.currentTime %= duration
+        elif self.currentTime >= duration or (self.currentTime <= 0 and self.speed < 0):
+            self.currentTime = min(max(self.currentTime, 0.0), duration)
+            self.playing = False
+        self.apply()
+        return self.playing
+
+    def bind(self, scene):
+        """
+        Resolve the clip's component paths and scene rows
+        """
+        self.components = {}
+        for kind, group in self.clip.getGroups().items():
+            self.components[kind] = [self.root.getComponent(track.path) for track in group.tracks]
+        angleComponents = self.components.get("angles", [])
+        angleTracks = self.clip.getGroups()["angles"].tracks if angleComponents else []
+        self.angleRows = np.array([c._index for c in angleComponents], dtype=np.intp)
+        self.angleAxes = np.array(["uvw".index(t.channel) for t in angleTracks], dtype=np.intp)
+        self.angleRanges = np.array([(c.uRange, c.vRange, c.wRange)["uvw".index(t.channel)]
+                                     for c, t in zip(angleComponents, angleTracks)], dtype=np.float64).reshape(-1, 2)
+        self.boundScene = scene
+
+    def apply(self):
+        """
+        Sample the clip at the current time and write it into the hierarchy with one update
+        """
+        start = time.perf_counter()
+        values = self.clip.sample(self.currentTime)
+        with self.root.batchUpdate():
+            scene = self.root.getSceneGraph()
+            if scene is not self.boundScene:
+                self.bind(scene)
+            if "angles" in values:
+                # clamped to the rotation extents, like setCurrentAngle
+                angles = np.clip(values["angles"][:, 0], self.angleRanges[:, 0], self.angleRanges[:, 1])
+                scene.angles[self.angleRows, self.angleAxes] = angles
+                scene.dirty[self.angleRows] = True
+            for c, position in zip(self.components.get("position", []), values.get("position", [])):
+                c.currentPos = Point(position)
+            for c, scale in zip(self.components.get("scale", []), values.get("scale", [])):
+                c.currentScaling = [float(s) for s in scale]
+            for c, q in zip(self.components.get("rotation", []), values.get("rotation", [])):
+                c.quat = Quaternion(*map(float, q))
+            self.root.update()
+        self.lastSampleTime = time.perf_counter() - start
+        self.totalSampleTime += self.lastSampleTime
+        self.samples += 1
+
+    def resetStats(self):
+        self.lastSampleTime = 0.0
+        self.totalSampleTime = 0.0
+        self.samples = 0
+
+    def getStats(self):
+        """
+        Sampling cost since the last resetStats
+
+        :rtype: dict
+        """
+        return {
+            "samples": self.samples,
+            "lastSampleTime": self.lastSampleTime,
+            "averageSampleTime": self.totalSampleTime / max(1, self.samples),
+        }
+
+
+if __name__ == "__main__":
+    from ModelLinkage import Spider
+
+    class NoShader:
+        def use(self):
+            pass
+
+    spider = Spider(None, Point((0, 0, 0)), NoShader())
+    spider.update(np.identity(4))
+
+    # a walk cycle over every joint of the six legs, plus the tail
+    legPaths = [f"body/{side}Leg{i}/{link}" for side in ("left", "right") for i in (1, 2, 3)
+                for link in ("link1", "link2", "link3")]
+    frames = []
+    for t in np.linspace(0, 1, 9):
+        swing = 20 * np.sin(2 * np.pi * t)
+        pose = {path: {"u": -50 + swing if path.endswith("link1") else 100 - swing, "v": swing / 2}
+                for path in legPaths}
+        pose["tail"] = {"u": swing, "rotation": Quaternion(np.cos(t), 0, np.sin(t), 0)}
+        frames.append((float(t), pose))
+    clip = Clip.fromPoses("walk", frames)
+
+    player = AnimationPlayer(spider)
+    player.play(clip, loop=True)
+    frameCount = 600
+    for frame in range(frameCount):
+        player.tick(frame / 60)
+    stats = player.getStats()
+    print(f"{len(clip.tracks)} tracks: {1e6 * stats['averageSampleTime']:.0f} us per frame to sample and apply")
+
+    # the same poses through one setCurrentAngle call per joint and axis
+    channels = [(spider.getComponent(t.path), t) for t in clip.tracks if t.channel in ("u", "v", "w")]
+    start = time.perf_counter()
+    for frame in range(frameCount):
+        t = (frame / 60) % clip.duration
+        for c, track in channels:
+            axis = c.axisBucket["uvw".index(track.channel)]
+            c.setCurrentAngle(float(np.interp(t, track.times, track.values[:, 0])), axis)
+    print(f"per-event setCurrentAngle: {1e6 * (time.perf_counter() - start) / frameCount:.0f} us per frame")
@@ -0,0 +1,245 @@
+"""
+Headless forward kinematics for many poses at once.
+A BatchFK takes a snapshot of a hierarchy's SceneGraph and evaluates world transforms for a whole matrix of joint
+angles with batched numpy math, without touching the live components or needing a GL context. Large batches can be
+evaluated in chunks, optionally spread over a process pool.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from GLUtility import GLUtility
+from Quaternion import QuaternionArray
+
+
+class BatchFK:
+    """
+    Snapshot of a hierarchy's transform state. Every pose column is one joint, a (component, axis) pair, whose
+    angle replaces the snapshot's current angle about that axis. Everything else keeps its snapshot value
+    """
+    AXES = "uvw"
+
+    nodes = None  # list<Component>, the scene rows at snapshot time; not pickled
+    paths = None  # list<str>, component path of every row, "" for the root
+    joints = None  # list<(int, int)>, (row, axis) of every pose column
+    jointRows = None  # (J,) row of every pose column
+    jointAxes = None  # (J,) 0, 1 or 2 for u, v, w
+    jointRanges = None  # (J, 2) rotation extents every column is clamped to
+
+    parents = None  # (N,) parent row, -1 for the root
+    levels = None  # list<(start, end)>, rows of every depth level
+    positions = None  # (N, 3)
+    scales = None  # (N, 3)
+    angles = None  # (N, 3) snapshot angles in degrees
+    axes = None  # (N, 3, 3)
+    quatRotations = None  # (N, 3, 3) rotation of rows driven by a quaternion, which poses don't change
+    useQuat = None  # (N,) bool
+    preMats = None  # (N, 4, 4)
+    postMats = None  # (N, 4, 4)
+    rootParentMat = None  # (4, 4)
+
+    def __init__(self, root, joints=None):
+        """
+        :param root: any component of the hierarchy; the whole hierarchy is snapshotted
+        :type root: Component
+        :param joints: pose columns as (component path relative to the top-level component, axis) pairs, \
+            axis being "u", "v" or "w". Every axis of every component in scene order if None
+        :type joints: list<tuple[str, str]> or None
+        """
+        top = root.getRoot()
+        top.update()
+        scene = top.getSceneGraph()
+        self.nodes = list(scene.nodes)
+        self.paths = self.componentPaths(top, scene)
+        self.parents = scene.parents.copy()
+        self.levels = list(scene.levels)
+        self.positions = scene.positions.copy()
+        self.scales = scene.scales.copy()
+        self.angles = scene.angles.copy()
+        self.axes = scene.axes.copy()
+        self.useQuat = scene.useQuat.copy()
+        self.quatRotations = np.tile(np.identity(3), (len(self.nodes), 1, 1))
+        if self.useQuat.any():
+            self.quatRotations[self.useQuat] = QuaternionArray(
+                scene.quats[self.useQuat]).toMatrix3().transpose(0, 2, 1)
+        self.preMats = scene.preMats.copy()
+        self.postMats = scene.postMats.copy()
+        self.rootParentMat = scene.rootParentMat.copy()
+
+        if joints is None:
+            self.joints = [(row, axis) for row in range(len(self.nodes)) for axis in range(3)]
+        else:
+            rows = {id(node): i for i, node in enumerate(self.nodes)}
+            self.joints = [(rows[id(top.getComponent(path))], self.AXES.index(axis)) for path, axis in joints]
+        self.jointRows = np.array([row for row, _ in self.joints], dtype=np.intp)
+        self.jointAxes = np.array([axis for _, axis in self.joints], dtype=np.intp)
+        self.jointRanges = np.array([(self.nodes[row].uRange, self.nodes[row].vRange, self.nodes[row].wRange)[axis]
+                                     for row, axis in self.joints], dtype=np.float64).reshape(-1, 2)
+
+    def __getstate__(self):
+        # workers only need the arrays, not the live components
+        state = dict(self.__dict__)
+        state["nodes"] = None
+        return state
+
+    @staticmethod
+    def componentPaths(top, scene):
+        """
+        Path of every scene row as used by Component.getComponent, built from the componentDict names.
+        Rows that can't be reached by name get None
+
+        :rtype: list<str or None>
+        """
+        rows = {id(node): i for i, node in enumerate(scene.nodes)}
+        paths = [None] * len(scene.nodes)
+        paths[0] = ""
+        stack = [top]
+        while stack:
+            node = stack.pop()
+            prefix = paths[rows[id(node)]]
+            for name, child in (node.componentDict or {}).items():
+                row = rows.get(id(child))
+                if row is not None and paths[row] is None:
+                    paths[row] = f"{prefix}/{name}" if prefix else name
+                    stack.append(child)
+        return paths
+
+    @property
+    def jointNames(self):
+        """
+        "path:axis" label of every pose column
+
+        :rtype: list<str>
+        """
+        return [f"{self.paths[row]}:{self.AXES[axis]}" for row, axis in self.joints]
+
+    def currentPose(self):
+        """
+        The snapshot's angles as one pose row
+
+        :rtype: numpy.ndarray (J,)
+        """
+        return np.array([self.angles[row, axis] for row, axis in self.joints])
+
+    def clampPoses(self, poses):
+        """
+        :param poses: joint angles in degrees
+        :type poses: numpy.ndarray (P, J)
+        :return: poses clamped to every joint's rotation extent, as setCurrentAngle does
+        :rtype: numpy.ndarray (P, J)
+        """
+        poses = np.asarray(poses, dtype=np.float64).reshape(-1, len(self.joints))
+        return np.clip(poses, self.jointRanges[:, 0], self.jointRanges[:, 1])
+
+    def evaluate(self, poses, chunkSize=None, processes=None):
+        """
+        World transforms of every component for every pose
+
+        :param poses: joint angles in degrees, one row per pose, columns as in joints
+        :type poses: numpy.ndarray (P, J)
+        :param chunkSize: poses evaluated at once, bounding the temporary memory. All at once if None
+        :type chunkSize: int or None
+        :param processes: number of worker processes to spread the chunks over, no pool if None or 1
+        :type processes: int or None
+        :return: row-major world matrices in scene order
+        :rtype: numpy.ndarray (P, N, 4, 4)
+        """
+        poses = self.clampPoses(poses)
+        result = np.empty((len(poses), len(self.parents), 4, 4))
+        for start, worldMats in self.evaluateChunks(poses, chunkSize, processes, clamp=False):
+            result[start:start + len(worldMats)] = worldMats
+        return result
+
+    def evaluateChunks(self, poses, chunkSize=None, processes=None, clamp=True):
+        """
+        Evaluate poses chunk by chunk, for batches whose results don't fit in memory at once
+
+        :param poses: see evaluate
+        :param chunkSize: see evaluate
+        :param processes: see evaluate
+        :param clamp: clamp the poses to the rotation extents first
+        :type clamp: bool
+        :return: (first pose index, world matrices of the chunk) pairs, in order
+        :rtype: generator
+        """
+        if clamp:
+            poses = self.clampPoses(poses)
+        else:
+            poses = np.asarray(poses, dtype=np.float64).reshape(-1, len(self.joints))
+        chunkSize = max(1, chunkSize or len(poses))
+        starts = range(0, len(poses), chunkSize)
+        chunks = (poses[start:start + chunkSize] for start in starts)
+        if processes is None or processes <= 1 or len(starts) <= 1:
+            for start, chunk in zip(starts, chunks):
+                yield start, self.evaluateClamped(chunk)
+            return
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for start, worldMats in zip(starts, pool.map(self.evaluateClamped, chunks)):
+                yield start, worldMats
+
+    def evaluateClamped(self, poses):
+        """
+        World transforms for poses already clamped to the rotation extents
+
+        :type poses: numpy.ndarray (P, J)
+        :rtype: numpy.ndarray (P, N, 4, 4)
+        """
+        p, n = len(poses), len(self.parents)
+        angles = np.broadcast_to(self.angles, (p, n, 3)).copy()
+        angles[:, self.jointRows, self.jointAxes] = poses
+
+        rotations = GLUtility.rotateBatch(angles.reshape(-1, 3),
+                                          np.broadcast_to(self.axes, (p, n, 3, 3)).reshape(-1, 3, 3))
+        rotations = rotations.reshape(p, n, 3, 3)
+        if self.useQuat.any():
+            # quaternions override the Euler angles
+            rotations[:, self.useQuat] = self.quatRotations[self.useQuat]
+        tsr = GLUtility.trsBatch(np.broadcast_to(self.positions, (p, n, 3)).reshape(-1, 3),
+                                 np.broadcast_to(self.scales, (p, n, 3)).reshape(-1, 3),
+                                 rotations.reshape(-1, 3, 3)).reshape(p, n, 4, 4)
+        localMats = self.postMats @ tsr @ self.preMats
+
+        worldMats = np.empty_like(localMats)
+        worldMats[:, 0] = self.rootParentMat @ localMats[:, 0]
+        for start, end in self.levels[1:]:
+            np.matmul(worldMats[:, self.parents[start:end]], localMats[:, start:end], out=worldMats[:, start:end])
+        return worldMats
+
+
+if __name__ == "__main__":
+    import time
+
+    from ModelLinkage import Spider
+    from Point import Point
+
+    spider = Spider(None, Point((0, 0, 0)), None)
+    fk = BatchFK(spider)
+    print(f"{len(fk.nodes)} components, {len(fk.joints)} joints")
+
+    # the current pose must give back the live hierarchy's transforms
+    worldMats = fk.evaluate(fk.currentPose()[None])
+    print(f"current pose error: {np.abs(worldMats[0] - spider.getSceneGraph().worldMats).max():.2e}")
+
+    rng = np.random.default_rng(0)
+    poseCount = 20000
+    poses = fk.currentPose() + rng.uniform(-30, 30, (poseCount, len(fk.joints)))
+    start = time.perf_counter()
+    fk.evaluate(poses, chunkSize=2000)
+    batched = time.perf_counter() - start
+    print(f"{poseCount} poses batched: {batched:.2f} s, {1e6 * batched / poseCount:.1f} us per pose")
+
+    start = time.perf_counter()
+    liveCount = 200
+    clamped = fk.clampPoses(poses[:liveCount])
+    for pose in clamped:
+        with spider.batchUpdate():
+            for (row, axis), angle in zip(fk.joints, pose):
+                c = fk.nodes[row]
+                c.setCurrentAngle(angle, c.axisBucket[axis])
+    live = (time.perf_counter() - start) / liveCount
+    print(f"live components: {1e6 * live:.0f} us per pose")
+
+    start = time.perf_counter()
+    fk.evaluate(poses, chunkSize=2000, processes=4)
+    print(f"{poseCount} poses over 4 processes: {time.perf_counter() - start:.2f} s")
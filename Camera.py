@@ -0,0 +1,233 @@
+"""
+Orbit camera with cached matrices.
+The camera circles lookAtPt at a distance, at angles theta around the vertical axis and phi above the horizontal
+plane. View, projection, their product, its inverse, the view frustum and the level-of-detail data are computed on
+first use after a change and shared by drawing, unprojection, culling and level of detail until the next change.
+"""
+
+import math
+
+import numpy as np
+
+from Frustum import Frustum
+from GLUtility import GLUtility
+from LOD import LODView
+
+
+class Camera:
+    """
+    Matrices returned by viewMat and projectionMat are column major, as uploaded to the shader.
+    viewProjectionMat and its inverse are row major, for math on the CPU.
+
+    Parameters must be assigned as a whole, e.g. camera.lookAtPt = [x, y, z]; changing the returned lists in place
+    doesn't invalidate the cached matrices. Call invalidateProjection after changing fov, znear or zfar
+    """
+    fov = 45  # vertical field of view in degrees
+    znear = 0.01
+    zfar = 100
+
+    _lookAtPt = None  # list<float>(3)
+    _upVector = None  # list<float>(3)
+    _distance = 6.0
+    _theta = 0.0  # angle around the vertical axis, in range [0, 2pi]
+    _phi = 0.0  # angle above the horizontal plane, in range [-pi/2, pi/2]
+    width = 1  # viewport size in pixels
+    height = 1
+
+    viewVersion = 0  # incremented whenever the view matrix changes
+    projectionVersion = 0  # incremented whenever the projection matrix changes
+
+    _position = None
+    _viewMat = None
+    _projectionMat = None
+    _viewProjectionMat = None
+    _inverseViewProjectionMat = None
+    _frustum = None
+    _lodView = None
+
+    def __init__(self, lookAtPt=(0, 0, 0), upVector=(0, 1, 0), distance=6.0, theta=0.0, phi=0.0):
+        # the view matrix keeps the up axis of the previous frame when looking straight along upVector
+        self.glutility = GLUtility()
+        self._lookAtPt = list(lookAtPt)
+        self._upVector = list(upVector)
+        self._distance = distance
+        self._theta = theta
+        self._phi = phi
+        self.invalidateView()
+        self.invalidateProjection()
+
+    def invalidateView(self):
+        """
+        Drop everything derived from the camera placement
+        """
+        self._position = None
+        self._viewMat = None
+        self._viewProjectionMat = None
+        self._inverseViewProjectionMat = None
+        self._frustum = None
+        self._lodView = None
+        self.viewVersion += 1
+
+    def invalidateProjection(self):
+        """
+        Drop everything derived from the projection
+        """
+        self._projectionMat = None
+        self._viewProjectionMat = None
+        self._inverseViewProjectionMat = None
+        self._frustum = None
+        self._lodView = None
+        self.projectionVersion += 1
+
+    @property
+    def lookAtPt(self):
+        return self._lookAtPt
+
+    @lookAtPt.setter
+    def lookAtPt(self, point):
+        point = [float(c) for c in point]
+        if point != self._lookAtPt:
+            self._lookAtPt = point
+            self.invalidateView()
+
+    @property
+    def upVector(self):
+        return self._upVector
+
+    @upVector.setter
+    def upVector(self, vector):
+        vector = [float(c) for c in vector]
+        if vector != self._upVector:
+            self._upVector = vector
+            self.invalidateView()
+
+    @property
+    def distance(self):
+        return self._distance
+
+    @distance.setter
+    def distance(self, distance):
+        if distance != self._distance:
+            self._distance = distance
+            self.invalidateView()
+
+    @property
+    def theta(self):
+        return self._theta
+
+    @theta.setter
+    def theta(self, theta):
+        if theta != self._theta:
+            self._theta = theta
+            self.invalidateView()
+
+    @property
+    def phi(self):
+        return self._phi
+
+    @phi.setter
+    def phi(self, phi):
+        if phi != self._phi:
+            self._phi = phi
+            self.invalidateView()
+
+    def setViewport(self, width, height):
+        """
+        :param width: viewport width in pixels
+        :type width: int
+        :param height: viewport height in pixels
+        :type height: int
+        """
+        width, height = max(1, int(width)), max(1, int(height))
+        if (width, height) != (self.width, self.height):
+            self.width = width
+            self.height = height
+            self.invalidateProjection()
+
+    def getPosition(self):
+        """
+        :return: camera position in world space
+        :rtype: list<float>
+        """
+        if self._position is None:
+            ct = math.cos(self._theta)
+            st = math.sin(self._theta)
+            cp = math.cos(self._phi)
+            sp = math.sin(self._phi)
+            self._position = [
+                self._lookAtPt[0] + self._distance * ct * cp,
+                self._lookAtPt[1] + self._distance * sp,
+                self._lookAtPt[2] + self._distance * st * cp,
+            ]
+        return self._position
+
+    @property
+    def viewMat(self):
+        if self._viewMat is None:
+            self._viewMat = self.glutility.view(self.getPosition(), self._lookAtPt, self._upVector)
+        return self._viewMat
+
+    @property
+    def projectionMat(self):
+        if self._projectionMat is None:
+            self._projectionMat = self.glutility.perspective(self.fov, self.width, self.height,
+                                                             self.znear, self.zfar)
+        return self._projectionMat
+
+    @property
+    def viewProjectionMat(self):
+        if self._viewProjectionMat is None:
+            self._viewProjectionMat = self.projectionMat.T @ self.viewMat.T
+        return self._viewProjectionMat
+
+    @property
+    def inverseViewProjectionMat(self):
+        if self._inverseViewProjectionMat is None:
+            self._inverseViewProjectionMat = np.linalg.inv(self.viewProjectionMat)
+        return self._inverseViewProjectionMat
+
+    @property
+    def frustum(self):
+        """
+        The same Frustum object is returned until the camera changes, so SceneGraph.cull can reuse its result
+
+        :rtype: Frustum
+        """
+        if self._frustum is None:
+            self._frustum = Frustum(self.viewMat, self.projectionMat)
+        return self._frustum
+
+    @property
+    def lodView(self):
+        """
+        :rtype: LODView
+        """
+        if self._lodView is None:
+            self._lodView = LODView(self.getPosition(), self.projectionMat, self.height)
+        return self._lodView
+
+    def unproject(self, x, y, z):
+        """
+        World position of a viewport point
+
+        :param x: x in pixels
+        :type x: float
+        :param y: y in pixels, from the bottom
+        :type y: float
+        :param z: depth in [0, 1], 0 at znear and 1 at zfar, not linear in distance
+        :type z: float
+        :rtype: numpy.ndarray (3,)
+        """
+        ndc = np.array([x / self.width * 2.0 - 1.0, y / self.height * 2.0 - 1.0, 2.0 * z - 1.0, 1.0])
+        world = self.inverseViewProjectionMat @ ndc
+        if world[3] != 0:
+            world /= world[3]
+        return world[:3]
+
+    def unprojectRay(self, x, y):
+        """
+        Points on the near and far planes under a viewport point
+
+        :rtype: tuple[numpy.ndarray, numpy.ndarray]
+        """
+        return self.unproject(x, y, 0.0), self.unproject(x, y, 1.0)
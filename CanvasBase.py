@@ -8,6 +8,7 @@ and the main class should inherit this class. First version Created on 09/27/201
 """
 
 from Component import Component
+from GLProgram import GLProgram
 
 try:
     import wx
@@ -46,6 +47,8 @@ import numpy as np
 from Point import Point
 from ColorType import ColorType
 from Quaternion import Quaternion
+from FrameScheduler import FrameScheduler
+from InputRecorder import InputRecorder
 
 ############################### System Checking ################################
 
@@ -80,8 +83,12 @@ class CanvasBase(glcanvas.GLCanvas):
     viewing_quaternion = None
     dragging_event = False
     new_dragging_event = False
+    recorder = None  # InputRecorder while the input is being recorded, see startRecording
 
-    fps = 120  # frame per second, -1 to disable auto refresh
+    # maximum frames per second. Frames are only drawn when requested with requestRedraw or while an animation
+    # is running, -1 to draw requested frames without limit
+    fps = 120
+    scheduler = None
 
     def __init__(self, parent):
         """
@@ -102,9 +109,11 @@ class CanvasBase(glcanvas.GLCanvas):
         self.size = (0, 0)
         self.topLevelComponent = Component(Point((0, 0, 0)))
         self.viewing_quaternion = Quaternion()
+        self.scheduler = FrameScheduler(self.fps)
         self.timer = wx.Timer(self, 1)  # TIMER_ID set to 1
         # Bind event to functions
-        # self.Bind(wx.EVT_PAINT, self.OnPaint)
+        # system paint requests (window exposed), our own frames go through the timer
+        self.Bind(wx.EVT_PAINT, self.OnPaintEvent)
         self.Bind(wx.EVT_WINDOW_DESTROY, self.OnDestroy)
         self.Bind(wx.EVT_MOTION, self.OnMouseMotion)
         self.Bind(wx.EVT_LEFT_UP, self.OnMouseLeft)
@@ -112,11 +121,43 @@ class CanvasBase(glcanvas.GLCanvas):
         self.Bind(wx.EVT_CHAR, self.OnKeyDown)
         self.Bind(wx.EVT_SIZE, self.OnResize)
         self.Bind(wx.EVT_MOUSEWHEEL, self.OnScroll)
-        # refresh canvas with constant frame rate
-        self.Bind(wx.EVT_TIMER, self.OnPaint)
+        # one-shot timer, restarted only while frames are requested or an animation runs
+        self.Bind(wx.EVT_TIMER, self.OnTimer)
 
-        if self.fps > 0:
-            self.timer.Start(int(1000 / self.fps), oneShot=wx.TIMER_CONTINUOUS)
+    def makeCurrent(self):
+        """
+        Make this canvas' GL context current. Which program is bound is not known across contexts,
+        so GLProgram's cached binding is cleared as well
+        """
+        self.SetCurrent(self.context)
+        GLProgram.resetBinding()
+
+    def requestRedraw(self):
+        """
+        Mark the frame dirty and schedule a repaint, no sooner than the maximum frame rate allows.
+        Call this after changing the model, camera or selection outside the Interrupt_* handlers.
+
+        :return: None
+        """
+        self.scheduler.requestRedraw()
+        self._scheduleFrame()
+
+    def _scheduleFrame(self):
+        """
+        Start the frame timer if a frame is needed and the timer isn't already waiting
+        """
+        delay = self.scheduler.nextDelay()
+        if delay is None or self.timer.IsRunning():
+            return
+        self.timer.StartOnce(max(1, int(delay * 1000)))
+
+    def _drawFrame(self, event=None):
+        if self.recorder is not None:
+            self.recorder.frame()
+        self.OnPaint(event)
+        self.scheduler.frameDrawn()
+        if self.scheduler.isAnimating():
+            self._scheduleFrame()
 
     def OnScroll(self, event):
         """
@@ -125,28 +166,45 @@ class CanvasBase(glcanvas.GLCanvas):
         :param event: mouse event
         :return: None
         """
-        self.Interrupt_Scroll(event.GetWheelRotation())
-        self.Refresh(True)
+        self.dispatchInput("Interrupt_Scroll", event.GetWheelRotation())
+        self.requestRedraw()
 
     def OnTimer(self, event):
-        self.OnPaint(event)
+        if self.scheduler.needsFrame():
+            self._drawFrame(event)
+
+    def OnPaintEvent(self, event):
+        """
+        Bind to wxPython paint event, sent by the system when the window needs repainting
+
+        :param event: wxpython paint event
+        :return: None
+        """
+        # a PaintDC must exist during paint event handling on some platforms
+        dc = wx.PaintDC(self)
+        self._drawFrame(event)
+        del dc
 
     def OnResize(self, event):
         """
         Called when resize of window happen, this will run before OnPaint in first running
+        The GL context and everything created in it are kept, only the viewport changes
 
         :param event: Canvas resize event
         :return: None
         """
-        self.context = glcanvas.GLContext(self)
+        if self.context is None:
+            self.context = glcanvas.GLContext(self)
         self.size = self.GetClientSize()
         self.size[1] = max(1, self.size[1])  # avoid divided by 0
-        self.SetCurrent(self.context)
+        if self.recorder is not None:
+            self.recorder.resize(self.size[0], self.size[1])
 
+        if self.init:
+            self.makeCurrent()
+            gl.glViewport(0, 0, self.size[0], self.size[1])
         # Update screen and display
-        self.init = False
-        self.Refresh(eraseBackground=True)
-        self.Update()
+        self.requestRedraw()
 
     def OnIdle(self, event):
         pass
@@ -160,7 +218,7 @@ class CanvasBase(glcanvas.GLCanvas):
         :param event: wxpython paint event
         :return: None
         """
-        self.SetCurrent(self.context)
+        self.makeCurrent()
         if not self.init:
             # Init the OpenGL environment if not initialized
             self.InitGL()
@@ -177,7 +235,7 @@ class CanvasBase(glcanvas.GLCanvas):
         Wrap OpenGL commands, to draw on canvas
         :return: None
         """
-        self.SetCurrent(self.context)
+        self.makeCurrent()
         # clear color buffer and depth buffer
         gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
 
@@ -196,7 +254,7 @@ class CanvasBase(glcanvas.GLCanvas):
         Initialize the OpenGL environment. Set up lighting and rendering settings
         Call this method when canvas property changed. This will reset lighting
         """
-        self.SetCurrent(self.context)
+        self.makeCurrent()
         gl.glMatrixMode(gl.GL_MODELVIEW)
         self.size = self.GetClientSize()
 
@@ -266,28 +324,28 @@ class CanvasBase(glcanvas.GLCanvas):
             # If this is a dragging event with left button down
             self.new_dragging_event = not self.dragging_event
             self.dragging_event = True
-            self.Interrupt_MouseLeftDragging(event.GetX(), self.size[1] - event.GetY())
-            self.Refresh(True)
+            self.dispatchInput("Interrupt_MouseLeftDragging", event.GetX(), self.size[1] - event.GetY())
+            self.requestRedraw()
         elif event.RightIsDown():
             # If this is a dragging event with right button down
             self.new_dragging_event = not self.dragging_event
             self.dragging_event = True
-            self.Interrupt_MouseMiddleDragging(
-                event.GetX(), self.size[1] - event.GetY()
+            self.dispatchInput(
+                "Interrupt_MouseMiddleDragging", event.GetX(), self.size[1] - event.GetY()
             )  # use middle method
-            self.Refresh(True)
+            self.requestRedraw()
         elif event.MiddleIsDown():
             self.new_dragging_event = not self.dragging_event
             self.dragging_event = True
-            self.Interrupt_MouseMiddleDragging(
-                event.GetX(), self.size[1] - event.GetY()
+            self.dispatchInput(
+                "Interrupt_MouseMiddleDragging", event.GetX(), self.size[1] - event.GetY()
             )
-            self.Refresh(True)
+            self.requestRedraw()
         else:
             # Normal Mouse Moving
             self.dragging_event = False
-            self.Interrupt_MouseMoving(event.GetX(), self.size[1] - event.GetY())
-            self.Refresh(True)
+            self.dispatchInput("Interrupt_MouseMoving", event.GetX(), self.size[1] - event.GetY())
+            self.requestRedraw()
 
     # Definition for interface
     def OnMouseLeft(self, event):
@@ -299,8 +357,8 @@ class CanvasBase(glcanvas.GLCanvas):
         """
         x = event.GetX()
         y = event.GetY()
-        self.Interrupt_MouseL(x, self.size[1] - y)
-        self.Refresh(True)
+        self.dispatchInput("Interrupt_MouseL", x, self.size[1] - y)
+        self.requestRedraw()
 
     def OnMouseRight(self, event):
         """
@@ -311,8 +369,8 @@ class CanvasBase(glcanvas.GLCanvas):
         """
         x = event.GetX()
         y = event.GetY()
-        self.Interrupt_MouseR(x, self.size[1] - y)
-        self.Refresh(True)
+        self.dispatchInput("Interrupt_MouseR", x, self.size[1] - y)
+        self.requestRedraw()
 
     def OnKeyDown(self, event):
         """
@@ -322,8 +380,41 @@ class CanvasBase(glcanvas.GLCanvas):
         :return: None
         """
         keycode = event.GetKeyCode()
-        self.Interrupt_Keyboard(keycode)
-        self.Refresh(True)
+        self.dispatchInput("Interrupt_Keyboard", keycode)
+        self.requestRedraw()
+
+    def dispatchInput(self, name, *args):
+        """
+        Call an Interrupt_* method, logging the call first while the input is being recorded
+
+        :param name: name of the Interrupt_* method
+        :type name: str
+        :param args: its arguments
+        """
+        if self.recorder is not None:
+            self.recorder.record(name, args, self.dragging_event, self.new_dragging_event)
+        getattr(self, name)(*args)
+
+    def startRecording(self, path):
+        """
+        Log every input event and frame to a file until stopRecording, see InputRecorder
+
+        :param path: recording file to write
+        :type path: str
+        """
+        self.stopRecording()
+        self.recorder = InputRecorder(path, self.size)
+
+    def stopRecording(self):
+        """
+        :return: the finished recorder, None if nothing was being recorded
+        :rtype: InputRecorder or None
+        """
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.close()
+            self.recorder = None
+        return recorder
 
     def modelUpdate(self):
         """
@@ -332,7 +423,7 @@ class CanvasBase(glcanvas.GLCanvas):
         :return: None
         """
         self.stateChanged = True
-        self.Refresh(True)
+        self.requestRedraw()
 
     def Interrupt_Scroll(self, wheelRotation):
         pass
@@ -0,0 +1,385 @@
+"""
+Self-collision of a hierarchy: keeps the parts of a model from passing through each other.
+Every mesh part is bounded by a root sphere and a handful of leaf spheres fitted to its triangles, computed once per
+mesh in the part's own space. As joints move only the spheres of parts whose world matrix changed are moved, and all
+pairs of parts that may collide are tested at once, root spheres first and leaf spheres for the pairs that survive.
+"""
+
+import time
+
+import numpy as np
+
+from DisplayableMesh import DisplayableMesh
+
+
+class SphereTree:
+    """
+    Two-level sphere tree of one mesh: one sphere around everything and up to maxLeaves spheres around groups of
+    nearby triangles. Spheres are in the owning component's space, with the mesh's own scale applied
+    """
+    cache = {}  # id(DisplayableMesh) -> (DisplayableMesh, SphereTree); the mesh is kept so its id can't be reused
+
+    center = None  # (3,) root sphere
+    radius = 0.0
+    leafCenters = None  # (L, 3)
+    leafRadii = None  # (L,)
+
+    def __init__(self, positions, triangles, maxLeaves=16):
+        """
+        :param positions: vertex positions
+        :type positions: numpy.ndarray (V, 3)
+        :param triangles: vertex indices of every triangle
+        :type triangles: numpy.ndarray (T, 3)
+        :param maxLeaves: largest number of leaf spheres
+        :type maxLeaves: int
+        """
+        self.center, self.radius = self.enclose(positions)
+        corners = positions[triangles]
+        centroids = corners.mean(axis=1)
+        groups = [np.arange(len(triangles))]
+        # split the group with the largest spread until there are enough of them
+        while len(groups) < maxLeaves:
+            spreads = [np.ptp(centroids[g], axis=0).max() if len(g) > 1 else -1.0 for g in groups]
+            widest = int(np.argmax(spreads))
+            if spreads[widest] <= 0:
+                break
+            group = groups.pop(widest)
+            axis = int(np.argmax(np.ptp(centroids[group], axis=0)))
+            half = len(group) // 2
+            group = group[np.argpartition(centroids[group, axis], half)]
+            groups.extend([group[:half], group[half:]])
+        spheres = [self.enclose(corners[g].reshape(-1, 3)) for g in groups if len(g) > 0]
+        self.leafCenters = np.array([c for c, _ in spheres]).reshape(-1, 3)
+        self.leafRadii = np.array([r for _, r in spheres])
+
+    @staticmethod
+    def enclose(points):
+        """
+        Sphere around the box center of points that contains all of them
+
+        :rtype: tuple[numpy.ndarray, float]
+        """
+        center = (points.min(axis=0) + points.max(axis=0)) * 0.5
+        return center, float(np.sqrt(((points - center) ** 2).sum(axis=1).max()))
+
+    @classmethod
+    def get(cls, mesh, maxLeaves=16):
+        """
+        Sphere tree of a mesh, built on first use
+
+        :type mesh: DisplayableMesh
+        :rtype: SphereTree
+        """
+        entry = cls.cache.get(id(mesh))
+        if entry is None or entry[0] is not mesh:
+            if mesh.instanced:
+                vertices, indices = mesh.levels[0].vertices, mesh.levels[0].indices
+            else:
+                vertices, indices = mesh.vertices, mesh.indices
+            # the mesh's own scale, so spheres stay tight around stretched shapes
+            modelMat = mesh.getModelMatrix(np.identity(4))
+            positions = np.asarray(vertices, dtype=np.float64).reshape(-1, 11)[:, 0:3] @ modelMat[:3, :3].T
+            triangles = np.asarray(indices, dtype=np.intp).reshape(-1, 3)
+            entry = (mesh, cls(positions, triangles, maxLeaves))
+            cls.cache[id(mesh)] = entry
+        return entry[1]
+
+
+class SelfCollision:
+    """
+    Collision checks between the mesh parts under a root component.
+    A part is never tested against the nearest mesh part above or below it, which it is attached to, nor against
+    parts it already touches when the checker is built: those contacts are part of the model's design.
+
+    Assign it to a component's collision slot to make Component.rotate and Component.setCurrentAngle enforce it
+    on that component's subtree, see constrainAngle
+    """
+    MODES = ("off", "reject", "clamp")
+
+    root = None  # Component
+    mode = "clamp"  # what rotate and setCurrentAngle do with a move that makes new contacts, one of MODES
+    clampSteps = 8  # bisection steps used to find how far a move can go in "clamp" mode
+
+    scene = None  # SceneGraph rows were resolved in
+    parts = None  # list<Component>
+    rows = None  # (K,) scene rows of the parts
+    pairs = None  # (P, 2) part indices of the pairs that are tested
+
+    localCenters = None  # (K, L, 3) leaf spheres in part space, padded to the largest leaf count
+    localRadii = None  # (K, L) leaf radii, -inf for padding
+    localRootCenters = None  # (K, 3)
+    localRootRadii = None  # (K,)
+    worldCenters = None  # (K, L, 3)
+    worldRadii = None  # (K, L)
+    worldRootCenters = None  # (K, 3)
+    worldRootRadii = None  # (K,)
+    fittedMats = None  # (K, 4, 4) world matrices the world spheres were computed for
+
+    contacts = None  # (C,) bool over pairs, result of the last check
+    lastCheckTime = 0.0  # seconds spent in the last check
+    refittedParts = 0  # parts moved by the last refit
+    narrowPairs = 0  # pairs whose leaf spheres were tested in the last check
+    rejectedMoves = 0  # moves undone or shortened by constrainAngle so far
+    rejectedBatchJoints = 0  # joints undone or shortened by constrainBatch so far
+
+    def __init__(self, root, maxLeaves=16, mode="clamp"):
+        """
+        :param root: top of the subtree to check, in the pose whose contacts are allowed
+        :type root: Component
+        :param maxLeaves: largest number of leaf spheres per part
+        :type maxLeaves: int
+        :param mode: see the class attribute
+        :type mode: str
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"unknown collision mode {mode}")
+        self.root = root
+        self.mode = mode
+
+        self.parts = []
+        nearestPart = []  # index of the nearest part above every part, -1 if none
+        stack = [(root, -1)]
+        while stack:
+            node, above = stack.pop()
+            if isinstance(node.displayObj, DisplayableMesh):
+                self.parts.append(node)
+                nearestPart.append(above)
+                above = len(self.parts) - 1
+            stack.extend((c, above) for c in reversed(node.children))
+
+        trees = [SphereTree.get(part.displayObj, maxLeaves) for part in self.parts]
+        k = len(self.parts)
+        leafCount = max([len(t.leafRadii) for t in trees] + [1])
+        self.localCenters = np.zeros((k, leafCount, 3))
+        self.localRadii = np.full((k, leafCount), -np.inf)
+        self.localRootCenters = np.zeros((k, 3))
+        self.localRootRadii = np.zeros(k)
+        for i, tree in enumerate(trees):
+            self.localCenters[i, :len(tree.leafRadii)] = tree.leafCenters
+            self.localRadii[i, :len(tree.leafRadii)] = tree.leafRadii
+            self.localRootCenters[i] = tree.center
+            self.localRootRadii[i] = tree.radius
+        self.worldCenters = np.zeros_like(self.localCenters)
+        self.worldRadii = np.full_like(self.localRadii, -np.inf)
+        self.worldRootCenters = np.zeros_like(self.localRootCenters)
+        self.worldRootRadii = np.zeros_like(self.localRootRadii)
+        self.fittedMats = np.full((k, 4, 4), np.nan)
+
+        first, second = np.triu_indices(k, 1)
+        nearestPart = np.array(nearestPart, dtype=np.intp).reshape(-1)
+        attached = (nearestPart[second] == first) | (nearestPart[first] == second)
+        self.pairs = np.column_stack([first, second])[~attached]
+        self.contacts = np.zeros(len(self.pairs), dtype=bool)
+        # contacts of the design pose are allowed
+        self.pairs = self.pairs[~self.check()]
+        self.contacts = np.zeros(len(self.pairs), dtype=bool)
+
+    def refit(self):
+        """
+        Move the world spheres of every part whose world matrix changed since the last refit
+
+        :return: number of parts moved
+        :rtype: int
+        """
+        self.root.update()
+        scene = self.root.getSceneGraph()
+        if scene is not self.scene:
+            # rows change whenever the hierarchy storage is rebuilt
+            self.rows = np.array([part._index for part in self.parts], dtype=np.intp)
+            self.scene = scene
+        mats = scene.worldMats[self.rows]
+        moved = np.flatnonzero((mats != self.fittedMats).any(axis=(1, 2)))
+        if len(moved) > 0:
+            mats = mats[moved]
+            rotations = mats[:, :3, :3]
+            # spheres stay spheres under the largest axis scale of the component's own scaling
+            scales = np.sqrt((rotations ** 2).sum(axis=1).max(axis=1))
+            self.worldCenters[moved] = np.einsum("kij,klj->kli", rotations, self.localCenters[moved]) \
+                + mats[:, None, :3, 3]
+            self.worldRadii[moved] = self.localRadii[moved] * scales[:, None]
+            self.worldRootCenters[moved] = np.einsum("kij,kj->ki", rotations, self.localRootCenters[moved]) \
+                + mats[:, :3, 3]
+            self.worldRootRadii[moved] = self.localRootRadii[moved] * scales
+            self.fittedMats[moved] = mats
+        self.refittedParts = len(moved)
+        return self.refittedParts
+
+    def check(self):
+        """
+        Test every pair against the current pose
+
+        :return: which pairs are in contact
+        :rtype: numpy.ndarray (P,) bool
+        """
+        start = time.perf_counter()
+        if self.refit() == 0 and self.lastCheckTime > 0:
+            # nothing moved since the last check
+            return self.contacts
+        first, second = self.pairs[:, 0], self.pairs[:, 1]
+        gaps = self.worldRootCenters[first] - self.worldRootCenters[second]
+        reach = self.worldRootRadii[first] + self.worldRootRadii[second]
+        candidates = np.flatnonzero((gaps ** 2).sum(axis=1) < reach ** 2)
+
+        contacts = np.zeros(len(self.pairs), dtype=bool)
+        if len(candidates) > 0:
+            a, b = first[candidates], second[candidates]
+            # every leaf of one part against every leaf of the other, (C, L, L)
+            gaps = self.worldCenters[a][:, :, None] - self.worldCenters[b][:, None]
+            reach = self.worldRadii[a][:, :, None] + self.worldRadii[b][:, None]
+            touching = ((gaps ** 2).sum(axis=3) < reach ** 2) & (reach > 0)
+            contacts[candidates] = touching.any(axis=(1, 2))
+        self.contacts = contacts
+        self.narrowPairs = len(candidates)
+        self.lastCheckTime = time.perf_counter() - start
+        return contacts
+
+    def isColliding(self):
+        """
+        :return: whether any two parts touch in the current pose
+        :rtype: bool
+        """
+        return bool(self.check().any())
+
+    def collisions(self):
+        """
+        :return: the parts in contact in the current pose
+        :rtype: list<tuple[Component, Component]>
+        """
+        return [(self.parts[i], self.parts[j]) for i, j in self.pairs[self.check()]]
+
+    def constrainAngle(self, component, index, angle):
+        """
+        Set a rotation angle of a component, undoing or shortening the move if it makes parts touch that didn't
+        before, depending on mode. Contacts that already exist don't block moves, so a pose that is already in
+        contact can always be left.
+        Inside batchUpdate the hierarchy can't be evaluated, so the angle is set unchecked and the batch calls
+        constrainBatch when it commits.
+
+        :param component: a component under root
+        :type component: Component
+        :param index: 0, 1 or 2 for the u, v or w angle
+        :type index: int
+        :param angle: new angle in degrees, already clamped to the rotation extent
+        :type angle: float
+        """
+        name = "uvw"[index] + "Angle"
+        if self.mode == "off" or component.getRoot()._poseBatch is not None:
+            setattr(component, name, angle)
+            return
+        before = self.check().copy()
+        previous = getattr(component, name)
+        setattr(component, name, angle)
+        if not (self.check() & ~before).any():
+            return
+
+        self.rejectedMoves += 1
+        allowed = 0.0
+        if self.mode == "clamp":
+            # largest fraction of the move that makes no new contact
+            low, high = 0.0, 1.0
+            for _ in range(self.clampSteps):
+                middle = (low + high) * 0.5
+                setattr(component, name, previous + (angle - previous) * middle)
+                if (self.check() & ~before).any():
+                    high = middle
+                else:
+                    low = middle
+            allowed = low
+        setattr(component, name, previous + (angle - previous) * allowed)
+        self.check()
+
+    def constrainBatch(self, before, previousAngles):
+        """
+        Undo or shorten, depending on mode, the angle changes made by a batchUpdate that make parts touch that
+        didn't before it. Only the changed joints above the parts in new contacts are moved back, all by the same
+        fraction of their change in "clamp" mode.
+
+        :param before: contacts when the batch opened, from check
+        :type before: numpy.ndarray (P,) bool
+        :param previousAngles: copy of the scene's angles when the batch opened
+        :type previousAngles: numpy.ndarray (N, 3)
+        :return: number of joints undone or shortened
+        :rtype: int
+        """
+        if self.mode == "off":
+            return 0
+        new = self.check() & ~before
+        if not new.any():
+            return 0
+        scene = self.root.getSceneGraph()
+        if previousAngles.shape != scene.angles.shape:
+            # the hierarchy was rebuilt during the batch, its rows no longer match
+            return 0
+
+        above = set()
+        for part in np.unique(self.pairs[new]):
+            node = self.parts[part]
+            while node is not None:
+                above.add(node._index)
+                node = node.parent
+        changed = np.flatnonzero((scene.angles != previousAngles).any(axis=1))
+        rows = np.array([row for row in changed if row in above], dtype=np.intp)
+        if len(rows) == 0:
+            return 0
+
+        start, target = previousAngles[rows], scene.angles[rows].copy()
+        allowed = 0.0
+        if self.mode == "clamp":
+            low, high = 0.0, 1.0
+            for _ in range(self.clampSteps):
+                middle = (low + high) * 0.5
+                scene.angles[rows] = start + (target - start) * middle
+                scene.dirty[rows] = True
+                if (self.check() & ~before).any():
+                    high = middle
+                else:
+                    low = middle
+            allowed = low
+        scene.angles[rows] = start + (target - start) * allowed
+        scene.dirty[rows] = True
+        self.check()
+        self.rejectedBatchJoints += len(rows)
+        return len(rows)
+
+
+if __name__ == "__main__":
+    from ModelLinkage import Spider
+    from Point import Point
+
+    spider = Spider(None, Point((0, 0, 0)), None)
+    collision = SelfCollision(spider)
+    spider.collision = collision
+    print(f"{len(collision.parts)} parts, {len(collision.pairs)} pairs tested, "
+          f"colliding in the rest pose: {collision.isColliding()}")
+
+    # swing the tail forward over the body until something stops it
+    tail = spider.getComponent("tail")
+    for mode in ("off", "reject", "clamp"):
+        for c in spider.getSceneGraph().nodes:
+            c.reset()
+        spider.update()
+        collision.mode = mode
+        for _ in range(40):
+            tail.rotate(5, tail.vAxis)
+        tail.update()
+        print(f"{mode}: tail at {tail.vAngle:.1f} degrees, colliding: {collision.isColliding()}")
+
+    # the same swing as one batched pose, checked when the batch commits
+    for c in spider.getSceneGraph().nodes:
+        c.reset()
+    spider.update()
+    batch = spider.applyPose({"tail": {"v": tail.vAngle + 200}})
+    print(f"batched clamp: tail at {tail.vAngle:.1f} degrees, colliding: {collision.isColliding()}, "
+          f"{batch.limitedJoints} joints limited")
+
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    count = 200
+    collision.mode = "clamp"
+    nodes = spider.getSceneGraph().nodes
+    for _ in range(count):
+        c = nodes[rng.integers(len(nodes))]
+        c.rotate(float(rng.uniform(-10, 10)), c.axisBucket[rng.integers(3)])
+    elapsed = (time.perf_counter() - start) / count
+    print(f"checked rotate: {1e3 * elapsed:.2f} ms per call, {collision.rejectedMoves} moves limited, "
+          f"check {1e3 * collision.lastCheckTime:.3f} ms")
@@ -8,7 +8,6 @@ First version in 11/01/2021
 Modified by Daniel Scrivener 07/2022
 """
 
-import copy
 import math
 import os
 from typing import Tuple, Type
@@ -20,9 +19,10 @@ import GLBuffer
 from Point import Point
 from ColorType import ColorType
 from Displayable import Displayable
-from Quaternion import Quaternion
+from Quaternion import Quaternion, QuaternionArray
 from GLUtility import GLUtility
 from GLBuffer import Texture
+from SceneGraph import SceneGraph
 
 try:
     import OpenGL
@@ -47,47 +47,106 @@ except ImportError:
     raise ImportError("Required dependency PyOpenGL not present")
 
 
-class Component:
-    children = None  # list
-
-    # the homogeneous transformation matrix for the current joint
-    transformationMat = None
-
-    # a instance of class which inherit from Displayable
-    # if this class is used as skeleton, then keep this empty
-    displayObj = None
-
-    default_color = None  # ColorType
-    current_color = None  # ColorType
-    defaultPos = None  # Point
-    currentPos = None  # Point
-
-    uAxis = None  # list<float>(3): local basis u
-    vAxis = None  # list<float>(3): local basis v
-    wAxis = None  # list<float>(3): local basis w
-    default_uAngle = 0.0
-    uAngle = 0.0
-    uRange = None  # list<float>(2)
-    default_vAngle = 0.0
-    vAngle = 0.0
-    vRange = None  # list<float>(2)
-    default_wAngle = 0.0
-    wAngle = 0.0
-    wRange = None  # list<float>(2)
-    axisBucket = None
+class PoseBatch:
+    """
+    Context manager returned by Component.batchUpdate. While it is open, update() calls anywhere in the
+    hierarchy are only counted; the hierarchy is updated once when the outermost batch closes.
+    Nothing is deferred until the batch is entered with a with statement.
+    Self-collision can't be checked move by move inside the batch, so the pose is checked once it commits,
+    see SelfCollision.constrainBatch.
+    """
+
+    root = None  # Component
+    depth = 0
+    deferredUpdates = 0  # update() calls made while the batch was open
+    traversalsSaved = 0  # traversals avoided compared with updating on every call, known after commit
+    guards = None  # list<tuple[SelfCollision, numpy.ndarray, numpy.ndarray]>, contacts and angles when it opened
+    limitedJoints = 0  # joints undone or shortened by self-collision when the batch committed
+
+    def __init__(self, root):
+        self.root = root
+        self.depth = 0
+        self.deferredUpdates = 0
+        self.guards = []
+        self.limitedJoints = 0
+
+    def __enter__(self):
+        # a batch entered while another one is open on the same root joins it
+        if self.root._poseBatch is None:
+            scene = self.root.getSceneGraph()
+            self.guards = [(node.collision, node.collision.check().copy(), scene.angles.copy())
+                           for node in scene.nodes if node.collision is not None and node.collision.mode != "off"]
+            self.root._poseBatch = self
+        batch = self.root._poseBatch
+        batch.depth += 1
+        return batch
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        batch = self.root._poseBatch
+        if batch is not None:
+            batch.depth -= 1
+            if batch.depth == 0:
+                batch.commit()
+        return False
+
+    def commit(self):
+        """
+        Close the batch and run the single deferred traversal from the root
+        """
+        self.root._poseBatch = None
+        self.root.update()
+        self.traversalsSaved = max(0, self.deferredUpdates - 1)
+        for collision, contacts, angles in self.guards:
+            self.limitedJoints += collision.constrainBatch(contacts, angles)
+        self.guards = []
 
-    defaultScaling = None
-    currentScaling = None
 
-    preRotationMat = None
-    postRotationMat = None
-
-    texture = None
-    textureOn = False
-
-    glUtility = None
-
-    quat = None
+class Component:
+    """
+    A node of a hierarchical model, with its own transformation relative to its parent and an optional Displayable.
+    Instances only have the slots listed below, there can be thousands of them in a model
+    """
+    __slots__ = [
+        "children",  # list<Component>
+        "parent",  # Component
+        # transform state is stored in a SceneGraph shared by the whole hierarchy. These two locate our row in it.
+        # transformationMat, currentPos, uAngle, vAngle, wAngle, currentScaling, preRotationMat, postRotationMat
+        # and quat are properties reading and writing that row, see the end of this class.
+        "_scene",  # SceneGraph, None until the storage of this component's hierarchy is first built
+        "_index",  # int
+        "_pending",  # dict<str, numpy.ndarray>, row values set while _scene is None, see _row
+        # a instance of class which inherit from Displayable
+        # if this class is used as skeleton, then keep this empty
+        "displayObj",
+        "default_color",  # numpy.ndarray RGB
+        "current_color",  # numpy.ndarray RGB
+        "defaultPos",  # Point
+        # uAxis, vAxis, wAxis, axisBucket, uRange, vRange and wRange are properties. Until they are changed,
+        # they read the defaultAxes and defaultRanges shared by every component
+        "_axes",  # tuple<Point>(3), None for the default axes
+        "_ranges",  # tuple<list<float>(2)>(3), None for the default ranges
+        "default_uAngle",  # float
+        "default_vAngle",  # float
+        "default_wAngle",  # float
+        "defaultScaling",  # list<float>(3), the constant (1, 1, 1) until setDefaultScale
+        "_texture",  # Texture, created on first use, see the texture property
+        "textureOn",  # bool
+        "_quat",  # Quaternion
+        "_poseBatch",  # PoseBatch, only set on the top-level component
+        "componentDict",  # dict<str, Component>, named sub-components used by getComponent
+        "recomputedCount",  # number of components recomputed by the last update() call
+        "skin",  # SkinnedMesh drawn instead of this subtree's parts while it is enabled
+        "collision",  # SelfCollision enforced on rotations of this subtree, see getCollision
+    ]
+
+    # GLUtility has no per-component state, so every component shares one
+    glUtility = GLUtility()
+    # never changed in place, setU, setV, setW and the range setters replace them with a component's own values
+    defaultAxes = (Point([1, 0, 0]), Point([0, 1, 0]), Point([0, 0, 1]))
+    defaultRanges = ((-360, 360), (-360, 360), (-360, 360))
+    # color of every component without a displayObj, read-only since they all share it
+    defaultWhite = np.ones(3)
+    defaultWhite.flags.writeable = False
 
     def __init__(self, position, display_obj=None):
         """
@@ -102,14 +161,24 @@ class Component:
         # list variable initialization should be done here. Otherwise list variable in different instances will share
         # the same list
         self.children: list["Component"] = []
-        self.uAxis = Point([1, 0, 0])
-        self.vAxis = Point([0, 1, 0])
-        self.wAxis = Point([0, 0, 1])
-        self.uRange = [-360, 360]
-        self.vRange = [-360, 360]
-        self.wRange = [-360, 360]
-        self.axisBucket = [self.uAxis, self.vAxis, self.wAxis]
-        self.glUtility = GLUtility()
+        self.parent = None
+        self._scene = None
+        self._index = 0
+        self._pending = None
+        self._axes = None
+        self._ranges = None
+        self.displayObj = None
+        self._quat = None
+        self._poseBatch = None
+        self._texture = None
+        self.textureOn = False
+        self.componentDict = None
+        self.recomputedCount = 0
+        self.skin = None
+        self.collision = None
+        self.default_uAngle = 0.0
+        self.default_vAngle = 0.0
+        self.default_wAngle = 0.0
 
         # Type Checking
         if not isinstance(position, Point):
@@ -122,16 +191,14 @@ class Component:
             self.default_color = display_obj.defaultColor
             self.current_color = display_obj.defaultColor
         else:
-            self.default_color = np.array([1.0, 1.0, 1.0])
-            self.current_color = np.array([1.0, 1.0, 1.0])
+            self.default_color = self.defaultWhite
+            self.current_color = self.defaultWhite
         self.defaultPos = position.copy()
-        self.currentPos = position.copy()
+        self.currentPos = position
         self.displayObj = display_obj
-        self.defaultScaling = [1, 1, 1]
-        self.currentScaling = [1, 1, 1]
-        self.preRotationMat = np.identity(4)
-        self.postRotationMat = np.identity(4)
-        self.texture = Texture()
+        self.defaultScaling = (1, 1, 1)
+        # no storage is allocated here. The other rows start out as unit scaling, zero angles and identity pre and
+        # post rotations, and the storage of the whole hierarchy is built by its top-level component on first use
 
     def addChild(self, child):
         """
@@ -147,6 +214,9 @@ class Component:
         # prevent the duplicate child to be added to the self.children
         if child not in self.children:
             self.children.append(child)
+            child.parent = self
+            if self._scene is not None:
+                self._scene.stale = True
 
     def clear(self):
         """
@@ -154,8 +224,11 @@ class Component:
         """
         for c in self.children:
             c.clear()
+            c.parent = None
             self.children.remove(c)
             del c
+        if self._scene is not None:
+            self._scene.stale = True
 
     def initialize(self):
         """
@@ -173,10 +246,39 @@ class Component:
         # use init value to generate transformation matrix for all children
         self.update()
 
-    def draw(self, shaderProg):
-        shaderProg.setMat4("modelMat", self.transformationMat.transpose())
-        shaderProg.setVec3("currentColor", self.current_color)
-        if isinstance(self.displayObj, Displayable):
+    def draw(self, shaderProg, lodView=None, frustum=None):
+        """
+        Draw this component and all its children.
+        Instanced displayable objects are only queued here; they are drawn by InstancedMesh.drawAll
+
+        :param shaderProg: compiled shader program
+        :type shaderProg: GLProgram
+        :param lodView: camera data used to pick each mesh's detail level, None keeps the current levels
+        :type lodView: LODView
+        :param frustum: view frustum, subtrees whose world bounds lie outside it are skipped. None draws everything
+        :type frustum: Frustum
+        """
+        if frustum is not None and self._scene is not None and not self._scene.cull(frustum)[self._index]:
+            return
+        if self.skin is not None and self.skin.enabled:
+            # one skinned draw call replaces every part below
+            self.skin.draw()
+            return
+        if lodView is not None and isinstance(self.displayObj, Displayable):
+            if self.displayObj.updateLOD(lodView, self.transformationMat) and self._scene is not None:
+                # a coarser level with larger bounds was loaded, culling picks them up at the next update
+                self._scene.loadBounds([self._index])
+        if isinstance(self.displayObj, Displayable) and (
+            self.displayObj.instanced and not self.textureOn
+        ):
+            self.displayObj.submit(self.transformationMat, self.current_color)
+        elif isinstance(self.displayObj, Displayable):
+            # textured and non-instanced objects are drawn right away with the model uniforms
+            shaderProg.setMat4(
+                "modelMat",
+                self.displayObj.getModelMatrix(self.transformationMat).transpose(),
+            )
+            shaderProg.setVec3("currentColor", self.current_color)
             if self.textureOn:
                 shaderProg.use()
                 self.texture.bind(shaderProg.getUniformLocation("textureImage"))
@@ -186,54 +288,144 @@ class Component:
             self.displayObj.draw()
 
         for c in self.children:
-            c.draw(shaderProg)
+            c.draw(shaderProg, lodView, frustum)
 
-    def update(self, parentTransformationMat=None):
+    def markDirty(self):
         """
-        Apply translation, rotation and scaling to this component and all its children
-        Must be called after any changes made to the instance
+        Flag this component's local transformation as changed, so the next update() recomputes it and its subtree.
+        Assigning any transform property already does this; call it manually after mutating transform state in place
 
         :return: None
         """
-        if parentTransformationMat is None:
-            parentTransformationMat = np.identity(4)
+        if self._scene is not None:
+            self._scene.dirty[self._index] = True
 
-        translationMat = self.glUtility.translate(*self.currentPos.getCoords(), False)
+    def getWorldBounds(self):
+        """
+        World axis-aligned bounding box of this component and everything below it, as of the last update()
 
-        # if self.quat is set, use the quaternion as your rotation matrix.
-        # otherwise, use Euler angles with rotation extents, etc.
-        # this means that quaternions will always override the settings for Euler angles
+        :return: (min, max), with min > max if nothing below is displayable
+        :rtype: tuple[numpy.ndarray, numpy.ndarray]
+        """
+        scene = self._scene
+        if scene is None:
+            # never updated, so nothing below is placed yet
+            return (np.full(3, np.inf), np.full(3, -np.inf))
+        scene.refreshBounds()
+        return (scene.worldMins[self._index].copy(), scene.worldMaxs[self._index].copy())
 
-        if self.quat is None:
-            rotationMatU = self.glUtility.rotate(self.uAngle, self.uAxis, False)
-            rotationMatV = self.glUtility.rotate(self.vAngle, self.vAxis, False)
-            rotationMatW = self.glUtility.rotate(self.wAngle, self.wAxis, False)
-        else:
-            rotationMatU = self.quat.toMatrix().transpose()
-            rotationMatV = np.identity(4)
-            rotationMatW = np.identity(4)
-        scalingMat = self.glUtility.scale(*self.currentScaling, False)
-
-        ##### TODO 1: Write the correct transformation to be applied to each Component
-        # Finish this function by writing one line of code that sets myTransformation to the correct value.
-        # HINT: you can use the @ operator to multiply numpy matrices
-        # e.g. self.transformationMat = C @ B @ A
-
-        # Change only this line!
-        # myTransformation = np.identity(4)
-        myTransformation = (
-            translationMat @ scalingMat @ rotationMatW @ rotationMatV @ rotationMatU
-        )
+    def getRoot(self):
+        """
+        Get the top-level component of the hierarchy this component belongs to
 
-        self.transformationMat = (
-            parentTransformationMat
-            @ self.postRotationMat
-            @ myTransformation
-            @ self.preRotationMat
-        )
+        :rtype: Component
+        """
+        root = self
+        while root.parent is not None:
+            root = root.parent
+        return root
 
-        for c in self.children:
-            c.update(self.transformationMat)
+    def getComponent(self, path):
+        """
+        Look up a sub-component by a path of componentDict names separated by "/", e.g. "tail/needle"
+
+        :param path: component path relative to this component. An empty path is this component
+        :type path: str
+        :rtype: Component
+        """
+        node = self
+        for name in path.split("/"):
+            if name == "":
+                continue
+            if node.componentDict is None or name not in node.componentDict:
+                raise KeyError(f"no component named {name} in path {path}")
+            node = node.componentDict[name]
+        return node
+
+    def batchUpdate(self):
+        """
+        Group many pose changes into one update of the hierarchy.
+        setCurrentAngle, setCurrentPosition, setDefaultScale and setCurrentScale normally update the hierarchy
+        right away; inside the batch these updates are deferred and run once when the batch closes.
+        Nested batches join the outer one.
+
+        e.g.
+            with model.batchUpdate() as batch:
+                ...
+            print(batch.traversalsSaved)
+
+        :rtype: PoseBatch
+        """
+        root = self.getRoot()
+        if root._poseBatch is not None:
+            return root._poseBatch
+        return PoseBatch(root)
+
+    def applyPose(self, pose):
+        """
+        Apply many joint changes at once, with a single update of the hierarchy
+
+        :param pose: maps component paths (see getComponent) to their changes. Each change is a dict with any of \
+            "u", "v", "w" (current angle in degrees, clamped to the rotation extent), \
+            "position" (list or tuple of 3 floats) and "scale" (list or tuple of 3 floats)
+        :type pose: dict[str, dict]
+        :return: the committed batch, which reports how many traversals were saved
+        :rtype: PoseBatch
+        """
+        with self.batchUpdate() as batch:
+            for path, changes in pose.items():
+                c = self.getComponent(path)
+                for name, axis in zip("uvw", c.axisBucket):
+                    if name in changes:
+                        c.setCurrentAngle(changes[name], axis)
+                if "position" in changes:
+                    c.setCurrentPosition(Point(changes["position"]))
+                if "scale" in changes:
+                    c.setCurrentScale(changes["scale"])
+        return batch
+
+    def getSceneGraph(self):
+        """
+        Get the array storage of the whole hierarchy this component belongs to.
+        The storage is rebuilt from the top-level component if children were added or removed since it was built.
+
+        :rtype: SceneGraph
+        """
+        root = self.getRoot()
+        scene = root._scene
+        if scene is None or scene.stale or scene.nodes[0] is not root:
+            scene = SceneGraph(root)
+        return scene
+
+    def update(self, parentTransformationMat=None):
+        """
+        Apply translation, rotation and scaling to this component and all its children
+        Must be called after any changes made to the instance
+
+        The whole hierarchy is evaluated from its top-level component, one depth level at a time.
+        Only components whose own transformation changed (see markDirty), or whose parent was recomputed,
+        are rebuilt. Everything else keeps its cached transformationMat.
+
+        :param parentTransformationMat: world matrix the top-level component is attached to. \
+            Only the top-level component accepts it: every other component's parent matrix is its parent's \
+            transformationMat, so it can't be overridden for one call
+        :type parentTransformationMat: numpy.ndarray
+        :return: number of components recomputed by this call
+        :rtype: int
+        """
+        if parentTransformationMat is not None and self.parent is not None:
+            raise ValueError("parentTransformationMat can only be given to the top-level component")
+        root = self.getRoot()
+        if root._poseBatch is not None:
+            # inside batchUpdate, the batch runs one update when it closes
+            root._poseBatch.deferredUpdates += 1
+            return 0
+
+        scene = self.getSceneGraph()
+        if parentTransformationMat is not None:
+            scene.setRootParent(parentTransformationMat)
+        self.recomputedCount = scene.update()
+        return self.recomputedCount
 
     def rotate(self, degree, axis):
         """
@@ -249,14 +441,44 @@ class Component:
             raise TypeError("unknown axis for rotation")
         index = self.axisBucket.index(axis)
         if index == 0:
-            self.uAngle = max(min(degree + self.uAngle, self.uRange[1]), self.uRange[0])
-            # print(self.uAngle)
+            angle = max(min(degree + self.uAngle, self.uRange[1]), self.uRange[0])
         elif index == 1:
-            self.vAngle = max(min(degree + self.vAngle, self.vRange[1]), self.vRange[0])
-            # print(self.vAngle)
+            angle = max(min(degree + self.vAngle, self.vRange[1]), self.vRange[0])
         else:
-            self.wAngle = max(min(degree + self.wAngle, self.wRange[1]), self.wRange[0])
-            # print(self.wAngle)
+            angle = max(min(degree + self.wAngle, self.wRange[1]), self.wRange[0])
+        self.assignAngle(index, angle)
+
+    def assignAngle(self, index, angle):
+        """
+        Set the u, v or w angle, subject to the SelfCollision guarding this component if there is one
+
+        :param index: 0, 1 or 2 for the u, v or w angle
+        :type index: int
+        :param angle: angle in degrees, already clamped to the rotation extent
+        :type angle: float
+        """
+        collision = self.getCollision()
+        if collision is not None:
+            collision.constrainAngle(self, index, angle)
+        elif index == 0:
+            self.uAngle = angle
+        elif index == 1:
+            self.vAngle = angle
+        else:
+            self.wAngle = angle
+
+    def getCollision(self):
+        """
+        The SelfCollision of the nearest component at or above this one that has one assigned
+
+        :rtype: SelfCollision or None
+        """
+        node = self
+        while node is not None:
+            if node.collision is not None:
+                return node.collision
+            node = node.parent
+        return None
 
     def reset(self, mode="all"):
         """
@@ -274,7 +496,7 @@ class Component:
         if mode in ["position", "all"]:
             self.currentPos = self.defaultPos
         if mode in ["scale", "all"]:
-            self.currentScaling = copy.deepcopy(self.defaultScaling)
+            self.currentScaling = list(self.defaultScaling)
         if mode in ["rotationAxis", "all"]:
             self.setU([1, 0, 0])
             self.setV([0, 1, 0])
@@ -295,12 +517,7 @@ class Component:
             raise TypeError("unknown axis for rotation extent setting")
         # Find out which axis to set
         index = self.axisBucket.index(axis)
-        if index == 0:
-            r = self.uRange
-        elif index == 1:
-            r = self.vRange
-        else:
-            r = self.wRange
+        r = self.getRanges()[index]
 
         # Update range if any value given
         iD = r[0] if isinstance(minDeg, type(None)) else minDeg
@@ -313,8 +530,7 @@ class Component:
                 "At axis: ", ["u", "v", "w"][index], "   min & max Deg given: ", iD, aD
             )
             iD, aD = aD, iD
-        r[0] = iD
-        r[1] = aD
+        self.setRange(index, [iD, aD])
 
     @staticmethod
     def clamp(v, low_bound, up_bound):
@@ -342,11 +558,11 @@ class Component:
         index = self.axisBucket.index(axis)
 
         if index == 0:
-            self.uAngle = self.clamp(angle, self.uRange[0], self.uRange[1])
+            self.assignAngle(index, self.clamp(angle, self.uRange[0], self.uRange[1]))
         elif index == 1:
-            self.vAngle = self.clamp(angle, self.vRange[0], self.vRange[1])
+            self.assignAngle(index, self.clamp(angle, self.vRange[0], self.vRange[1]))
         else:
-            self.wAngle = self.clamp(angle, self.wRange[0], self.wRange[1])
+            self.assignAngle(index, self.clamp(angle, self.wRange[0], self.wRange[1]))
         self.update()
 
     def setDefaultAngle(self, angle, axis):
@@ -379,7 +595,7 @@ class Component:
         if not isinstance(pos, Point):
             raise TypeError("pos should have type Point")
         self.defaultPos = pos.copy()
-        self.currentPos = copy.deepcopy(self.defaultPos)
+        self.currentPos = self.defaultPos
 
     def setDefaultScale(self, scale):
         """
@@ -395,8 +611,8 @@ class Component:
             raise TypeError("default scale should consists of scaling on 3 axis")
         """if min(scale) != max(scale):
             raise ValueError("Component only accept uniform scaling")"""
-        self.defaultScaling = copy.deepcopy(scale)
-        self.currentScaling = copy.deepcopy(self.defaultScaling)
+        self.defaultScaling = list(scale)
+        self.currentScaling = list(self.defaultScaling)
         self.update()
 
     def setDefaultColor(self, color):
@@ -409,7 +625,7 @@ class Component:
         if not isinstance(color, ColorType):
             raise TypeError("color should have type ColorType")
         self.default_color = np.array(color.copy().getRGB())
-        self.current_color = copy.deepcopy(self.default_color)
+        self.current_color = self.default_color.copy()
 
     def setCurrentPosition(self, pos):
         """
@@ -420,7 +636,7 @@ class Component:
         """
         if not isinstance(pos, Point):
             raise TypeError("pos should have type Point")
-        self.currentPos = pos.copy()
+        self.currentPos = pos
         self.update()
 
     def setCurrentColor(self, color):
@@ -453,7 +669,7 @@ class Component:
             raise TypeError("current scale should consists of scaling on 3 axis")
         if min(scale) != max(scale):
             raise ValueError("Component only accept uniform scaling")
-        self.currentScaling = copy.deepcopy(scale)
+        self.currentScaling = list(scale)
         self.update()
 
     def changeRotationAxis(self, u, v, w):
@@ -533,30 +749,67 @@ class Component:
         return self.wAxis.copy()
 
     def setU(self, u):
-        if len(u) != len(self.uAxis):
-            raise TypeError("axis should have the same size as the current one")
-        for i in range(len(u)):
-            self.uAxis[i] = u[i]
+        self.setAxis(0, u)
 
     def setV(self, v):
-        if len(v) != len(self.vAxis):
-            raise TypeError("axis should have the same size as the current one")
-        for i in range(len(v)):
-            self.vAxis[i] = v[i]
+        self.setAxis(1, v)
 
     def setW(self, w):
-        if len(w) != len(self.wAxis):
+        self.setAxis(2, w)
+
+    def setAxis(self, index, coords):
+        """
+        Change one rotation axis in place, so references to uAxis, vAxis or wAxis see the new direction.
+        The shared default axes are copied first, and setting an axis to its current value does nothing
+
+        :param index: 0, 1 or 2 for u, v or w
+        :type index: int
+        :param coords: new axis direction
+        :type coords: list<float>
+        """
+        axis = self.axisBucket[index]
+        if len(coords) != len(axis):
             raise TypeError("axis should have the same size as the current one")
-        for i in range(len(w)):
-            self.wAxis[i] = w[i]
+        if all(axis[i] == coords[i] for i in range(len(coords))):
+            return
+        if self._axes is None:
+            self._axes = tuple(a.copy() for a in self.defaultAxes)
+            axis = self._axes[index]
+        for i in range(len(coords)):
+            axis[i] = coords[i]
+        self._row("axes")[index] = axis.getCoords()
+        self.markDirty()
+
+    def getRanges(self):
+        """
+        :return: rotation extents of the u, v and w axes
+        :rtype: tuple<list<float>(2)>(3)
+        """
+        return self.defaultRanges if self._ranges is None else self._ranges
+
+    def setRange(self, index, r):
+        """
+        Replace the rotation extent of one axis. Unlike setRotateExtent, the limits are not checked
+
+        :param index: 0, 1 or 2 for u, v or w
+        :type index: int
+        :param r: lower and upper limit in degrees
+        :type r: list<float>(2)
+        """
+        ranges = list(self.getRanges())
+        ranges[index] = r
+        self._ranges = tuple(ranges)
 
     def setQuaternion(self, q):
         """
         sets a quaternion for rotation
+        The component keeps its own copy of q, so later changes to q only take effect through another setQuaternion
 
-        :param q: a quaternion created with Quaternion.py
-        :type q: Quaternion
+        :param q: a quaternion created with Quaternion.py, or a QuaternionArray holding one row
+        :type q: Quaternion or QuaternionArray
         """
+        if isinstance(q, QuaternionArray) and len(q) == 1:
+            q = q[0]
         if not isinstance(q, Quaternion):
             raise TypeError("q must be of type Quaternion")
         self.quat = q
@@ -566,3 +819,200 @@ class Component:
         clears the existing quaternion
         """
         self.quat = None
+
+    def _row(self, name):
+        """
+        This component's row of a SceneGraph array. A component whose hierarchy has no storage yet keeps the rows
+        it was given in _pending, and SceneGraph copies them in when it is built
+
+        :param name: SceneGraph array, e.g. "positions"
+        :type name: str
+        :rtype: numpy.ndarray
+        """
+        scene = self._scene
+        if scene is not None:
+            return getattr(scene, name)[self._index]
+        pending = self._pendingRows()
+        row = pending.get(name)
+        if row is None:
+            row = pending[name] = SceneGraph.rowDefaults[name].copy()
+        return row
+
+    def _pendingRows(self):
+        if self._pending is None:
+            self._pending = {}
+        return self._pending
+
+    # Views into this component's row of the SceneGraph arrays
+    @property
+    def transformationMat(self):
+        """
+        the homogeneous transformation matrix for the current joint, in world coordinates
+        """
+        return self._row("worldMats")
+
+    @property
+    def uAngle(self):
+        return float(self._row("angles")[0])
+
+    @uAngle.setter
+    def uAngle(self, angle):
+        self._row("angles")[0] = angle
+        self.markDirty()
+
+    @property
+    def vAngle(self):
+        return float(self._row("angles")[1])
+
+    @vAngle.setter
+    def vAngle(self, angle):
+        self._row("angles")[1] = angle
+        self.markDirty()
+
+    @property
+    def wAngle(self):
+        return float(self._row("angles")[2])
+
+    @wAngle.setter
+    def wAngle(self, angle):
+        self._row("angles")[2] = angle
+        self.markDirty()
+
+    @property
+    def currentPos(self):
+        # a copy, changing it doesn't move the component; assign currentPos or call setCurrentPosition
+        return Point(self._row("positions"))
+
+    @currentPos.setter
+    def currentPos(self, pos):
+        self._row("positions")[:] = pos.getCoords()
+        self.markDirty()
+
+    @property
+    def currentScaling(self):
+        # a copy, like currentPos
+        return self._row("scales").tolist()
+
+    @currentScaling.setter
+    def currentScaling(self, scale):
+        self._row("scales")[:] = scale
+        self.markDirty()
+
+    @property
+    def preRotationMat(self):
+        return self._row("preMats")
+
+    @preRotationMat.setter
+    def preRotationMat(self, mat):
+        self._row("preMats")[:] = mat
+        self.markDirty()
+
+    @property
+    def postRotationMat(self):
+        return self._row("postMats")
+
+    @postRotationMat.setter
+    def postRotationMat(self, mat):
+        self._row("postMats")[:] = mat
+        self.markDirty()
+
+    @property
+    def uAxis(self):
+        return self.axisBucket[0]
+
+    @property
+    def vAxis(self):
+        return self.axisBucket[1]
+
+    @property
+    def wAxis(self):
+        return self.axisBucket[2]
+
+    @property
+    def axisBucket(self):
+        # change the axes with setU, setV and setW, the default ones are shared by every component
+        return self.defaultAxes if self._axes is None else self._axes
+
+    @property
+    def uRange(self):
+        return self.getRanges()[0]
+
+    @uRange.setter
+    def uRange(self, r):
+        self.setRange(0, r)
+
+    @property
+    def vRange(self):
+        return self.getRanges()[1]
+
+    @vRange.setter
+    def vRange(self, r):
+        self.setRange(1, r)
+
+    @property
+    def wRange(self):
+        return self.getRanges()[2]
+
+    @wRange.setter
+    def wRange(self, r):
+        self.setRange(2, r)
+
+    @property
+    def texture(self):
+        # most components are never textured, so their Texture is only created when something asks for it
+        if self._texture is None:
+            self._texture = Texture()
+        return self._texture
+
+    @texture.setter
+    def texture(self, texture):
+        self._texture = texture
+
+    @property
+    def quat(self):
+        # a copy, so that rotation changes can only come through the setter, which marks this component dirty
+        q = self._quat
+        return None if q is None else Quaternion(q.s, q.v0, q.v1, q.v2)
+
+    @quat.setter
+    def quat(self, q):
+        if q is not None:
+            q = Quaternion(q.s, q.v0, q.v1, q.v2)
+        self._quat = q
+        if q is not None:
+            self._row("quats")[:] = (q.s, *q.v)
+        if self._scene is not None:
+            self._scene.useQuat[self._index] = q is not None
+        else:
+            self._pendingRows()["useQuat"] = q is not None
+        self.markDirty()
+
+
+if __name__ == "__main__":
+    import time
+    import tracemalloc
+
+    # memory per component of a built and updated hierarchy, and the cost of per-event position changes
+    n = 2000
+    # the first update imports a few modules, keep them out of the measurement
+    warmUp = Component(Point((0, 0, 0)))
+    warmUp.addChild(Component(Point((0, 0, 0))))
+    warmUp.update()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    root = Component(Point((0, 0, 0)))
+    nodes = [root]
+    for i in range(1, n):
+        child = Component(Point((0, 0, 0.1)))
+        nodes[(i - 1) // 4].addChild(child)
+        nodes.append(child)
+    root.update(np.identity(4))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{n} components: {(after - before) / n:.0f} bytes per component")
+
+    t1 = time.perf_counter()
+    for i in range(10000):
+        nodes[-1].setCurrentPosition(Point((i * 1e-4, 0, 0)))
+    t2 = time.perf_counter()
+    print(f"setCurrentPosition(Point(...)) with update: {(t2 - t1) / 10000 * 1e6:.1f} us per call")
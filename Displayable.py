@@ -11,9 +11,34 @@ class Displayable:
     """
     Interface for displayable object
     """
+    # instanced objects are queued with submit() and drawn together, instead of drawn one by one with draw()
+    instanced = False
+
     def __init__(self):
         pass
 
+    def getModelMatrix(self, transformationMat):
+        """
+        model matrix to draw this object with, given its component's transformation matrix
+        """
+        return transformationMat
+
+    def submit(self, transformationMat, color):
+        raise NotImplementedError
+
+    def getBounds(self):
+        """
+        axis-aligned bounding box in the owning component's space as (min, max), or None if unknown
+        """
+        return None
+
+    def updateLOD(self, lodView, transformationMat):
+        """
+        pick the detail level to draw with this frame, objects with a single level ignore this.
+        Returns True if getBounds changed as a result, e.g. because a level with larger bounds was loaded
+        """
+        return False
+
     def draw(self):
         raise NotImplementedError
 
@@ -9,6 +9,9 @@ Modified by Daniel Scrivener 07/22
 
 from Displayable import Displayable
 from GLBuffer import VAO, VBO, EBO
+from InstancedMesh import InstancedMesh
+from GeometryRegistry import GeometryRegistry
+from LOD import LODSelector
 import numpy as np
 import ColorType
 from collada import *
@@ -50,9 +53,26 @@ class DisplayableMesh(Displayable):
 
     defaultColor = None
 
-    def __init__(self, shaderProg, scale, vertexData, indexData, color=ColorType.BLUE):
+    geometry = None  # InstancedMesh shared with every mesh created with the same geometryKey
+    scaleMat = None  # scale applied in the instance transform instead of baked into the vertices
+
+    levels = None  # list<InstancedMesh>, detail levels from finest to coarsest, None until a level is first used
+    levelKeys = None  # GeometryRegistry key of every level
+    lodLevel = 0  # index of geometry in levels
+    lodSelector = LODSelector()  # shared by every mesh unless replaced per instance
+    initialized = False  # levels loaded after initialize() are uploaded right away
+
+    # bounds in the owning component's space (scale applied), covering every detail level loaded so far
+    boundsMin = None  # numpy.ndarray (3,)
+    boundsMax = None  # numpy.ndarray (3,)
+    boundingCenter = None  # numpy.ndarray (3,)
+    boundingRadius = 0.0
+
+    def __init__(self, shaderProg, scale, vertexData, indexData, color=ColorType.BLUE, geometryKey=None,
+                 lodLevels=None):
         """
-        :param shaderProg: compiled shader program
+        :param shaderProg: compiled shader program, or None for a headless mesh that only provides geometry and \
+            bounds, e.g. for BatchFK. Headless meshes can't be initialized or drawn
         :type shaderProg: GLProgram
         :param scale: set of three scale factors to be applied to each vertex
         :type scale: list or tuple
@@ -60,6 +80,14 @@ class DisplayableMesh(Displayable):
         :type filename: string
         :param color: vertex color to be applied uniformly
         :type color: ColorType
+        :param geometryKey: meshes created with the same key share one GPU copy of vertexData and are drawn \
+            instanced, with scale and color applied per instance. vertexData is not modified in that case. \
+            If None, scale and color are baked into a copy of vertexData and the mesh gets its own buffers
+        :type geometryKey: hashable
+        :param lodLevels: GeometryRegistry keys of coarser detail levels, from finer to coarser. Only used with a \
+            geometryKey. A level is loaded when updateLOD first selects it, and dropped if it has no fewer \
+            triangles than vertexData
+        :type lodLevels: list or None
         """
         super(DisplayableMesh, self).__init__()
         assert(len(scale) == 3)
@@ -67,34 +95,154 @@ class DisplayableMesh(Displayable):
         self.defaultColor = np.array(color.getRGB())
 
         self.shaderProg = shaderProg
-        self.shaderProg.use()
+        if shaderProg is not None:
+            self.shaderProg.use()
+
+        if geometryKey is not None:
+            self.instanced = True
+            self.indices = indexData
+            self.vertices = vertexData
+            self.scaleMat = np.diag([scale[0], scale[1], scale[2], 1.0])
+            self.levelKeys = [geometryKey] + list(lodLevels or [])
+            self.levels = [InstancedMesh.get(shaderProg, geometryKey, vertexData, indexData)]
+            self.levels += [None] * (len(self.levelKeys) - 1)
+            self.lodLevel = 0
+            self.geometry = self.levels[0]
+            self.computeBounds([self.levels[0].vertices], scale)
+            return
 
-        self.vao = VAO()
-        self.vbo = VBO()  # vbo can only be initiate with glProgram activated
-        self.ebo = EBO()
+        if shaderProg is not None:
+            self.vao = VAO()
+            self.vbo = VBO()  # vbo can only be initiate with glProgram activated
+            self.ebo = EBO()
 
         self.indices = indexData
-        self.vertices = vertexData
+        self.vertices = self.bakeVertices(vertexData, scale, self.defaultColor)
+        self.computeBounds([self.vertices], (1, 1, 1))
+
+    def computeBounds(self, vertexArrays, scale):
+        """
+        Compute the AABB and a bounding sphere around the AABB center of all vertices, after scaling
+
+        :param vertexArrays: flattened vertices, 11 floats per vertex
+        :type vertexArrays: list<numpy.ndarray>
+        :param scale: set of three scale factors
+        :type scale: list or tuple
+        """
+        positions = np.concatenate([np.asarray(v).reshape(-1, 11)[:, 0:3] for v in vertexArrays]) * scale
+        self.boundsMin = positions.min(axis=0)
+        self.boundsMax = positions.max(axis=0)
+        self.boundingCenter = (self.boundsMin + self.boundsMax) * 0.5
+        self.boundingRadius = float(np.sqrt(((positions - self.boundingCenter) ** 2).sum(axis=1).max()))
 
-        for i in range(len(self.vertices) // 11):
-            i = i * 11
-            self.vertices[i] = self.vertices[i] * scale[0]
-            self.vertices[i + 1] = self.vertices[i + 1] * scale[1]
-            self.vertices[i + 2] = self.vertices[i + 2] * scale[2]
-            self.vertices[i + 5] = self.defaultColor[0]
-            self.vertices[i + 6] = self.defaultColor[1]
-            self.vertices[i + 7] = self.defaultColor[2]
+    def getBounds(self):
+        return (self.boundsMin, self.boundsMax)
+
+    @staticmethod
+    def bakeVertices(vertexData, scale, color):
+        """
+        Scale the positions and write color into every vertex, as whole-array operations on an (N, 11) view.
+        vertexData itself is left untouched, so shared or read-only arrays (e.g. from the mesh cache) can be passed.
+
+        :param vertexData: flattened vertices, 11 floats per vertex
+        :type vertexData: numpy.ndarray
+        :param scale: set of three scale factors
+        :type scale: list or tuple
+        :param color: RGB color
+        :type color: numpy.ndarray
+        :return: flattened baked vertices
+        :rtype: numpy.ndarray
+        """
+        vertices = np.array(vertexData, dtype=np.float64).reshape(-1, 11)
+        vertices[:, 0:3] *= scale
+        vertices[:, 5:8] = color
+        return vertices.reshape(-1)
 
     def draw(self):
+        if self.instanced:
+            self.geometry.drawSingle()
+            return
         self.vao.bind()
         self.ebo.draw()
         self.vao.unbind()
 
+    def updateLOD(self, lodView, transformationMat):
+        """
+        Switch geometry to the level matching the mesh's size on screen
+
+        :param lodView: camera data of the current frame
+        :type lodView: LODView
+        :param transformationMat: world matrix of the owning component
+        :type transformationMat: numpy.ndarray
+        :return: True if a newly loaded level changed what getBounds returns
+        :rtype: bool
+        """
+        if self.levels is None or len(self.levels) < 2:
+            return False
+        center = transformationMat[:3, :3] @ self.boundingCenter + transformationMat[:3, 3]
+        # largest axis scale of the world transform
+        radius = self.boundingRadius * np.sqrt((transformationMat[:3, :3] ** 2).sum(axis=0).max())
+        size = lodView.screenSize(center, radius)
+        self.lodLevel = self.lodSelector.select(size, self.lodLevel, len(self.levels))
+        boundsChanged = False
+        while self.levels[self.lodLevel] is None:
+            boundsChanged |= self.loadLevel(self.lodLevel)
+            # a dropped level is replaced by the next coarser one
+            self.lodLevel = min(self.lodLevel, len(self.levels) - 1)
+        self.geometry = self.levels[self.lodLevel]
+        return boundsChanged
+
+    def loadLevel(self, index):
+        """
+        Load a coarser detail level through GeometryRegistry, or drop it if it doesn't save any triangles
+
+        :param index: index of the level in levels
+        :type index: int
+        :return: whether the bounds grew to cover the new level
+        :rtype: bool
+        """
+        key = self.levelKeys[index]
+        vertices, indices = GeometryRegistry.get(key)
+        if len(indices) >= len(self.levels[0].indices):
+            del self.levels[index]
+            del self.levelKeys[index]
+            return False
+        level = InstancedMesh.get(self.shaderProg, key, vertices, indices)
+        if self.initialized:
+            level.initialize()
+        self.levels[index] = level
+        oldMin, oldMax = self.boundsMin, self.boundsMax
+        self.computeBounds([level.vertices for level in self.levels if level is not None], np.diag(self.scaleMat)[:3])
+        return bool((self.boundsMin < oldMin).any() or (self.boundsMax > oldMax).any())
+
+    def getModelMatrix(self, transformationMat):
+        if self.instanced:
+            return transformationMat @ self.scaleMat
+        return transformationMat
+
+    def submit(self, transformationMat, color):
+        """
+        Queue this mesh for the next instanced draw of its geometry
+
+        :param transformationMat: world matrix of the owning component
+        :type transformationMat: numpy.ndarray
+        :param color: RGB color of this instance
+        :type color: numpy.ndarray
+        """
+        self.geometry.submit(transformationMat @ self.scaleMat, color)
+
     def initialize(self):
         """
         Remember to bind VAO before this initialization. If VAO is not bind, program might throw an error
         in systems that don't enable a default VAO after GLProgram compilation
         """
+        if self.instanced:
+            # uploads the shared geometry only once
+            for level in self.levels:
+                if level is not None:
+                    level.initialize()
+            self.initialized = True
+            return
         self.vao.bind()
         self.vbo.setBuffer(self.vertices, 11)
         self.ebo.setBuffer(self.indices)
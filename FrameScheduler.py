@@ -0,0 +1,82 @@
+"""
+Decides when the canvas needs to draw a new frame.
+A frame is drawn only after something requested it (input, pose changes, resize) or while an animation is running,
+and never faster than a configurable maximum frame rate. When nothing changes, no frame is scheduled at all.
+"""
+
+import time
+
+
+class FrameScheduler:
+    """
+    Keeps the dirty state of the frame and the time of the last frame.
+    It has no dependency on wx: the canvas asks nextDelay() when to draw and reports frameDrawn() afterwards.
+    """
+
+    maxFps = 120
+    dirty = True
+    lastFrameTime = None
+    animationSources = None  # list of callables returning True while they need continuous frames
+
+    framesDrawn = 0
+    redrawRequests = 0
+
+    def __init__(self, maxFps=120, clock=time.perf_counter):
+        """
+        :param maxFps: maximum frames per second, 0 or negative for no limit
+        :type maxFps: float
+        :param clock: function returning the current time in seconds
+        """
+        self.maxFps = maxFps
+        self.clock = clock
+        self.dirty = True
+        self.lastFrameTime = None
+        self.animationSources = []
+        self.framesDrawn = 0
+        self.redrawRequests = 0
+
+    def requestRedraw(self):
+        """
+        Mark the current frame as out of date
+        """
+        self.dirty = True
+        self.redrawRequests += 1
+
+    def addAnimationSource(self, source):
+        """
+        Register a callable that returns True while it needs a frame on every tick, e.g. an animation player
+        """
+        self.animationSources.append(source)
+
+    def removeAnimationSource(self, source):
+        if source in self.animationSources:
+            self.animationSources.remove(source)
+
+    def isAnimating(self):
+        return any(source() for source in self.animationSources)
+
+    def needsFrame(self):
+        return self.dirty or self.isAnimating()
+
+    def nextDelay(self, now=None):
+        """
+        Time to wait before the next frame may be drawn
+
+        :return: delay in seconds, or None if no frame is needed
+        :rtype: float or None
+        """
+        if not self.needsFrame():
+            return None
+        if self.lastFrameTime is None or self.maxFps <= 0:
+            return 0.0
+        if now is None:
+            now = self.clock()
+        return max(0.0, self.lastFrameTime + 1 / self.maxFps - now)
+
+    def frameDrawn(self, now=None):
+        """
+        Report that a frame was just drawn
+        """
+        self.dirty = False
+        self.lastFrameTime = self.clock() if now is None else now
+        self.framesDrawn += 1
@@ -0,0 +1,56 @@
+"""
+View frustum as six planes, used to skip parts of the scene that can't be seen.
+"""
+
+import numpy as np
+
+
+class Frustum:
+    """
+    Planes n . x + d >= 0 for points inside, in world space, extracted from the combined projection and view matrix
+    """
+    planes = None  # (6, 4) left, right, bottom, top, near, far as (nx, ny, nz, d)
+
+    def __init__(self, viewMat, projectionMat, columnMajor=True):
+        """
+        :param viewMat: view matrix
+        :type viewMat: numpy.ndarray
+        :param projectionMat: projection matrix
+        :type projectionMat: numpy.ndarray
+        :param columnMajor: both matrices are stored transposed, as GLUtility returns them by default
+        :type columnMajor: bool
+        """
+        if columnMajor:
+            clip = projectionMat.T @ viewMat.T
+        else:
+            clip = projectionMat @ viewMat
+        planes = np.empty((6, 4))
+        planes[0] = clip[3] + clip[0]
+        planes[1] = clip[3] - clip[0]
+        planes[2] = clip[3] + clip[1]
+        planes[3] = clip[3] - clip[1]
+        planes[4] = clip[3] + clip[2]
+        planes[5] = clip[3] - clip[2]
+        planes /= np.linalg.norm(planes[:, :3], axis=1)[:, None]
+        self.planes = planes
+
+    def outsideAABBs(self, mins, maxs):
+        """
+        Test axis-aligned boxes against the frustum. A box counts as outside only if it lies fully behind one plane,
+        so some boxes near the corners are kept although they are not visible.
+        Empty boxes (min > max) are always outside.
+
+        :param mins: lower corners
+        :type mins: numpy.ndarray (N, 3)
+        :param maxs: upper corners
+        :type maxs: numpy.ndarray (N, 3)
+        :return: True for every box that is certainly not visible
+        :rtype: numpy.ndarray (N,) bool
+        """
+        empty = (mins > maxs).any(axis=1)
+        centers = np.where(empty[:, None], 0.0, (mins + maxs) * 0.5)
+        extents = np.where(empty[:, None], 0.0, (maxs - mins) * 0.5)
+        normals = self.planes[:, :3]
+        # signed distance of the box corner furthest along every plane normal
+        distances = centers @ normals.T + extents @ np.abs(normals).T + self.planes[:, 3]
+        return empty | (distances < 0).any(axis=1)
@@ -51,12 +51,14 @@ class VBO:
     def bind(self):
         gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
 
-    def setBuffer(self, bufferDataArray: np.ndarray, vertexAttribSize: int):
+    def setBuffer(self, bufferDataArray: np.ndarray, vertexAttribSize: int, usage=gl.GL_STATIC_DRAW):
         """
         :param vertexAttribSize: the size of the vertex attribute
         :type vertexAttribSize: int
         :param bufferDataArray: the vertices data. It will be flatten in row-major order if its dimension isn't one
         :type bufferDataArray: numpy.ndarray
+        :param usage: buffer usage hint, use GL_STREAM_DRAW for data re-uploaded every frame
+        :type usage: int
         """
         # type conversion
         if bufferDataArray.dtype != np.dtype("float32"):
@@ -69,9 +71,13 @@ class VBO:
         byteLength = 4 * bufferSize  # 4 is the size of float32
 
         self.bind()
-        gl.glBufferData(gl.GL_ARRAY_BUFFER, byteLength, bufferData, gl.GL_STATIC_DRAW)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, byteLength, bufferData, usage)
 
-    def setAttribPointer(self, attribLoc, stride=0, offset=0, attribSize=0):
+    def setAttribPointer(self, attribLoc, stride=0, offset=0, attribSize=0, divisor=0):
+        """
+        :param divisor: 0 for per-vertex attributes, 1 to advance the attribute once per instance
+        :type divisor: int
+        """
         attribSize = self.vertexAttribSize if attribSize == 0 else attribSize
         if attribSize == 0:
             raise Exception("Cannot set vertex attrib with empty attribSize")
@@ -87,6 +93,8 @@ class VBO:
         stride *= 4
         gl.glVertexAttribPointer(attribLoc, attribSize, gl.GL_FLOAT, gl.GL_FALSE, stride, offset)
         gl.glEnableVertexAttribArray(attribLoc)
+        if divisor:
+            gl.glVertexAttribDivisor(attribLoc, divisor)
 
     def draw(self):
         gl.glDrawArrays(gl.GL_TRIANGLES, 0, self.vertexNum)
@@ -124,6 +132,9 @@ class EBO:
     def draw(self):
         gl.glDrawElements(gl.GL_TRIANGLES, self.indexNum, gl.GL_UNSIGNED_INT, None)
 
+    def drawInstanced(self, instanceNum):
+        gl.glDrawElementsInstanced(gl.GL_TRIANGLES, self.indexNum, gl.GL_UNSIGNED_INT, None, instanceNum)
+
 
 class VAO:
     """
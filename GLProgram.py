@@ -60,10 +60,25 @@ class GLProgram:
     ready = False  # a control flag which reflect if this GLprogram is ready
     debug = 0
 
+    # the GLProgram currently bound with glUseProgram, shared by all programs
+    boundProgram = None
+
+    # size of the bone palette uniform array, the most bones a skinned mesh can have
+    maxBones = 64
+
+    uniformLocations = None  # variable name -> uniform location, resolved once after compile
+    attribLocations = None  # attrib name -> attrib location, resolved once after compile
+    uniformValues = None  # uniform location -> last uploaded value
+    stats = None  # counters for use() and uniform uploads, see getStats
+
     def __init__(self) -> None:
         self.program = gl.glCreateProgram()
 
         self.ready = False
+        self.uniformLocations = {}
+        self.attribLocations = {}
+        self.uniformValues = {}
+        self.resetStats()
 
         # define attribs name and corresponding method to set it
         self.attribs = {
@@ -72,6 +87,11 @@ class GLProgram:
             "vertexColor": "aColor",
             "vertexTexture": "aTexture",
 
+            # per-instance attributes, used when drawing instanced
+            "instanceModelMat": "aInstanceModel",
+            "instanceColor": "aInstanceColor",
+            "useInstancing": "instanced",
+
             "textureImage": "theTexture01",
 
             "projectionMat": "projection",
@@ -81,6 +101,11 @@ class GLProgram:
             "vertexJoints": "joint",
             "vertexJointWeights" : "jw",
 
+            # skinned meshes blend the model matrix per vertex from a palette of bone matrices
+            "useSkinning": "skinned",
+            "bonePalette": "bones",
+            "boneColors": "boneColors",
+
             "currentColor": "cColor"
         }
 
@@ -88,6 +113,8 @@ class GLProgram:
         self.fragmentShaderSource = self.genFragShaderSource()
 
     def __del__(self) -> None:
+        if GLProgram.boundProgram is self:
+            GLProgram.boundProgram = None
         try:
             gl.glDeleteProgram(self.program)
         except Exception as e:
@@ -112,23 +139,46 @@ class GLProgram:
         in vec3 {self.attribs["vertexNormal"]};
         in vec3 {self.attribs["vertexColor"]};
         in vec2 {self.attribs["vertexTexture"]};
+        in mat4 {self.attribs["instanceModelMat"]};
+        in vec3 {self.attribs["instanceColor"]};
+        in vec2 {self.attribs["vertexJoints"]};
+        in vec2 {self.attribs["vertexJointWeights"]};
         
         out vec3 vPos;
         out vec3 vColor;
         smooth out vec3 vNormal;
         out vec2 vTexture;
+        out vec3 vShadeColor;
         
         uniform mat4 {self.attribs["projectionMat"]};
         uniform mat4 {self.attribs["viewMat"]};
         uniform mat4 {self.attribs["modelMat"]};
+        uniform vec3 {self.attribs["currentColor"]};
+        uniform bool {self.attribs["useInstancing"]};
+        uniform bool {self.attribs["useSkinning"]};
+        uniform mat4 {self.attribs["bonePalette"]}[{self.maxBones}];
+        uniform vec3 {self.attribs["boneColors"]}[{self.maxBones}];
         
         void main()
         {{
-            gl_Position = {self.attribs["projectionMat"]} * {self.attribs["viewMat"]} * {self.attribs["modelMat"]} * vec4({self.attribs["vertexPos"]}, 1.0);
-            vPos = vec3({self.attribs["modelMat"]} * vec4({self.attribs["vertexPos"]}, 1.0));
+            // instanced draws take model matrix and color from the instance buffer instead of the uniforms
+            mat4 modelMatrix = {self.attribs["useInstancing"]} ? {self.attribs["instanceModelMat"]} : {self.attribs["modelMat"]};
+            vec3 shadeColor = {self.attribs["useInstancing"]} ? {self.attribs["instanceColor"]} : {self.attribs["currentColor"]};
+            if ({self.attribs["useSkinning"]})
+            {{
+                // linear blend of the two bones moving this vertex, colored like the first one
+                int joint0 = int({self.attribs["vertexJoints"]}.x + 0.5);
+                int joint1 = int({self.attribs["vertexJoints"]}.y + 0.5);
+                modelMatrix = {self.attribs["vertexJointWeights"]}.x * {self.attribs["bonePalette"]}[joint0]
+                    + {self.attribs["vertexJointWeights"]}.y * {self.attribs["bonePalette"]}[joint1];
+                shadeColor = {self.attribs["boneColors"]}[joint0];
+            }}
+            gl_Position = {self.attribs["projectionMat"]} * {self.attribs["viewMat"]} * modelMatrix * vec4({self.attribs["vertexPos"]}, 1.0);
+            vPos = vec3(modelMatrix * vec4({self.attribs["vertexPos"]}, 1.0));
             vColor = {self.attribs["vertexColor"]};
-            vNormal = normalize(transpose(inverse({self.attribs["modelMat"]})) * vec4({self.attribs["vertexNormal"]}, 0.0) ).xyz;
+            vNormal = normalize(transpose(inverse(modelMatrix)) * vec4({self.attribs["vertexNormal"]}, 0.0) ).xyz;
             vTexture = {self.attribs["vertexTexture"]};
+            vShadeColor = shadeColor;
         }}
         '''
         return vss
@@ -141,8 +191,8 @@ class GLProgram:
         in vec3 vColor;
         smooth in vec3 vNormal;
         in vec2 vTexture;
+        in vec3 vShadeColor;
 
-        uniform vec3 {self.attribs["currentColor"]};
         uniform sampler2D {self.attribs["textureImage"]};
         
         out vec4 FragColor;
@@ -154,8 +204,8 @@ class GLProgram:
             FragColor = -1 * abs(placeHolder);
             FragColor = clamp(FragColor, 0, 1);
 
-            // Shade according to vertex colors
-            FragColor = vec4({self.attribs["currentColor"]}, 1.0);
+            // Shade according to the component color
+            FragColor = vec4(vShadeColor, 1.0);
         }}
         """
         return fss
@@ -171,10 +221,14 @@ class GLProgram:
         self.fragmentShaderSource = fss
 
     def getAttribLocation(self, name):
+        if name in self.attribLocations:
+            return self.attribLocations[name]
         programName = self.getAttribName(name)
         attribLoc = gl.glGetAttribLocation(self.program, programName)
         if attribLoc == -1 and self.debug > 1:
             print(f"Warning: Attrib {name} cannot found. Might have been optimized off")
+        if self.ready:
+            self.attribLocations[name] = attribLoc
         return attribLoc
 
     def getUniformLocation(self, name, lookThroughAttribs=True):
@@ -182,11 +236,63 @@ class GLProgram:
             variableName = self.getAttribName(name)
         else:
             variableName = name
+        if variableName in self.uniformLocations:
+            self.stats["locationHits"] += 1
+            return self.uniformLocations[variableName]
+        self.stats["locationMisses"] += 1
         uniformLoc = gl.glGetUniformLocation(self.program, variableName)
         if uniformLoc == -1 and self.debug > 1:
             print(f"Warning: Uniform {name} cannot found. Might have been optimized off")
+        if self.ready:
+            self.uniformLocations[variableName] = uniformLoc
         return uniformLoc
 
+    def cacheLocations(self):
+        """
+        Resolve the locations of every active uniform and of every attrib in self.attribs.
+        Called after the program is linked; later lookups never reach OpenGL.
+        """
+        self.uniformLocations = {}
+        self.attribLocations = {}
+        self.uniformValues = {}
+        uniformNum = gl.glGetProgramiv(self.program, gl.GL_ACTIVE_UNIFORMS)
+        for i in range(uniformNum):
+            variableName = gl.glGetActiveUniform(self.program, i)[0]
+            if isinstance(variableName, bytes):
+                variableName = variableName.decode()
+            # arrays are reported as "name[0]"
+            variableName = variableName.split("[")[0]
+            self.uniformLocations[variableName] = gl.glGetUniformLocation(self.program, variableName)
+        for name, variableName in self.attribs.items():
+            # names which are not active uniforms are cached as -1, like glGetUniformLocation would return
+            self.uniformLocations.setdefault(variableName, -1)
+            self.attribLocations[name] = gl.glGetAttribLocation(self.program, variableName)
+
+    def resetStats(self):
+        self.stats = {
+            "useCalls": 0,
+            "useSkipped": 0,
+            "uploads": 0,
+            "uploadsSkipped": 0,
+            "locationHits": 0,
+            "locationMisses": 0,
+        }
+
+    def getStats(self):
+        """
+        Counters since the last resetStats, plus the hit rates of the bound-program check,
+        the uniform value cache and the location cache
+
+        :rtype: dict
+        """
+        result = dict(self.stats)
+        result["useHitRate"] = self.stats["useSkipped"] / max(1, self.stats["useCalls"])
+        result["uploadHitRate"] = self.stats["uploadsSkipped"] / max(
+            1, self.stats["uploads"] + self.stats["uploadsSkipped"])
+        result["locationHitRate"] = self.stats["locationHits"] / max(
+            1, self.stats["locationHits"] + self.stats["locationMisses"])
+        return result
+
     def getAttribName(self, attribIndexName):
         return self.attribs[attribIndexName]
 
@@ -213,70 +319,126 @@ class GLProgram:
         gl.glAttachShader(self.program, vs)
         gl.glAttachShader(self.program, fs)
         gl.glLinkProgram(self.program)
+        # a relinked program must be bound again before its uniforms are set
+        GLProgram.resetBinding()
         error = gl.glGetProgramiv(self.program, gl.GL_LINK_STATUS)
         if error != gl.GL_TRUE:
             info = gl.glGetShaderInfoLog(self.program)
             raise Exception(info)
 
         self.ready = True
+        self.cacheLocations()
+
+    @staticmethod
+    def resetBinding():
+        """
+        Forget which program is bound, so the next use() calls glUseProgram again.
+        Call this after making a GL context current, and after binding a program without use()
+        """
+        GLProgram.boundProgram = None
 
     def use(self):
         """
         This is required before the uniforms set up.
+        Does nothing if this program is already bound.
         """
         if not self.ready:
             raise Exception("GLProgram must compile before use it")
+        self.stats["useCalls"] += 1
+        if GLProgram.boundProgram is self:
+            self.stats["useSkipped"] += 1
+            return
         gl.glUseProgram(self.program)
+        GLProgram.boundProgram = self
+
+    def uploadUniform(self, name, value, upload, lookThroughAttribs=True):
+        """
+        Upload a uniform value unless it equals the value uploaded last time to the same location.
+        Uniform values are kept per program by OpenGL, so skipped uploads are safe.
+
+        :param value: the new value
+        :param upload: function taking (location, value) that makes the actual glUniform* call
+        :return: None
+        """
+        loc = self.getUniformLocation(name, lookThroughAttribs)
+        if loc == -1:
+            return
+        lastValue = self.uniformValues.get(loc)
+        if lastValue is not None and np.array_equal(lastValue, value):
+            self.stats["uploadsSkipped"] += 1
+            return
+        self.use()
+        upload(loc, value)
+        self.stats["uploads"] += 1
+        self.uniformValues[loc] = np.array(value, copy=True)
 
     # some help methods to set uniform in program
     def setMat4(self, name, mat, lookThroughAttribs=True):
-        self.use()
         if mat.shape != (4, 4):
             raise Exception("Projection Matrix must have 4x4 shape")
-        gl.glUniformMatrix4fv(self.getUniformLocation(name, lookThroughAttribs), 1, gl.GL_FALSE, mat.flatten("C"))
+        self.uploadUniform(name, mat, lambda loc, m: gl.glUniformMatrix4fv(loc, 1, gl.GL_FALSE, m.flatten("C")),
+                           lookThroughAttribs)
+
+    def setMat4Array(self, name, mats, lookThroughAttribs=True):
+        """
+        Set a uniform mat4 array in one call
+
+        :param mats: matrices in the same layout setMat4 takes, shape (N, 4, 4)
+        :type mats: numpy.ndarray
+        """
+        if mats.ndim != 3 or mats.shape[1:] != (4, 4):
+            raise Exception("Matrix array must have Nx4x4 shape")
+        self.uploadUniform(name, mats, lambda loc, m: gl.glUniformMatrix4fv(
+            loc, len(m), gl.GL_FALSE, np.ascontiguousarray(m, dtype=np.float32).reshape(-1)), lookThroughAttribs)
 
     def setMat3(self, name, mat, lookThroughAttribs=True):
-        self.use()
         if mat.shape != (3, 3):
             raise Exception("Projection Matrix must have 3x3 shape")
-        gl.glUniformMatrix3fv(self.getUniformLocation(name, lookThroughAttribs), 1, gl.GL_FALSE, mat.flatten("C"))
+        self.uploadUniform(name, mat, lambda loc, m: gl.glUniformMatrix3fv(loc, 1, gl.GL_FALSE, m.flatten("C")),
+                           lookThroughAttribs)
 
     def setMat2(self, name, mat, lookThroughAttribs=True):
-        self.use()
         if mat.shape != (2, 2):
             raise Exception("Projection Matrix must have 2x2 shape")
-        gl.glUniformMatrix2fv(self.getUniformLocation(name, lookThroughAttribs), 1, gl.GL_FALSE, mat.flatten("C"))
+        self.uploadUniform(name, mat, lambda loc, m: gl.glUniformMatrix2fv(loc, 1, gl.GL_FALSE, m.flatten("C")),
+                           lookThroughAttribs)
 
     def setVec4(self, name, vec, lookThroughAttribs=True):
-        self.use()
         if vec.size != 4:
             raise Exception("Vector must have size 4")
-        gl.glUniform4fv(self.getUniformLocation(name, lookThroughAttribs), 1, vec)
+        self.uploadUniform(name, vec, lambda loc, v: gl.glUniform4fv(loc, 1, v), lookThroughAttribs)
 
     def setVec3(self, name, vec, lookThroughAttribs=True):
-        self.use()
         if vec.size != 3:
             raise Exception("Vector must have size 3")
-        gl.glUniform3fv(self.getUniformLocation(name, lookThroughAttribs), 1, vec)
+        self.uploadUniform(name, vec, lambda loc, v: gl.glUniform3fv(loc, 1, v), lookThroughAttribs)
+
+    def setVec3Array(self, name, vecs, lookThroughAttribs=True):
+        """
+        Set a uniform vec3 array in one call
+
+        :param vecs: shape (N, 3)
+        :type vecs: numpy.ndarray
+        """
+        if vecs.ndim != 2 or vecs.shape[1] != 3:
+            raise Exception("Vector array must have Nx3 shape")
+        self.uploadUniform(name, vecs, lambda loc, v: gl.glUniform3fv(
+            loc, len(v), np.ascontiguousarray(v, dtype=np.float32).reshape(-1)), lookThroughAttribs)
 
     def setVec2(self, name, vec, lookThroughAttribs=True):
-        self.use()
         if vec.size != 2:
             raise Exception("Vector must have size 2")
-        gl.glUniform2fv(self.getUniformLocation(name, lookThroughAttribs), 1, vec)
+        self.uploadUniform(name, vec, lambda loc, v: gl.glUniform2fv(loc, 1, v), lookThroughAttribs)
 
     def setBool(self, name, value, lookThroughAttribs=True):
-        self.use()
         if value not in (0, 1):
             raise Exception("bool only accept True/False/0/1")
-        gl.glUniform1i(self.getUniformLocation(name, lookThroughAttribs), int(value))
+        self.uploadUniform(name, int(value), lambda loc, v: gl.glUniform1i(loc, v), lookThroughAttribs)
 
     def setInt(self, name, value, lookThroughAttribs=True):
-        self.use()
         if value != int(value):
             raise Exception("set int only accept  integer")
-        gl.glUniform1i(self.getUniformLocation(name, lookThroughAttribs), int(value))
+        self.uploadUniform(name, int(value), lambda loc, v: gl.glUniform1i(loc, v), lookThroughAttribs)
 
     def setFloat(self, name, value, lookThroughAttribs=True):
-        self.use()
-        gl.glUniform1f(self.getUniformLocation(name, lookThroughAttribs), float(value))
+        self.uploadUniform(name, float(value), lambda loc, v: gl.glUniform1f(loc, v), lookThroughAttribs)
@@ -71,12 +71,21 @@ class GLUtility:
         return viewMatrix.transpose() if columnMajor else viewMatrix
 
     @staticmethod
-    def scale(xS, yS, zS, columnMajor=True):
-        result = np.identity(4)
+    def scale(xS, yS, zS, columnMajor=True, out=None):
+        """
+        4x4 homogeneous scaling matrix
+
+        :param out: 4x4 float array to write the result into instead of allocating a new one
+        :type out: numpy.ndarray
+        """
+        result = np.zeros((4, 4)) if out is None else out
+        result.fill(0)
         result[0, 0] = xS
         result[1, 1] = yS
         result[2, 2] = zS
-        return result.transpose() if columnMajor else result
+        result[3, 3] = 1
+        # diagonal matrices are their own transpose
+        return result
 
     @staticmethod
     def perspective(fov, width, height, znear, zfar, columnMajor=True):
@@ -108,18 +117,36 @@ class GLUtility:
         return result.transpose() if columnMajor else result
 
     @staticmethod
-    def translate(x, y, z, columnMajor=True):
+    def translate(x, y, z, columnMajor=True, out=None):
         """
         4x4 homogeneous translation matrix
+
+        :param out: 4x4 float array to write the result into instead of allocating a new one
+        :type out: numpy.ndarray
         """
-        result = np.identity(4)
-        result[0, 3] = x
-        result[1, 3] = y
-        result[2, 3] = z
-        return result.transpose() if columnMajor else result
+        result = np.zeros((4, 4)) if out is None else out
+        result.fill(0)
+        result[0, 0] = result[1, 1] = result[2, 2] = result[3, 3] = 1
+        if columnMajor:
+            result[3, 0] = x
+            result[3, 1] = y
+            result[3, 2] = z
+        else:
+            result[0, 3] = x
+            result[1, 3] = y
+            result[2, 3] = z
+        return result
 
     @staticmethod
-    def rotate(angle, rotationAxis, columnMajor=True):
+    def rotationQuaternion(angle, rotationAxis):
+        """
+        normalized quaternion of a rotation, as used by rotate
+
+        :param angle: rotation angle, in degs
+        :type angle: float
+        :return: (s, a, b, c), or None if the rotation is degenerate and rotate returns identity
+        :rtype: tuple or None
+        """
         a = angle / 180 * math.pi
 
         sinHalfAngle = math.sin(0.5 * a)
@@ -133,22 +160,167 @@ class GLUtility:
         # normalize
         norm = math.sqrt(s*s + a*a + b*b + c*c)
         if norm < 1e-6:
-            return np.identity(4)
-        s /= norm
-        a /= norm
-        b /= norm
-        c /= norm
+            return None
+        return (s / norm, a / norm, b / norm, c / norm)
 
-        result = np.zeros((4, 4))
-        result[0, 0] = 1 - 2 * b * b - 2 * c * c
-        result[1, 0] = 2 * a * b + 2 * s * c
-        result[2, 0] = 2 * a * c - 2 * s * b
-        result[0, 1] = 2 * a * b - 2 * s * c
-        result[1, 1] = 1 - 2 * a * a - 2 * c * c
-        result[2, 1] = 2 * b * c + 2 * s * a
-        result[0, 2] = 2 * a * c + 2 * s * b
-        result[1, 2] = 2 * b * c - 2 * s * a
-        result[2, 2] = 1 - 2 * a * a - 2 * b * b
+    @staticmethod
+    def writeRotation(result, q, scaling=(1, 1, 1), columnMajor=False):
+        """
+        write scale @ rotation matrix of unit quaternion q into the upper left 3x3 of result
+        """
+        s, a, b, c = q
+        xS, yS, zS = scaling
+        # r(i, j) writes row i, column j of the row major matrix
+        if columnMajor:
+            def r(i, j, value):
+                result[j, i] = value
+        else:
+            def r(i, j, value):
+                result[i, j] = value
+        r(0, 0, (1 - 2 * b * b - 2 * c * c) * xS)
+        r(1, 0, (2 * a * b + 2 * s * c) * yS)
+        r(2, 0, (2 * a * c - 2 * s * b) * zS)
+        r(0, 1, (2 * a * b - 2 * s * c) * xS)
+        r(1, 1, (1 - 2 * a * a - 2 * c * c) * yS)
+        r(2, 1, (2 * b * c + 2 * s * a) * zS)
+        r(0, 2, (2 * a * c + 2 * s * b) * xS)
+        r(1, 2, (2 * b * c - 2 * s * a) * yS)
+        r(2, 2, (1 - 2 * a * a - 2 * b * b) * zS)
+
+    @staticmethod
+    def rotate(angle, rotationAxis, columnMajor=True, out=None):
+        """
+        4x4 homogeneous rotation matrix
+
+        :param angle: rotation angle, in degs
+        :type angle: float
+        :param rotationAxis: rotation axis
+        :param out: 4x4 float array to write the result into instead of allocating a new one
+        :type out: numpy.ndarray
+        """
+        result = np.zeros((4, 4)) if out is None else out
+        result.fill(0)
         result[3, 3] = 1
+        q = GLUtility.rotationQuaternion(angle, rotationAxis)
+        if q is None:
+            result[0, 0] = result[1, 1] = result[2, 2] = 1
+            return result
+        GLUtility.writeRotation(result, q, columnMajor=columnMajor)
+        return result
 
-        return result.transpose() if columnMajor else result
+    @staticmethod
+    def trs(position, scaling, angles, axes, columnMajor=False, out=None):
+        """
+        Fused translate @ scale @ rotate(w) @ rotate(v) @ rotate(u), the local transformation Component builds from
+        its current position, scaling and u, v, w angles. The three rotations are combined as quaternions,
+        so the matrix is written once without intermediate 4x4 products.
+
+        :param position: translation
+        :param scaling: scale factors along three axes
+        :param angles: u, v, w rotation angles, in degs
+        :param axes: u, v, w rotation axes
+        :param out: 4x4 float array to write the result into instead of allocating a new one
+        :type out: numpy.ndarray
+        :rtype: numpy.ndarray
+        """
+        result = np.zeros((4, 4)) if out is None else out
+        result.fill(0)
+        q = (1.0, 0.0, 0.0, 0.0)
+        for angle, axis in zip(angles, axes):
+            r = GLUtility.rotationQuaternion(angle, axis)
+            if r is None:
+                continue
+            # q = r * q, later rotations are applied on the left
+            s1, a1, b1, c1 = r
+            s2, a2, b2, c2 = q
+            q = (s1 * s2 - a1 * a2 - b1 * b2 - c1 * c2,
+                 s1 * a2 + s2 * a1 + b1 * c2 - c1 * b2,
+                 s1 * b2 + s2 * b1 + c1 * a2 - a1 * c2,
+                 s1 * c2 + s2 * c1 + a1 * b2 - b1 * a2)
+        GLUtility.writeRotation(result, q, scaling, columnMajor)
+        if columnMajor:
+            result[3, 0:3] = position
+        else:
+            result[0:3, 3] = position
+        result[3, 3] = 1
+        return result
+
+    @staticmethod
+    def rotateBatch(angles, axes, out=None):
+        """
+        Batched rotate, returning only the row major 3x3 rotation part.
+        With K angles per row the rotations are combined so that the last one is applied last,
+        e.g. angles (N, 3) and axes (N, 3, 3) for u, v, w give rotate(w) @ rotate(v) @ rotate(u).
+
+        :param angles: rotation angles in degs, (N,) or (N, K)
+        :type angles: numpy.ndarray
+        :param axes: rotation axes, (N, 3) or (N, K, 3)
+        :type axes: numpy.ndarray
+        :param out: (N, 3, 3) float array to write the result into
+        :type out: numpy.ndarray
+        :rtype: numpy.ndarray (N, 3, 3)
+        """
+        angles = np.asarray(angles, dtype=np.float64)
+        axes = np.asarray(axes, dtype=np.float64)
+        if angles.ndim == 1:
+            angles = angles[:, None]
+            axes = axes[:, None, :]
+        n, k = angles.shape
+        if out is None:
+            out = np.empty((n, 3, 3))
+
+        halfRad = np.radians(angles) * 0.5
+        q = np.empty((n, k, 4))
+        q[:, :, 0] = np.cos(halfRad)
+        np.multiply(np.sin(halfRad)[:, :, None], axes, out=q[:, :, 1:])
+        norm = np.sqrt(np.einsum("nki,nki->nk", q, q))
+        degenerate = norm < 1e-6
+        norm[degenerate] = 1
+        q /= norm[:, :, None]
+        # rotate returns identity for these
+        q[degenerate] = (1, 0, 0, 0)
+
+        total = q[:, 0]
+        for i in range(1, k):
+            # total = q[:, i] * total, written out per component; np.cross is slow for small batches
+            s1, a1, b1, c1 = q[:, i, 0], q[:, i, 1], q[:, i, 2], q[:, i, 3]
+            s2, a2, b2, c2 = total[:, 0], total[:, 1], total[:, 2], total[:, 3]
+            total = np.stack((s1 * s2 - a1 * a2 - b1 * b2 - c1 * c2,
+                              s1 * a2 + s2 * a1 + b1 * c2 - c1 * b2,
+                              s1 * b2 + s2 * b1 + c1 * a2 - a1 * c2,
+                              s1 * c2 + s2 * c1 + a1 * b2 - b1 * a2), axis=1)
+
+        s, a, b, c = total[:, 0], total[:, 1], total[:, 2], total[:, 3]
+        out[:, 0, 0] = 1 - 2 * b * b - 2 * c * c
+        out[:, 1, 0] = 2 * a * b + 2 * s * c
+        out[:, 2, 0] = 2 * a * c - 2 * s * b
+        out[:, 0, 1] = 2 * a * b - 2 * s * c
+        out[:, 1, 1] = 1 - 2 * a * a - 2 * c * c
+        out[:, 2, 1] = 2 * b * c + 2 * s * a
+        out[:, 0, 2] = 2 * a * c + 2 * s * b
+        out[:, 1, 2] = 2 * b * c - 2 * s * a
+        out[:, 2, 2] = 1 - 2 * a * a - 2 * b * b
+        return out
+
+    @staticmethod
+    def trsBatch(positions, scalings, rotations, out=None):
+        """
+        Batched translate @ scale @ rotation, row major
+
+        :param positions: translations
+        :type positions: numpy.ndarray (N, 3)
+        :param scalings: scale factors along three axes
+        :type scalings: numpy.ndarray (N, 3)
+        :param rotations: 3x3 rotation matrices, e.g. from rotateBatch
+        :type rotations: numpy.ndarray (N, 3, 3)
+        :param out: (N, 4, 4) float array to write the result into
+        :type out: numpy.ndarray
+        :rtype: numpy.ndarray (N, 4, 4)
+        """
+        if out is None:
+            out = np.empty((len(rotations), 4, 4))
+        np.multiply(np.asarray(scalings)[:, :, None], rotations, out=out[:, :3, :3])
+        out[:, :3, 3] = positions
+        out[:, 3, :3] = 0
+        out[:, 3, 3] = 1
+        return out
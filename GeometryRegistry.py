@@ -0,0 +1,113 @@
+"""
+Central registry of primitive geometry.
+Every primitive type and level of detail registers a loader under a key, but nothing is parsed until the geometry is
+first requested. Loading happens at most once per key, even when several threads ask for it at the same time, so
+geometry can be preloaded in a background thread while the window opens.
+"""
+
+import threading
+
+
+class GeometryRegistry:
+    """
+    Helper methods to register, load and preload geometry by key
+    """
+    loaders = {}  # key -> callable returning (vertices, indices)
+    entries = {}  # key -> (vertices, indices), only keys that finished loading
+    keyLocks = {}  # key -> threading.Lock guarding the first load of that key
+    lock = threading.Lock()  # guards loaders and keyLocks
+
+    # statistics since program start
+    loadCount = 0
+
+    @classmethod
+    def register(cls, key, loader, *args):
+        """
+        Register how to load the geometry for key. Nothing is loaded yet.
+
+        :param key: identifies a primitive type and level of detail, e.g. its asset path
+        :type key: hashable
+        :param loader: function returning (vertices, indices)
+        :param args: arguments passed to loader
+        """
+        with cls.lock:
+            cls.loaders[key] = lambda: loader(*args)
+            cls.keyLocks.setdefault(key, threading.Lock())
+
+    @classmethod
+    def isRegistered(cls, key):
+        return key in cls.loaders
+
+    @classmethod
+    def isLoaded(cls, key):
+        return key in cls.entries
+
+    @classmethod
+    def get(cls, key):
+        """
+        Get the geometry for key, loading it on the first call.
+        Concurrent callers for the same key wait for the one load instead of parsing the file again.
+
+        :param key: a registered key
+        :type key: hashable
+        :return: (vertices, indices)
+        :rtype: tuple[numpy.ndarray, numpy.ndarray]
+        """
+        entry = cls.entries.get(key)
+        if entry is not None:
+            return entry
+        with cls.lock:
+            if key not in cls.loaders:
+                raise KeyError(f"No geometry registered for {key!r}")
+            loader = cls.loaders[key]
+            keyLock = cls.keyLocks[key]
+        with keyLock:
+            # another thread may have finished loading while we waited
+            entry = cls.entries.get(key)
+            if entry is None:
+                entry = loader()
+                cls.entries[key] = entry
+                cls.loadCount += 1
+        return entry
+
+    @classmethod
+    def preload(cls, keys=None, background=True):
+        """
+        Load geometry ahead of its first use
+
+        :param keys: keys to load, all registered keys if None
+        :type keys: list or None
+        :param background: load in a daemon thread instead of blocking the caller
+        :type background: bool
+        :return: the loading thread, or None when loading in the foreground
+        :rtype: threading.Thread or None
+        """
+        if keys is None:
+            with cls.lock:
+                keys = list(cls.loaders)
+        else:
+            keys = list(keys)
+
+        def loadAll():
+            for key in keys:
+                cls.get(key)
+
+        if not background:
+            loadAll()
+            return None
+        thread = threading.Thread(target=loadAll, name="GeometryPreload", daemon=True)
+        thread.start()
+        return thread
+
+    @classmethod
+    def unload(cls, key=None):
+        """
+        Forget loaded geometry so the next get loads it again. Registrations are kept.
+
+        :param key: key to forget, every key if None
+        """
+        with cls.lock:
+            if key is None:
+                cls.entries = {}
+            else:
+                cls.entries.pop(key, None)
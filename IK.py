@@ -0,0 +1,364 @@
+"""
+Inverse kinematics for Component chains.
+An IKSolver holds several chains of the same structure, e.g. the six legs of the Spider, and solves them together:
+every step works on arrays with one row per chain. Three methods are available: cyclic coordinate descent (CCD),
+FABRIK with the joint positions turned back into angles, and damped least squares on the Jacobian (DLS).
+Joint angles are always clamped to the components' rotation extents.
+"""
+
+import math
+import time
+
+import numpy as np
+
+from GLUtility import GLUtility
+
+
+class IKResult:
+    """
+    Outcome of one IKSolver.solve call
+    """
+    method = None
+    angles = None  # (B, D) solved angle of every degree of freedom, in degrees
+    errors = None  # (B,) distance from every end effector to its target
+    converged = None  # (B,) bool, error within the tolerance
+    iterations = 0
+    solveTime = 0.0  # seconds
+
+    def __init__(self, method, angles, errors, converged, iterations, solveTime):
+        self.method = method
+        self.angles = angles
+        self.errors = errors
+        self.converged = converged
+        self.iterations = iterations
+        self.solveTime = solveTime
+
+    def __repr__(self):
+        return (f"IKResult({self.method}: {int(self.converged.sum())}/{len(self.converged)} converged, "
+                f"max error {self.errors.max():.2e}, {self.iterations} iterations, {1e3 * self.solveTime:.2f} ms)")
+
+
+class IKSolver:
+    """
+    Solves B chains of L components each. Degrees of freedom are (position in chain, axis) pairs shared by every
+    chain; the end effector is a point fixed in the last component's frame
+    """
+    METHODS = ("ccd", "fabrik", "dls")
+
+    chains = None  # list<list<Component>>, base to tip
+    dofs = None  # list<(int, int)>, (component position in the chain, axis index) of every degree of freedom
+    effectors = None  # (B, 3) end effector in the frame of each chain's last component
+
+    method = "dls"
+    maxIterations = 20
+    tolerance = 1e-3  # distance at which a chain counts as solved
+    damping = 0.1  # DLS damping, larger is more stable near singularities but slower
+    maxStep = 20.0  # largest DLS angle change per iteration, in degrees
+
+    lastResult = None  # IKResult of the last solve
+
+    # gathered from the scene at the start of every solve
+    _scene = None
+    _rows = None  # (B, L) scene rows of the chains
+    _parentMats = None  # (B, 4, 4) world matrix above every chain base
+    _positions = None  # (B, L, 3)
+    _scales = None  # (B, L, 3)
+    _axes = None  # (B, L, 3, 3)
+    _preMats = None  # (B, L, 4, 4)
+    _postMats = None  # (B, L, 4, 4)
+    _ranges = None  # (B, L, 3, 2)
+
+    def __init__(self, chains, dofs=None, effectors=None, method="dls", maxIterations=20, tolerance=1e-3):
+        """
+        :param chains: chains of components, base first, each component the parent of the next. \
+            All chains need the same length
+        :type chains: list<list<Component>>
+        :param dofs: axes every chain position may rotate about, e.g. ["v", "u", "u", "u"]. All of "uvw" if None
+        :type dofs: list<str> or None
+        :param effectors: end effector in the frame of each chain's last component, (3,) for all chains or (B, 3). \
+            If None, the far end of the last component's mesh along its length
+        :type effectors: numpy.ndarray or None
+        :param method: default method, one of METHODS
+        :type method: str
+        :param maxIterations: iteration limit per solve
+        :type maxIterations: int
+        :param tolerance: see the class attribute
+        :type tolerance: float
+        """
+        if len(chains) == 0 or len({len(chain) for chain in chains}) != 1:
+            raise ValueError("IKSolver needs one or more chains of the same length")
+        for chain in chains:
+            for parent, child in zip(chain, chain[1:]):
+                if child.parent is not parent:
+                    raise ValueError("every component of a chain must be the parent of the next one")
+        if method not in self.METHODS:
+            raise ValueError(f"unknown IK method {method}, expected one of {self.METHODS}")
+        self.chains = [list(chain) for chain in chains]
+        length = len(chains[0])
+        dofs = dofs if dofs is not None else ["uvw"] * length
+        if len(dofs) != length:
+            raise ValueError("dofs needs one entry per chain position")
+        self.dofs = [(l, "uvw".index(axis)) for l, axes in enumerate(dofs) for axis in axes]
+        if effectors is None:
+            effectors = [self.meshTip(chain[-1]) for chain in chains]
+        self.effectors = np.broadcast_to(np.asarray(effectors, dtype=np.float64), (len(chains), 3)).copy()
+        self.method = method
+        self.maxIterations = maxIterations
+        self.tolerance = tolerance
+
+    @staticmethod
+    def meshTip(component):
+        """
+        The far end of a component's mesh along its local z axis, in the component's frame
+
+        :rtype: numpy.ndarray (3,)
+        """
+        bounds = None if component.displayObj is None else component.displayObj.getBounds()
+        if bounds is None:
+            return np.zeros(3)
+        tip = component.preRotationMat @ np.array([0.0, 0.0, bounds[1][2], 1.0])
+        return tip[:3]
+
+    def gather(self):
+        """
+        Read the chains' current transform state and rotation extents from the scene
+        """
+        scene = self.chains[0][0].getSceneGraph()
+        if scene is not self._scene:
+            # rows change whenever the hierarchy storage is rebuilt
+            self._rows = np.array([[c._index for c in chain] for chain in self.chains], dtype=np.intp)
+            self._ranges = np.array([[(c.uRange, c.vRange, c.wRange) for c in chain] for chain in self.chains],
+                                    dtype=np.float64)
+            self._scene = scene
+        if scene.useQuat[self._rows].any():
+            raise ValueError("IK chains must be driven by angles, not quaternions")
+        rows = self._rows
+        parents = scene.parents[rows[:, 0]]
+        self._parentMats = np.where((parents < 0)[:, None, None], scene.rootParentMat, scene.worldMats[parents])
+        self._positions = scene.positions[rows]
+        self._scales = scene.scales[rows]
+        self._axes = scene.axes[rows]
+        self._preMats = scene.preMats[rows]
+        self._postMats = scene.postMats[rows]
+        return scene.angles[rows]
+
+    def forward(self, angles):
+        """
+        Forward kinematics of every chain for the given angles
+
+        :param angles: u, v, w angles of every chain component, in degrees
+        :type angles: numpy.ndarray (B, L, 3)
+        :return: pivots (B, L, 3) the points each component rotates around, axesWorld (B, L, 3, 3) the u, v, w \
+            rotation axes in world space, and effector positions (B, 3)
+        :rtype: tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+        """
+        b, length = angles.shape[:2]
+        pivots = np.empty((b, length, 3))
+        axesWorld = np.empty((b, length, 3, 3))
+        identity = np.broadcast_to(np.identity(3), (b, 3, 3))
+        world = self._parentMats
+        for l in range(length):
+            base = world @ self._postMats[:, l] @ GLUtility.trsBatch(self._positions[:, l], self._scales[:, l],
+                                                                     identity)
+            pivots[:, l] = base[:, :3, 3]
+            # local rotation is Rw @ Rv @ Ru: w turns about the base frame, v about the frame after w, and so on
+            frame = base[:, :3, :3]
+            for k in (2, 1, 0):
+                axesWorld[:, l, k] = np.einsum("bij,bj->bi", frame, self._axes[:, l, k])
+                frame = frame @ GLUtility.rotateBatch(angles[:, l, k], self._axes[:, l, k])
+            transform = base.copy()
+            transform[:, :3, :3] = frame
+            world = transform @ self._preMats[:, l]
+        effectors = np.einsum("bij,bj->bi", world[:, :3, :3], self.effectors) + world[:, :3, 3]
+        axesWorld /= np.maximum(np.linalg.norm(axesWorld, axis=3, keepdims=True), 1e-12)
+        return pivots, axesWorld, effectors
+
+    def clamp(self, angles):
+        return np.clip(angles, self._ranges[..., 0], self._ranges[..., 1], out=angles)
+
+    @staticmethod
+    def alignAngle(axis, pivot, current, target):
+        """
+        Signed rotation about axis through pivot that brings current closest to target, per chain
+
+        :param axis: unit axes (B, 3)
+        :param pivot: points on the axes (B, 3)
+        :param current: points to move (B, 3)
+        :param target: points to move towards (B, 3)
+        :return: angles in degrees, 0 where either point lies on the axis
+        :rtype: numpy.ndarray (B,)
+        """
+        v1 = current - pivot
+        v2 = target - pivot
+        v1 = v1 - axis * (v1 * axis).sum(axis=1, keepdims=True)
+        v2 = v2 - axis * (v2 * axis).sum(axis=1, keepdims=True)
+        sine = (axis * np.cross(v1, v2)).sum(axis=1)
+        cosine = (v1 * v2).sum(axis=1)
+        degenerate = (np.linalg.norm(v1, axis=1) < 1e-9) | (np.linalg.norm(v2, axis=1) < 1e-9)
+        return np.where(degenerate, 0.0, np.degrees(np.arctan2(sine, cosine)))
+
+    def solve(self, targets, method=None, apply=True):
+        """
+        Move every chain's end effector towards its target
+
+        :param targets: world positions, one per chain
+        :type targets: numpy.ndarray (B, 3)
+        :param method: one of METHODS, the solver's default if None
+        :type method: str or None
+        :param apply: write the solved angles to the components, with one update of the hierarchy
+        :type apply: bool
+        :rtype: IKResult
+        """
+        method = method or self.method
+        if method not in self.METHODS:
+            raise ValueError(f"unknown IK method {method}, expected one of {self.METHODS}")
+        start = time.perf_counter()
+        targets = np.broadcast_to(np.asarray(targets, dtype=np.float64), (len(self.chains), 3))
+        angles = self.clamp(self.gather().copy())
+        step = {"ccd": self.stepCCD, "fabrik": self.stepFABRIK, "dls": self.stepDLS}[method]
+
+        _, _, effectors = self.forward(angles)
+        errors = np.linalg.norm(effectors - targets, axis=1)
+        iterations = 0
+        while iterations < self.maxIterations and (errors > self.tolerance).any():
+            active = errors > self.tolerance
+            angles[active] = step(angles, targets, active)[active]
+            iterations += 1
+            _, _, effectors = self.forward(angles)
+            errors = np.linalg.norm(effectors - targets, axis=1)
+
+        if apply:
+            self.apply(angles)
+        dofAngles = np.stack([angles[:, l, k] for l, k in self.dofs], axis=1)
+        self.lastResult = IKResult(method, dofAngles, errors, errors <= self.tolerance, iterations,
+                                   time.perf_counter() - start)
+        return self.lastResult
+
+    def stepCCD(self, angles, targets, active):
+        """
+        One CCD sweep from the tip to the base, turning one degree of freedom at a time towards the target
+        """
+        angles = angles.copy()
+        for l, k in reversed(self.dofs):
+            pivots, axesWorld, effectors = self.forward(angles)
+            delta = self.alignAngle(axesWorld[:, l, k], pivots[:, l], effectors, targets)
+            angles[:, l, k] += delta
+            self.clamp(angles)
+        return angles
+
+    def stepFABRIK(self, angles, targets, active):
+        """
+        One FABRIK backward and forward pass over the joint positions, then every component is turned, from the
+        base outwards, so that the next joint lands as close as its degrees of freedom allow to its new position
+        """
+        angles = angles.copy()
+        pivots, _, effectors = self.forward(angles)
+        points = np.concatenate((pivots, effectors[:, None]), axis=1)
+        lengths = np.linalg.norm(np.diff(points, axis=1), axis=2)
+        base = points[:, 0].copy()
+
+        solved = points.copy()
+        solved[:, -1] = targets
+        for i in range(len(lengths[0]) - 1, -1, -1):
+            solved[:, i] = self.placeAt(solved[:, i + 1], solved[:, i], lengths[:, i])
+        solved[:, 0] = base
+        for i in range(len(lengths[0])):
+            solved[:, i + 1] = self.placeAt(solved[:, i], solved[:, i + 1], lengths[:, i])
+
+        # components whose pivot coincides with the next one (e.g. a hip and its first segment) aim at the next
+        # point that is actually away from them
+        following = []
+        for l in range(len(lengths[0])):
+            j = l + 1
+            while j < len(lengths[0]) and lengths[:, l:j].sum(axis=1).max() < 1e-9:
+                j += 1
+            following.append(j)
+        for l, k in self.dofs:
+            pivots, axesWorld, effectors = self.forward(angles)
+            j = following[l]
+            current = effectors if j == len(lengths[0]) else pivots[:, j]
+            # match the direction of the solved segment rather than its absolute position, the pivot may have
+            # drifted from its solved position where an earlier component couldn't follow
+            target = pivots[:, l] + solved[:, j] - solved[:, l]
+            angles[:, l, k] += self.alignAngle(axesWorld[:, l, k], pivots[:, l], current, target)
+            self.clamp(angles)
+        # the joint axes can't always follow the unconstrained FABRIK positions, a CCD sweep takes up the rest
+        return self.stepCCD(angles, targets, active)
+
+    @staticmethod
+    def placeAt(anchor, point, length):
+        """
+        Point at the given distance from anchor, in the direction of point
+        """
+        direction = point - anchor
+        norm = np.linalg.norm(direction, axis=1, keepdims=True)
+        return anchor + direction / np.maximum(norm, 1e-12) * length[:, None]
+
+    def stepDLS(self, angles, targets, active):
+        """
+        One damped least squares step: dtheta = J^T (J J^T + damping^2 I)^-1 error
+        """
+        pivots, axesWorld, effectors = self.forward(angles)
+        columns = [np.cross(axesWorld[:, l, k], effectors - pivots[:, l]) for l, k in self.dofs]
+        # Jacobian per radian, (B, 3, D)
+        jacobian = np.stack(columns, axis=2)
+        error = targets - effectors
+        system = jacobian @ jacobian.transpose(0, 2, 1) + (self.damping ** 2) * np.identity(3)
+        delta = (jacobian.transpose(0, 2, 1) @ np.linalg.solve(system, error[:, :, None]))[:, :, 0]
+        delta = np.clip(np.degrees(delta), -self.maxStep, self.maxStep)
+        angles = angles.copy()
+        for d, (l, k) in enumerate(self.dofs):
+            angles[:, l, k] += delta[:, d]
+        return self.clamp(angles)
+
+    def apply(self, angles):
+        """
+        Write the chains' angles into the scene and update the hierarchy once
+
+        :param angles: u, v, w angles of every chain component
+        :type angles: numpy.ndarray (B, L, 3)
+        """
+        root = self.chains[0][0].getRoot()
+        with root.batchUpdate():
+            scene = root.getSceneGraph()
+            scene.angles[self._rows] = angles
+            scene.dirty[self._rows.reshape(-1)] = True
+            root.update()
+
+    def effectorPositions(self):
+        """
+        Current world positions of the end effectors
+
+        :rtype: numpy.ndarray (B, 3)
+        """
+        return self.forward(self.gather())[2]
+
+
+if __name__ == "__main__":
+    from ModelLinkage import Spider
+    from Point import Point
+
+    spider = Spider(None, Point((0, 0, 0)), None)
+    spider.update(np.identity(4))
+    body = spider.getComponent("body")
+    legs = list((body.leftLegs | body.rightLegs).values())
+    chains = [[leg, leg.link1, leg.link2, leg.link3] for leg in legs]
+
+    solver = IKSolver(chains, dofs=["v", "u", "u", "u"])
+    rest = solver.effectorPositions()
+    # plant every foot a little lower and further out than it rests
+    targets = rest + np.array([0.0, -0.2, 0.0]) + 0.15 * rest * np.array([1, 0, 1]) / np.linalg.norm(
+        rest * np.array([1, 0, 1]), axis=1, keepdims=True)
+    for method in IKSolver.METHODS:
+        solver.solve(rest, method="dls")
+        result = solver.solve(targets, method=method, apply=False)
+        print(f"{method:>6}: {result}")
+
+    # every frame: move the body and keep the feet planted, starting from the previous frame's solution
+    solver.solve(targets)
+    frameTimes = []
+    for frame in range(60):
+        spider.setCurrentPosition(Point((0.1 * math.sin(frame / 10), 0.05 * math.cos(frame / 7), 0)))
+        frameTimes.append(solver.solve(targets).solveTime)
+    print(f"foot planting: {1e3 * np.mean(frameTimes):.2f} ms per frame for {len(chains)} legs, "
+          f"final max error {solver.lastResult.errors.max():.1e}")
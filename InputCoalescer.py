@@ -0,0 +1,201 @@
+"""
+Coalescing of model edits made by input handlers.
+Mouse motion and wheel events can arrive many times between two frames, and applying each one right away updates the
+hierarchy every time. Handlers queue their edits here instead; only the latest edit of every target is kept,
+rotation steps are summed, and everything is applied once at the start of the next frame.
+"""
+
+from Point import Point
+
+
+class InputCoalescer:
+    """
+    Pending edits of a hierarchy, keyed by target. It has no dependency on wx: handlers queue edits, the canvas
+    calls flush() before drawing.
+
+    Positions and custom calls are applied inside one batchUpdate. Angles and rotations are applied after it, one
+    call per target, so the component's SelfCollision, if any, still checks them
+    """
+    root = None  # Component whose hierarchy is edited
+    positions = None  # dict id(Component) -> (Component, Point)
+    angles = None  # dict (id(Component), axis index) -> (Component, axis, angle)
+    rotations = None  # dict (id(Component), axis index) -> [Component, axis, summed degrees]
+    calls = None  # dict key -> (function, args)
+    updateRequested = False  # an update of the hierarchy was asked for since the last flush
+
+    pendingEvents = 0  # events queued since the last flush
+    eventsQueued = 0  # events queued so far
+    eventsMerged = 0  # events folded into another event's edit so far
+    lastFlushEvents = 0  # events handled by the last flush
+    lastFlushEdits = 0  # edits applied by the last flush
+
+    def __init__(self, root):
+        """
+        :param root: top of the hierarchy the edits are applied to
+        :type root: Component
+        """
+        self.root = root
+        self.positions = {}
+        self.angles = {}
+        self.rotations = {}
+        self.calls = {}
+        self.updateRequested = False
+        self.pendingEvents = 0
+        self.eventsQueued = 0
+        self.eventsMerged = 0
+
+    def _queue(self, table, key, value):
+        if key in table:
+            self.eventsMerged += 1
+        table[key] = value
+        self.pendingEvents += 1
+        self.eventsQueued += 1
+
+    def setPosition(self, component, pos):
+        """
+        Queue Component.setCurrentPosition, replacing an earlier queued position of the same component
+
+        :type component: Component
+        :type pos: Point
+        """
+        if not isinstance(pos, Point):
+            raise TypeError("pos should have type Point")
+        self._queue(self.positions, id(component), (component, pos.copy()))
+
+    def setAngle(self, component, angle, axis):
+        """
+        Queue Component.setCurrentAngle. Replaces an earlier queued angle about the same axis, and drops queued
+        rotations about it, since the angle is absolute
+
+        :type component: Component
+        :param angle: angle in degrees
+        :type angle: float
+        :param axis: one of component's uAxis, vAxis and wAxis
+        :type axis: Point
+        """
+        key = (id(component), component.axisBucket.index(axis))
+        if self.rotations.pop(key, None) is not None:
+            self.eventsMerged += 1
+        self._queue(self.angles, key, (component, axis, angle))
+
+    def rotate(self, component, degree, axis):
+        """
+        Queue Component.rotate, adding degree to the rotation already queued for the same component and axis.
+        Rotation extents are applied to the sum, so a sum that reaches an extent and comes back doesn't end where
+        the single steps would
+
+        :type component: Component
+        :param degree: rotation in degrees
+        :type degree: float
+        :param axis: one of component's uAxis, vAxis and wAxis
+        :type axis: Point
+        """
+        key = (id(component), component.axisBucket.index(axis))
+        pending = self.rotations.get(key)
+        if pending is not None:
+            pending[2] += degree
+            self.eventsMerged += 1
+            self.pendingEvents += 1
+            self.eventsQueued += 1
+            return
+        self._queue(self.rotations, key, [component, axis, degree])
+
+    def call(self, key, function, *args):
+        """
+        Queue any edit, replacing an earlier one queued under the same key
+
+        :param key: identifies the target of the edit
+        :type key: hashable
+        :param function: called with args when the queue is flushed
+        :type function: callable
+        """
+        self._queue(self.calls, key, (function, args))
+
+    def requestUpdate(self):
+        """
+        Ask for one update of the hierarchy at the next flush
+        """
+        if self.updateRequested:
+            self.eventsMerged += 1
+        self.updateRequested = True
+        self.pendingEvents += 1
+        self.eventsQueued += 1
+
+    def hasPending(self):
+        return self.pendingEvents > 0
+
+    def discard(self):
+        """
+        Drop every queued edit without applying it, e.g. before a reset
+        """
+        self.positions.clear()
+        self.angles.clear()
+        self.rotations.clear()
+        self.calls.clear()
+        self.updateRequested = False
+        self.pendingEvents = 0
+
+    def flush(self):
+        """
+        Apply every queued edit and update the hierarchy once
+
+        :return: number of edits applied
+        :rtype: int
+        """
+        self.lastFlushEvents = self.pendingEvents
+        if self.pendingEvents == 0:
+            self.lastFlushEdits = 0
+            return 0
+        edits = len(self.positions) + len(self.calls) + len(self.angles) + len(self.rotations)
+        positions, angles, rotations, calls = self.positions, self.angles, self.rotations, self.calls
+        # edits made while applying these are queued for the next flush
+        self.positions, self.angles, self.rotations, self.calls = {}, {}, {}, {}
+        self.updateRequested = False
+        self.pendingEvents = 0
+
+        with self.root.batchUpdate():
+            for component, pos in positions.values():
+                component.setCurrentPosition(pos)
+            for function, args in calls.values():
+                function(*args)
+        for component, axis, angle in angles.values():
+            component.setCurrentAngle(angle, axis)
+        for component, axis, degree in rotations.values():
+            component.rotate(degree, axis)
+        self.root.update()
+        self.lastFlushEdits = edits
+        return edits
+
+
+if __name__ == "__main__":
+    import time
+
+    from ModelLinkage import Spider
+
+    spider = Spider(None, Point((0, 0, 0)), None)
+    tail = spider.getComponent("tail")
+    pupil = spider.getComponent("head/leftEye/pupil")
+    eventCount = 50
+
+    start = time.perf_counter()
+    for i in range(eventCount):
+        pupil.setCurrentPosition(Point((0.001 * i, 0, 0)))
+        tail.rotate(0.5, tail.uAxis)
+        spider.update()
+    direct = time.perf_counter() - start
+    directAngle = tail.uAngle
+
+    for c in spider.getSceneGraph().nodes:
+        c.reset()
+    spider.update()
+    coalescer = InputCoalescer(spider)
+    start = time.perf_counter()
+    for i in range(eventCount):
+        coalescer.setPosition(pupil, Point((0.001 * i, 0, 0)))
+        coalescer.rotate(tail, 0.5, tail.uAxis)
+        coalescer.requestUpdate()
+    coalescer.flush()
+    coalesced = time.perf_counter() - start
+    print(f"{coalescer.lastFlushEvents} events, {coalescer.eventsMerged} merged into {coalescer.lastFlushEdits} edits")
+    print(f"direct {1e3 * direct:.2f} ms, coalesced {1e3 * coalesced:.2f} ms, "
+          f"tail angle {directAngle:.1f} vs {tail.uAngle:.1f}")
@@ -0,0 +1,115 @@
+"""
+Recording of canvas input, so interactive sessions can be replayed as benchmarks.
+A recording is a gzip-compressed text file: a JSON header line, then one short JSON array per event. Every event is
+an Interrupt_* call with its arguments, the canvas drag state it saw, and its time; frame markers record when frames
+were drawn, so a replay applies the same events between the same frames.
+"""
+
+import gzip
+import json
+import time
+
+
+class InputRecorder:
+    """
+    Writes events as they happen. Times are seconds since the recording started
+    """
+    FORMAT = "sketch-input"
+    VERSION = 1
+    FRAME = "frame"  # name of frame markers
+    RESIZE = "resize"  # name of canvas size changes
+
+    path = None
+    eventCount = 0
+    frameCount = 0
+
+    def __init__(self, path, size, clock=time.perf_counter):
+        """
+        :param path: file to write, truncated if it exists
+        :type path: str
+        :param size: canvas width and height when the recording starts
+        :type size: tuple[int, int]
+        :param clock: function returning the current time in seconds
+        """
+        self.path = path
+        self.clock = clock
+        self.start = clock()
+        self.eventCount = 0
+        self.frameCount = 0
+        self.file = gzip.open(path, "wt", encoding="utf-8")
+        header = {"format": self.FORMAT, "version": self.VERSION, "size": [int(size[0]), int(size[1])]}
+        self.file.write(json.dumps(header) + "\n")
+
+    def _write(self, entry):
+        self.file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def record(self, name, args, dragging=False, newDragging=False):
+        """
+        :param name: name of the Interrupt_* method called
+        :type name: str
+        :param args: its arguments, numbers only
+        :type args: tuple
+        :param dragging: the canvas' dragging_event when the call was made
+        :type dragging: bool
+        :param newDragging: the canvas' new_dragging_event when the call was made
+        :type newDragging: bool
+        """
+        flags = int(bool(dragging)) | int(bool(newDragging)) << 1
+        self._write([round(self.clock() - self.start, 6), name, list(args), flags])
+        self.eventCount += 1
+
+    def frame(self):
+        """
+        Mark the start of a frame
+        """
+        self._write([round(self.clock() - self.start, 6), self.FRAME])
+        self.frameCount += 1
+
+    def resize(self, width, height):
+        self._write([round(self.clock() - self.start, 6), self.RESIZE, [int(width), int(height)]])
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class InputEvent:
+    """
+    One recorded entry
+    """
+    __slots__ = ["time", "name", "args", "dragging", "newDragging"]
+
+    def __init__(self, time, name, args=(), dragging=False, newDragging=False):
+        self.time = time
+        self.name = name
+        self.args = tuple(args)
+        self.dragging = dragging
+        self.newDragging = newDragging
+
+    def __repr__(self):
+        return f"InputEvent({self.time:.3f}, {self.name}, {self.args})"
+
+
+def loadRecording(path):
+    """
+    Read a recording written by InputRecorder
+
+    :param path: recording file
+    :type path: str
+    :return: header (with "size") and the events in order, frame markers included
+    :rtype: tuple[dict, list<InputEvent>]
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        header = json.loads(file.readline())
+        if header.get("format") != InputRecorder.FORMAT:
+            raise ValueError(f"{path} is not an input recording")
+        if header.get("version", 0) > InputRecorder.VERSION:
+            raise ValueError(f"{path} was written by a newer version, {header['version']}")
+        events = []
+        for line in file:
+            entry = json.loads(line)
+            flags = entry[3] if len(entry) > 3 else 0
+            events.append(InputEvent(entry[0], entry[1], entry[2] if len(entry) > 2 else (),
+                                     bool(flags & 1), bool(flags & 2)))
+    return header, events
@@ -0,0 +1,198 @@
+"""
+Shared GPU geometry for DisplayableMesh objects built from the same vertex data.
+Every primitive type and level of detail is uploaded once; each part using it only adds one row
+(model matrix and color) to an instance buffer, and all parts sharing a geometry are drawn with a single
+glDrawElementsInstanced call per frame.
+"""
+
+from GLBuffer import VAO, VBO, EBO
+import numpy as np
+
+try:
+    import OpenGL
+
+    try:
+        import OpenGL.GL as gl
+        import OpenGL.GLU as glu
+    except ImportError:
+        from ctypes import util
+
+        orig_util_find_library = util.find_library
+
+
+        def new_util_find_library(name):
+            res = orig_util_find_library(name)
+            if res:
+                return res
+            return '/System/Library/Frameworks/' + name + '.framework/' + name
+
+
+        util.find_library = new_util_find_library
+        import OpenGL.GL as gl
+        import OpenGL.GLU as glu
+except ImportError:
+    raise ImportError("Required dependency PyOpenGL not present")
+
+
+class InstancedMesh:
+    """
+    One VAO/VBO/EBO per geometry plus a per-instance buffer holding a column-major 4x4 model matrix and an RGB color
+    """
+    # (shaderProg, geometryKey) -> InstancedMesh
+    registry = {}
+
+    INSTANCE_STRIDE = 19  # 16 floats model matrix + 3 floats color
+
+    # statistics of the last drawAll call
+    drawCalls = 0
+    instancesDrawn = 0
+    trianglesDrawn = 0
+
+    shaderProg = None
+    vertices = None
+    indices = None
+    vao = None
+    vbo = None
+    ebo = None
+    instanceVbo = None
+    instanceData = None  # (capacity, INSTANCE_STRIDE) float32
+    instanceNum = 0
+    initialized = False
+
+    def __init__(self, shaderProg, vertexData, indexData):
+        """
+        :param shaderProg: compiled shader program
+        :type shaderProg: GLProgram
+        :param vertexData: unscaled vertices, 11 floats per vertex
+        :type vertexData: numpy.ndarray
+        :param indexData: triangle indices
+        :type indexData: numpy.ndarray
+        """
+        self.shaderProg = shaderProg
+        self.vertices = vertexData
+        self.indices = indexData
+        self.instanceData = np.zeros((16, self.INSTANCE_STRIDE), dtype=np.float32)
+        self.instanceNum = 0
+        self.initialized = False
+
+    @classmethod
+    def get(cls, shaderProg, geometryKey, vertexData, indexData):
+        """
+        Get the shared mesh for geometryKey, creating it from vertexData and indexData the first time
+
+        :param geometryKey: identifies a primitive type and level of detail, e.g. its asset path
+        :type geometryKey: hashable
+        :rtype: InstancedMesh
+        """
+        key = (shaderProg, geometryKey)
+        if key not in cls.registry:
+            cls.registry[key] = cls(shaderProg, vertexData, indexData)
+        return cls.registry[key]
+
+    @classmethod
+    def drawAll(cls, shaderProg):
+        """
+        Draw every instance submitted since the last call, one draw call per geometry
+
+        :param shaderProg: compiled shader program
+        :type shaderProg: GLProgram
+        """
+        shaderProg.setBool("useInstancing", True)
+        cls.drawCalls = 0
+        cls.instancesDrawn = 0
+        cls.trianglesDrawn = 0
+        for (prog, _), mesh in cls.registry.items():
+            if prog is shaderProg and mesh.instanceNum > 0:
+                cls.instancesDrawn += mesh.instanceNum
+                cls.trianglesDrawn += mesh.instanceNum * (len(mesh.indices) // 3)
+                cls.drawCalls += 1
+                mesh.draw()
+        shaderProg.setBool("useInstancing", False)
+
+    @classmethod
+    def gpuBytes(cls):
+        """
+        GPU memory used by the shared vertex and index buffers
+
+        :rtype: int
+        """
+        return sum(4 * (m.vertices.size + m.indices.size) for m in cls.registry.values())
+
+    @classmethod
+    def clear(cls):
+        """
+        Forget every shared mesh, e.g. when the GL context they were created in is destroyed
+        """
+        cls.registry = {}
+
+    def initialize(self):
+        """
+        Upload the geometry and set up the vertex and instance attributes. Only the first call does anything.
+        """
+        if self.initialized:
+            return
+        self.vao = VAO()
+        self.vbo = VBO()
+        self.ebo = EBO()
+        self.instanceVbo = VBO()
+
+        self.vao.bind()
+        self.vbo.setBuffer(self.vertices, 11)
+        self.ebo.setBuffer(self.indices)
+
+        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexPos"),
+                                  stride=11, offset=0, attribSize=3)
+        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexNormal"),
+                                  stride=11, offset=3, attribSize=3)  # unused
+        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexColor"),
+                                  stride=11, offset=6, attribSize=3)
+        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexTexture"),
+                                  stride=11, offset=9, attribSize=2)  # unused
+
+        # allocate the instance buffer now, so single non-instanced draws never read an empty buffer
+        self.instanceVbo.setBuffer(self.instanceData, self.INSTANCE_STRIDE, gl.GL_STREAM_DRAW)
+        modelLoc = self.shaderProg.getAttribLocation("instanceModelMat")
+        if modelLoc >= 0:
+            # a mat4 attribute takes four consecutive locations, one per column
+            for column in range(4):
+                self.instanceVbo.setAttribPointer(modelLoc + column, stride=self.INSTANCE_STRIDE,
+                                                  offset=4 * column, attribSize=4, divisor=1)
+        self.instanceVbo.setAttribPointer(self.shaderProg.getAttribLocation("instanceColor"),
+                                          stride=self.INSTANCE_STRIDE, offset=16, attribSize=3, divisor=1)
+        self.vao.unbind()
+        self.initialized = True
+
+    def submit(self, modelMat, color):
+        """
+        Queue one instance for the next drawAll
+
+        :param modelMat: row-major 4x4 model matrix, including the part's size
+        :type modelMat: numpy.ndarray
+        :param color: RGB color
+        :type color: numpy.ndarray
+        """
+        if self.instanceNum == len(self.instanceData):
+            self.instanceData = np.concatenate((self.instanceData, np.zeros_like(self.instanceData)))
+        row = self.instanceData[self.instanceNum]
+        # the transpose of a row-major matrix, flattened in C order, is its column-major layout
+        row[:16] = modelMat.T.ravel()
+        row[16:19] = color
+        self.instanceNum += 1
+
+    def draw(self):
+        """
+        Upload the queued instances and draw them in one call
+        """
+        self.vao.bind()
+        self.instanceVbo.setBuffer(self.instanceData[:self.instanceNum], self.INSTANCE_STRIDE, gl.GL_STREAM_DRAW)
+        self.ebo.drawInstanced(self.instanceNum)
+        self.vao.unbind()
+        self.instanceNum = 0
+
+    def drawSingle(self):
+        """
+        Draw the geometry once with the model matrix and color uniforms, for parts that can't be instanced
+        """
+        self.vao.bind()
+        self.ebo.draw()
+        self.vao.unbind()
@@ -0,0 +1,164 @@
+"""
+Level of detail for meshes.
+A mesh can hold several detail levels, ordered from finest to coarsest. Every frame the level is picked from the
+mesh's projected size on screen, with hysteresis so a mesh sitting right at a threshold doesn't flip between levels.
+Extra levels can be generated offline by vertex clustering and are kept in the on-disk mesh cache.
+"""
+
+import math
+
+import numpy as np
+
+from MeshCache import MeshCache
+
+
+class LODView:
+    """
+    Camera data needed to estimate the screen-space size of a bounding sphere, refreshed once per frame
+    """
+    cameraPos = None  # numpy.ndarray (3,)
+    pixelsPerUnit = 1.0  # projected size in pixels of one unit of length at distance 1
+
+    def __init__(self, cameraPos, projectionMat, viewportHeight):
+        """
+        :param cameraPos: camera position in world space
+        :type cameraPos: list or numpy.ndarray
+        :param projectionMat: perspective matrix, row or column major
+        :type projectionMat: numpy.ndarray
+        :param viewportHeight: viewport height in pixels
+        :type viewportHeight: int
+        """
+        self.cameraPos = np.array(cameraPos, dtype=float)
+        # projectionMat[1, 1] is cot(fov / 2) and sits on the diagonal in both layouts
+        self.pixelsPerUnit = projectionMat[1, 1] * viewportHeight * 0.5
+
+    def screenSize(self, center, radius):
+        """
+        Approximate diameter in pixels of a bounding sphere
+
+        :param center: sphere center in world space
+        :type center: numpy.ndarray
+        :param radius: sphere radius in world space
+        :type radius: float
+        :rtype: float
+        """
+        distance = math.sqrt(sum((center[i] - self.cameraPos[i]) ** 2 for i in range(3)))
+        if distance <= radius:
+            # camera is inside the sphere
+            return math.inf
+        return 2 * radius * self.pixelsPerUnit / distance
+
+
+class LODSelector:
+    """
+    Picks a detail level from a screen-space size.
+    Level i is used while the size is at least thresholds[i]; the coarsest level is used below the last threshold.
+    A mesh only switches once the size is beyond the threshold by the hysteresis fraction.
+    """
+    thresholds = None  # list<float>, pixel sizes in decreasing order
+    hysteresis = 0.15
+
+    def __init__(self, thresholds=(48, 16), hysteresis=0.15):
+        """
+        :param thresholds: smallest projected diameter in pixels of every level but the coarsest
+        :type thresholds: list or tuple
+        :param hysteresis: fraction a size must pass a threshold by before the level changes
+        :type hysteresis: float
+        """
+        self.thresholds = list(thresholds)
+        self.hysteresis = hysteresis
+
+    def select(self, screenSize, current, levelCount):
+        """
+        :param screenSize: projected diameter in pixels
+        :type screenSize: float
+        :param current: level used in the previous frame
+        :type current: int
+        :param levelCount: number of levels the mesh has
+        :type levelCount: int
+        :return: level to use, 0 is the finest
+        :rtype: int
+        """
+        coarsest = min(levelCount - 1, len(self.thresholds))
+        level = min(max(current, 0), coarsest)
+        while level < coarsest and screenSize < self.thresholds[level] * (1 - self.hysteresis):
+            level += 1
+        while level > 0 and screenSize > self.thresholds[level - 1] * (1 + self.hysteresis):
+            level -= 1
+        return level
+
+
+def decimate(vertexData, indexData, cells):
+    """
+    Simplify a mesh by vertex clustering: vertices falling into the same cell of a regular grid over the bounding box
+    are merged into their average, and triangles that collapse or duplicate another one are dropped.
+
+    :param vertexData: flattened vertices, 11 floats per vertex
+    :type vertexData: numpy.ndarray
+    :param indexData: flattened triangle indices
+    :type indexData: numpy.ndarray
+    :param cells: grid resolution along the longest side of the bounding box
+    :type cells: int
+    :return: simplified (vertices, indices) in the same layout
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    vertices = np.asarray(vertexData, dtype=np.float64).reshape(-1, 11)
+    positions = vertices[:, 0:3]
+    low = positions.min(axis=0)
+    cellSize = max(float((positions.max(axis=0) - low).max()), 1e-12) / cells
+    grid = np.minimum(((positions - low) / cellSize).astype(np.int64), cells - 1)
+    cellIds = (grid[:, 0] * cells + grid[:, 1]) * cells + grid[:, 2]
+    _, remap, counts = np.unique(cellIds, return_inverse=True, return_counts=True)
+    remap = remap.reshape(-1)
+
+    merged = np.zeros((len(counts), 11))
+    np.add.at(merged, remap, vertices)
+    merged /= counts[:, None]
+
+    triangles = remap[np.asarray(indexData).reshape(-1, 3)]
+    keep = (triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) \
+        & (triangles[:, 0] != triangles[:, 2])
+    triangles = triangles[keep]
+    # drop triangles over the same three vertices, keeping the first one's winding
+    _, first = np.unique(np.sort(triangles, axis=1), axis=0, return_index=True)
+    triangles = triangles[np.sort(first)]
+    return (merged.reshape(-1), triangles.reshape(-1).astype(np.int32))
+
+
+def loadDecimated(filename, loader, cells):
+    """
+    Decimated version of a mesh file, generated once and then read from the on-disk mesh cache
+
+    :param filename: source mesh file
+    :type filename: str
+    :param loader: function taking filename and returning (vertices, indices) of the full mesh
+    :param cells: see decimate
+    :type cells: int
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    return MeshCache.load(filename, lambda f: decimate(*loader(f), cells), f".decimate{cells}")
+
+
+if __name__ == "__main__":
+    # offline step: generate the decimated levels of every asset into the mesh cache
+    import glob
+    import sys
+
+    from Shapes import getVertexData
+
+    cellCounts = [int(c) for c in sys.argv[1:]] or [8, 4]
+    for pathname in sorted(glob.glob("assets/*.dae")):
+        vertices, indices = getVertexData(pathname)
+        levels = [f"{len(indices) // 3}"]
+        for cells in cellCounts:
+            levels.append(f"{len(loadDecimated(pathname, getVertexData, cells)[1]) // 3}")
+        print(f"{pathname}: triangles per level {' -> '.join(levels)}")
+
+    selector = LODSelector()
+    sizes = [100, 50, 45, 41, 40, 45, 50, 56, 60, 20, 14, 13, 15, 19, 100]
+    level = 0
+    trace = []
+    for size in sizes:
+        level = selector.select(size, level, 3)
+        trace.append(level)
+    print(f"hysteresis trace for sizes {sizes}: {trace}")
@@ -0,0 +1,127 @@
+"""
+On-disk cache for processed mesh data.
+Vertex and index arrays produced from a mesh file are stored as .npy files in a .meshcache directory next to the
+source file, keyed by the source's path, size and content hash. Later runs memory-map them instead of parsing the
+source again; the source is only parsed when its cache entry is missing or stale.
+The content hash is stored next to the entries together with the source's size and modification time, so the source
+is only read and hashed again after it changed on disk.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+
+class MeshCache:
+    """
+    Helper methods to load mesh arrays through the cache
+    """
+    enabled = True
+    cacheDirName = ".meshcache"
+    stampSuffix = ".source"  # file next to the entries holding "size mtime key" of the source they were made from
+
+    # statistics since program start
+    hits = 0
+    misses = 0
+    hashes = 0  # source files read and hashed to compute their key
+
+    @classmethod
+    def getKey(cls, filename):
+        """
+        Cache key of a source file, changes whenever its path, size or content changes.
+        The content is only hashed if the size or modification time differs from the stored stamp
+
+        :rtype: str
+        """
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        stamp = f"{stat.st_size} {stat.st_mtime_ns}"
+        stampPath = os.path.join(os.path.dirname(path), cls.cacheDirName, os.path.basename(path) + cls.stampSuffix)
+        try:
+            with open(stampPath) as f:
+                storedStamp, _, key = f.read().strip().rpartition(" ")
+            if storedStamp == stamp and key:
+                return key
+        except OSError:
+            pass
+
+        cls.hashes += 1
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            content = f.read()
+        h.update(path.encode())
+        h.update(str(len(content)).encode())
+        h.update(hashlib.sha1(content).digest())
+        key = h.hexdigest()[:20]
+        try:
+            os.makedirs(os.path.dirname(stampPath), exist_ok=True)
+            tmpPath = f"{stampPath}.{os.getpid()}.tmp"
+            with open(tmpPath, "w") as f:
+                f.write(f"{stamp} {key}\n")
+            os.replace(tmpPath, stampPath)
+        except OSError:
+            # cache directory not writable, the content is hashed again next time
+            pass
+        return key
+
+    @classmethod
+    def getCachePaths(cls, filename, key, variant=""):
+        cacheDir = os.path.join(os.path.dirname(os.path.abspath(filename)), cls.cacheDirName)
+        prefix = os.path.join(cacheDir, f"{os.path.basename(filename)}{variant}-{key}")
+        return cacheDir, prefix + ".vertices.npy", prefix + ".indices.npy"
+
+    @classmethod
+    def load(cls, filename, loader, variant=""):
+        """
+        Load mesh arrays for filename from the cache, or with loader if the cache is missing or stale.
+        Arrays loaded from the cache are read-only memory maps.
+
+        :param filename: source mesh file
+        :type filename: str
+        :param loader: function taking filename and returning (vertices, indices)
+        :param variant: name of a derived version of the mesh (e.g. a decimated level), cached next to the others
+        :type variant: str
+        :return: (vertices, indices)
+        :rtype: tuple[numpy.ndarray, numpy.ndarray]
+        """
+        if not cls.enabled:
+            return loader(filename)
+
+        key = cls.getKey(filename)
+        cacheDir, verticesPath, indicesPath = cls.getCachePaths(filename, key, variant)
+        try:
+            vertices = np.load(verticesPath, mmap_mode="r")
+            indices = np.load(indicesPath, mmap_mode="r")
+            cls.hits += 1
+            return (vertices, indices)
+        except (OSError, ValueError):
+            # missing, stale or damaged entry
+            pass
+
+        cls.misses += 1
+        vertices, indices = loader(filename)
+        try:
+            cls.store(filename, cacheDir, verticesPath, vertices, variant)
+            cls.store(filename, cacheDir, indicesPath, indices, variant)
+        except OSError:
+            # cache directory not writable, keep working without it
+            pass
+        return (vertices, indices)
+
+    @staticmethod
+    def store(filename, cacheDir, path, array, variant=""):
+        """
+        Write one array to the cache, replacing entries of older versions of filename with the same variant
+        """
+        os.makedirs(cacheDir, exist_ok=True)
+        suffix = path[path.rindex(".", 0, len(path) - len(".npy")):]
+        prefix = os.path.basename(filename) + variant + "-"
+        for name in os.listdir(cacheDir):
+            if name.startswith(prefix) and name.endswith(suffix) and os.path.join(cacheDir, name) != path:
+                os.remove(os.path.join(cacheDir, name))
+        # write to a temporary file first, so a crash never leaves a truncated entry behind
+        tmpPath = f"{path}.{os.getpid()}.tmp"
+        with open(tmpPath, "wb") as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(tmpPath, path)
@@ -17,8 +17,10 @@ class ModelAxes(Component):
     Define our linkage model
     """
 
-    components = None
-    contextParent = None
+    __slots__ = [
+        "components",  # list<Component>
+        "contextParent",
+    ]
 
     def __init__(self, parent, position, shaderProg, display_obj=None):
         super().__init__(position, display_obj)
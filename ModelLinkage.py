@@ -40,8 +40,12 @@ class ModelLinkage(Component):
     #
     # Please see Blackboard for an illustration of how this behavior works.
 
+    __slots__ = [
+        "contextParent",
+        "componentList",  # list<Component>
+    ]
+
     components = None
-    contextParent = None
 
     def __init__(self, parent, position, shaderProg, display_obj=None):
         super().__init__(position, display_obj)
@@ -98,8 +102,17 @@ class Tail(Component):
     Define our linkage model
     """
 
+    __slots__ = [
+        "contextParent",
+        "link1",
+        "link2",
+        "link3",
+        "link4",
+        "needle",
+        "componentList",  # list<Component>
+    ]
+
     components = None
-    contextParent = None
 
     def __init__(self, parent, position, shaderProg, display_obj=None):
         super().__init__(position, display_obj)
@@ -187,8 +200,15 @@ class Legs(Component):
     Define our linkage model
     """
 
+    __slots__ = [
+        "contextParent",
+        "link1",
+        "link2",
+        "link3",
+        "componentList",  # list<Component>
+    ]
+
     components = None
-    contextParent = None
 
     def __init__(self, parent, position, shaderProg, display_obj=None):
         super().__init__(position, display_obj)
@@ -241,8 +261,12 @@ class Tooth(Component):
     Define our linkage model
     """
 
+    __slots__ = [
+        "contextParent",
+        "componentList",  # list<Component>
+    ]
+
     components = None
-    contextParent = None
 
     def __init__(self, parent, position, size, shaderProg, display_obj=None):
         super().__init__(position, display_obj)
@@ -267,8 +291,14 @@ class Eye(Component):
     Define our linkage model
     """
 
+    __slots__ = [
+        "contextParent",
+        "eye",
+        "pupil",
+        "componentList",  # list<Component>
+    ]
+
     components = None
-    contextParent = None
 
     def __init__(self, parent, position, shaderProg, display_obj=None):
         super().__init__(position, display_obj)
@@ -290,8 +320,15 @@ class Head(Component):
     Define our linkage model
     """
 
+    __slots__ = [
+        "contextParent",
+        "head",
+        "leftTooth",
+        "rightTooth",
+        "componentList",  # list<Component>
+    ]
+
     components = None
-    contextParent = None
 
     def __init__(self, parent, position, shaderProg, display_obj=None):
         super().__init__(position, display_obj)
@@ -387,8 +424,18 @@ class Body(Component):
     Define our linkage model
     """
 
+    __slots__ = [
+        "contextParent",
+        "xSize",
+        "ySize",
+        "zSize",
+        "body",
+        "leftLegs",
+        "rightLegs",
+        "componentList",  # list<Component>
+    ]
+
     components = None
-    contextParent = None
 
     def __init__(self, parent, position, shaderProg, display_obj=None):
         super().__init__(position, display_obj)
@@ -462,8 +509,13 @@ class Spider(Component):
     Define our linkage model
     """
 
+    __slots__ = [
+        "contextParent",
+        "initPos",
+        "componentList",  # list<Component>
+    ]
+
     components = None
-    contextParent = None
 
     def __init__(self, parent, position, shaderProg, display_obj=None):
         super().__init__(position, display_obj)
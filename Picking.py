@@ -0,0 +1,330 @@
+"""
+Ray-cast picking: find the part of a hierarchy under the mouse.
+Parts are first filtered by their world-space boxes from the SceneGraph, nearest first, and only the survivors are
+tested triangle by triangle. Each mesh gets a bounding volume hierarchy over its triangles, built once and shared by
+every part drawing the same vertex array, so a ray only reaches the few triangles near it.
+"""
+
+import time
+
+import numpy as np
+
+from DisplayableMesh import DisplayableMesh
+
+
+def rayAABB(origin, direction, mins, maxs):
+    """
+    Slab test of one ray against many axis-aligned boxes
+
+    :param origin: ray origin
+    :type origin: numpy.ndarray (3,)
+    :param direction: ray direction, need not be normalized
+    :type direction: numpy.ndarray (3,)
+    :param mins: lower corners
+    :type mins: numpy.ndarray (N, 3)
+    :param maxs: upper corners
+    :type maxs: numpy.ndarray (N, 3)
+    :return: entry and exit ray parameters and whether the ray hits the box at t >= 0
+    :rtype: tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+    """
+    # a tiny component instead of zero keeps every slab distance finite, so no 0 * inf can appear
+    inverse = 1.0 / np.where(np.abs(direction) < 1e-30, 1e-30, direction)
+    t0 = (mins - origin) * inverse
+    t1 = (maxs - origin) * inverse
+    tNear = np.minimum(t0, t1).max(axis=1)
+    tFar = np.maximum(t0, t1).min(axis=1)
+    return tNear, tFar, (tNear <= tFar) & (tFar >= 0)
+
+
+def rayTriangles(origin, direction, v0, v1, v2, epsilon=1e-12):
+    """
+    Möller-Trumbore test of one ray against many triangles
+
+    :param origin: ray origin
+    :type origin: numpy.ndarray (3,)
+    :param direction: ray direction, need not be normalized
+    :type direction: numpy.ndarray (3,)
+    :param v0: first corner of every triangle
+    :type v0: numpy.ndarray (N, 3)
+    :param v1: second corners
+    :type v1: numpy.ndarray (N, 3)
+    :param v2: third corners
+    :type v2: numpy.ndarray (N, 3)
+    :return: ray parameter of every hit, inf for misses and hits behind the origin
+    :rtype: numpy.ndarray (N,)
+    """
+    edge1 = v1 - v0
+    edge2 = v2 - v0
+    p = np.cross(direction, edge2)
+    det = np.einsum("ij,ij->i", edge1, p)
+    valid = np.abs(det) > epsilon
+    inverse = np.divide(1.0, det, out=np.zeros_like(det), where=valid)
+    s = origin - v0
+    u = np.einsum("ij,ij->i", s, p) * inverse
+    q = np.cross(s, edge1)
+    v = (q @ direction) * inverse
+    t = np.einsum("ij,ij->i", edge2, q) * inverse
+    hit = valid & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+    return np.where(hit, t, np.inf)
+
+
+class MeshBVH:
+    """
+    Bounding volume hierarchy over the triangles of one vertex array, in the array's own space.
+    Nodes are stored in flat arrays, and triangles are reordered so that a leaf holds triangles
+    triStart to triStart + triCount
+    """
+    leafSize = 8  # a node with at most this many triangles isn't split
+
+    cache = {}  # id(vertex array) -> (vertex array, MeshBVH); the array is kept so its id can't be reused
+    builds = 0  # number of hierarchies built so far, over all meshes
+
+    v0 = None  # (T, 3) triangle corners, in leaf order
+    v1 = None
+    v2 = None
+    nodeMins = None  # (M, 3)
+    nodeMaxs = None  # (M, 3)
+    children = None  # (M, 2) left and right node, -1 for leaves
+    triStart = None  # (M,) first triangle of a leaf
+    triCount = None  # (M,) number of triangles of a leaf, 0 for inner nodes
+
+    def __init__(self, vertices, indices):
+        """
+        :param vertices: flattened vertices, 11 floats per vertex
+        :type vertices: numpy.ndarray
+        :param indices: flattened triangle indices
+        :type indices: numpy.ndarray
+        """
+        positions = np.asarray(vertices, dtype=np.float64).reshape(-1, 11)[:, 0:3]
+        triangles = positions[np.asarray(indices, dtype=np.intp).reshape(-1, 3)]
+        triMins = triangles.min(axis=1)
+        triMaxs = triangles.max(axis=1)
+        centroids = triangles.mean(axis=1)
+
+        order = np.arange(len(triangles))
+        nodeMins, nodeMaxs, children, triStart, triCount = [], [], [], [], []
+
+        def addNode(start, end):
+            nodeMins.append(triMins[order[start:end]].min(axis=0) if end > start else np.zeros(3))
+            nodeMaxs.append(triMaxs[order[start:end]].max(axis=0) if end > start else np.zeros(3))
+            children.append([-1, -1])
+            triStart.append(start)
+            triCount.append(end - start)
+            return len(children) - 1
+
+        stack = [(addNode(0, len(order)), 0, len(order))]
+        while stack:
+            node, start, end = stack.pop()
+            if end - start <= self.leafSize:
+                continue
+            # median split along the longest axis of the triangle centers
+            centers = centroids[order[start:end]]
+            axis = int(np.argmax(np.ptp(centers, axis=0)))
+            middle = (end - start) // 2
+            order[start:end] = order[start:end][np.argpartition(centers[:, axis], middle)]
+            middle += start
+            children[node] = [addNode(start, middle), addNode(middle, end)]
+            triCount[node] = 0
+            stack.append((children[node][0], start, middle))
+            stack.append((children[node][1], middle, end))
+
+        triangles = triangles[order]
+        self.v0 = np.ascontiguousarray(triangles[:, 0])
+        self.v1 = np.ascontiguousarray(triangles[:, 1])
+        self.v2 = np.ascontiguousarray(triangles[:, 2])
+        self.nodeMins = np.array(nodeMins).reshape(-1, 3)
+        self.nodeMaxs = np.array(nodeMaxs).reshape(-1, 3)
+        self.children = np.array(children, dtype=np.intp).reshape(-1, 2)
+        self.triStart = np.array(triStart, dtype=np.intp)
+        self.triCount = np.array(triCount, dtype=np.intp)
+        MeshBVH.builds += 1
+
+    @classmethod
+    def get(cls, vertices, indices):
+        """
+        Hierarchy of a vertex array, built on first use
+
+        :rtype: MeshBVH
+        """
+        entry = cls.cache.get(id(vertices))
+        if entry is None or entry[0] is not vertices:
+            entry = (vertices, cls(vertices, indices))
+            cls.cache[id(vertices)] = entry
+        return entry[1]
+
+    @classmethod
+    def clearCache(cls):
+        cls.cache.clear()
+
+    def intersect(self, origin, direction, tMax=np.inf):
+        """
+        Nearest triangle hit by a ray. The tree is walked one level at a time, with every node of a level tested at
+        once, and the triangles of all reached leaves are tested together
+
+        :param origin: ray origin in the mesh's space
+        :type origin: numpy.ndarray (3,)
+        :param direction: ray direction in the mesh's space
+        :type direction: numpy.ndarray (3,)
+        :param tMax: hits further than this are ignored
+        :type tMax: float
+        :return: ray parameter and triangle index in leaf order, (inf, -1) if nothing is hit, \
+            and the number of triangles tested
+        :rtype: tuple[float, int, int]
+        """
+        if len(self.v0) == 0:
+            return np.inf, -1, 0
+        frontier = np.zeros(1, dtype=np.intp)
+        leaves = []
+        while len(frontier) > 0:
+            tNear, _, hit = rayAABB(origin, direction, self.nodeMins[frontier], self.nodeMaxs[frontier])
+            frontier = frontier[hit & (tNear <= tMax)]
+            isLeaf = self.triCount[frontier] > 0
+            leaves.append(frontier[isLeaf])
+            frontier = self.children[frontier[~isLeaf]].reshape(-1)
+
+        leaves = np.concatenate(leaves)
+        if len(leaves) == 0:
+            return np.inf, -1, 0
+        counts = self.triCount[leaves]
+        # triangle indices of all reached leaves, as one flat array
+        offsets = np.repeat(self.triStart[leaves] - np.cumsum(counts) + counts, counts)
+        candidates = offsets + np.arange(counts.sum())
+        ts = rayTriangles(origin, direction, self.v0[candidates], self.v1[candidates], self.v2[candidates])
+        best = int(np.argmin(ts))
+        if ts[best] > tMax:
+            return np.inf, -1, len(candidates)
+        return float(ts[best]), int(candidates[best]), len(candidates)
+
+
+class PickResult:
+    """
+    The part hit by a pick ray and where it was hit
+    """
+    component = None  # Component
+    t = None  # ray parameter of the hit
+    point = None  # (3,) hit position in world space
+    triangle = None  # triangle index in the mesh's hierarchy
+
+    def __init__(self, component, t, point, triangle):
+        self.component = component
+        self.t = t
+        self.point = point
+        self.triangle = triangle
+
+    def __repr__(self):
+        return f"PickResult({self.component.__class__.__name__}, t={self.t:.4f}, point={np.round(self.point, 4)})"
+
+
+class Picker:
+    """
+    Pick rays against every mesh part under a root component
+    """
+    root = None  # Component
+    scene = None  # SceneGraph rows and inverse matrices were resolved in
+    rows = None  # (K,) scene rows of the pickable parts under root
+
+    lastPickTime = 0.0  # seconds spent in the last pick
+    partsTested = 0  # parts whose triangles were tested in the last pick
+    trianglesTested = 0  # triangles tested in the last pick
+
+    def __init__(self, root):
+        """
+        :param root: top of the subtree that can be picked
+        :type root: Component
+        """
+        self.root = root
+
+    def resolveRows(self, scene):
+        rows = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            stack.extend(node.children)
+            if isinstance(node.displayObj, DisplayableMesh):
+                rows.append(node._index)
+        self.rows = np.array(sorted(rows), dtype=np.intp)
+        self.scene = scene
+
+    def pick(self, origin, direction):
+        """
+        Nearest part hit by a ray
+
+        :param origin: ray origin in world space
+        :type origin: numpy.ndarray or Point
+        :param direction: ray direction in world space, need not be normalized
+        :type direction: numpy.ndarray or Point
+        :return: the hit, None if the ray misses every part
+        :rtype: PickResult or None
+        """
+        start = time.perf_counter()
+        origin = np.asarray(origin, dtype=np.float64)[:3]
+        direction = np.asarray(direction, dtype=np.float64)[:3]
+        self.root.update()
+        scene = self.root.getSceneGraph()
+        if scene is not self.scene:
+            self.resolveRows(scene)
+        scene.refreshBounds()
+
+        tNear, _, hit = rayAABB(origin, direction, scene.ownMins[self.rows], scene.ownMaxs[self.rows])
+        candidates = self.rows[hit]
+        tNear = np.maximum(tNear[hit], 0.0)
+        orderByDistance = np.argsort(tNear, kind="stable")
+
+        best = None
+        bestT = np.inf
+        self.partsTested = 0
+        self.trianglesTested = 0
+        for i in orderByDistance:
+            if tNear[i] > bestT:
+                # every remaining box starts behind the nearest hit so far
+                break
+            component = scene.nodes[candidates[i]]
+            mesh = component.displayObj
+            if mesh.instanced:
+                bvh = MeshBVH.get(mesh.levels[0].vertices, mesh.levels[0].indices)
+            else:
+                bvh = MeshBVH.get(mesh.vertices, mesh.indices)
+            # affine maps keep the ray parameter, so hits in mesh space compare directly with world hits
+            inverse = np.linalg.inv(mesh.getModelMatrix(scene.worldMats[candidates[i]]))
+            localOrigin = inverse[:3, :3] @ origin + inverse[:3, 3]
+            localDirection = inverse[:3, :3] @ direction
+            t, triangle, tested = bvh.intersect(localOrigin, localDirection, bestT)
+            self.partsTested += 1
+            self.trianglesTested += tested
+            if t < bestT:
+                bestT = t
+                best = (component, triangle)
+
+        self.lastPickTime = time.perf_counter() - start
+        if best is None:
+            return None
+        return PickResult(best[0], bestT, origin + bestT * direction, best[1])
+
+
+if __name__ == "__main__":
+    from Component import Component
+    from ModelLinkage import Spider
+    from Point import Point
+
+    spider = Spider(None, Point((0, 0, 0)), None)
+    picker = Picker(spider)
+    # straight down onto the body from above
+    print(picker.pick((0, 5, 0), (0, -1, 0)))
+    print(f"{picker.partsTested} parts, {picker.trianglesTested} triangles, "
+          f"{1e3 * picker.lastPickTime:.2f} ms")
+
+    # a crowd of spiders under one root
+    root = Component(Point((0, 0, 0)))
+    count = 100
+    for i in range(count):
+        root.addChild(Spider(None, Point(((i % 10) * 3.0, 0, (i // 10) * 3.0)), None))
+    picker = Picker(root)
+    picker.pick((0, 5, 0), (0, -1, 0))
+    rng = np.random.default_rng(0)
+    origins = np.column_stack([rng.uniform(-2, 30, 500), np.full(500, 5.0), rng.uniform(-2, 30, 500)])
+    directions = np.column_stack([rng.uniform(-0.2, 0.2, 500), -np.ones(500), rng.uniform(-0.2, 0.2, 500)])
+    start = time.perf_counter()
+    hits = sum(picker.pick(o, d) is not None for o, d in zip(origins, directions))
+    elapsed = (time.perf_counter() - start) / len(origins)
+    print(f"{len(picker.rows)} parts: {hits}/{len(origins)} hits, {1e3 * elapsed:.3f} ms per pick, "
+          f"{MeshBVH.builds} hierarchies built")
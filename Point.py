@@ -1,5 +1,6 @@
 """
 A Point class is defined here, which stores point coordinates, color and corresponding texture coordinates.
+For performance reasons, instances of this class will only have three variable slots: coords, color and texture.
 First version Created on 09/23/2018
 
 :author: micou(Zezhou Sun)
@@ -26,10 +27,7 @@ class Point:
         texture is used to describe corresponding coordinates in texture, can be float or double
     """
 
-    # Enforce type checking for all variables, set them invisible 
-    coords = None
-    color = None
-    texture = None
+    __slots__ = ["coords", "color", "texture"]
 
     def __init__(self, coords=None, color=None, textureCoords=None):
         """
@@ -164,7 +162,12 @@ class Point:
         :type color: ColorType
         :return: None
         """
-        self.color = copy.deepcopy(color)
+        if color is None:
+            self.color = None
+        elif isinstance(color, ColorType):
+            self.color = color.copy()
+        else:
+            self.color = copy.deepcopy(color)
 
     def setColor_r(self, r):
         self.color.r = r
@@ -219,7 +222,14 @@ class Point:
             self.texture = None
 
     def copy(self):
-        newPoint = Point(copy.deepcopy(self.coords), copy.deepcopy(self.color), copy.deepcopy(self.texture))
+        """
+        Copy of this point that shares nothing mutable with it. Skips the conversions done by __init__,
+        since this point's attributes already have the right types
+        """
+        newPoint = type(self).__new__(type(self))
+        newPoint.coords = None if self.coords is None else self.coords.copy()
+        newPoint.color = self.color.copy() if isinstance(self.color, ColorType) else copy.deepcopy(self.color)
+        newPoint.texture = None if self.texture is None else self.texture.copy()
         return newPoint
 
     ################# End of basic functions
@@ -9,19 +9,72 @@ import math
 import numpy as np
 
 
+class QuaternionVector:
+    """
+    Writable view of a Quaternion's vector part, so that q.v[i] = x still updates the quaternion's slots
+    """
+    __slots__ = ["q"]
+
+    names = ("v0", "v1", "v2")
+
+    def __init__(self, q):
+        self.q = q
+
+    def __len__(self):
+        return 3
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [getattr(self.q, name) for name in self.names[index]]
+        return getattr(self.q, self.names[index])
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            names = self.names[index]
+            values = list(value)
+            if len(values) != len(names):
+                raise ValueError("Incorrect number of vector components")
+            for name, v in zip(names, values):
+                setattr(self.q, name, v)
+        else:
+            setattr(self.q, self.names[index], value)
+
+    def __iter__(self):
+        return iter((self.q.v0, self.q.v1, self.q.v2))
+
+    def __eq__(self, other):
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return repr([self.q.v0, self.q.v1, self.q.v2])
+
+
 class Quaternion:
     """
     Defines Quaternion object here, which includes several basic quaternion operations
+    Instances only have four float slots, the vector part is read and written through the v property
     """
-    # scalar component of this quaternion
-    s = 0.0
-    # vector components of this quaternion
-    v = None
+    # s is the scalar component of this quaternion, v0, v1 and v2 are its vector components
+    __slots__ = ["s", "v0", "v1", "v2"]
 
     def __init__(self, s=1, v0=0, v1=0, v2=0):
-        self.v = [0, 0, 0]
         self.set(s, v0, v1, v2)
 
+    @property
+    def v(self):
+        """
+        vector components of this quaternion, as a view that writes through to v0, v1 and v2
+        :rtype: QuaternionVector
+        """
+        return QuaternionVector(self)
+
+    @v.setter
+    def v(self, v):
+        self.v0, self.v1, self.v2 = v
+
     def isNum(self, var):
         """
         Type checking if a variable is number
@@ -38,9 +91,9 @@ class Quaternion:
         if (not self.isNum(s)) or (not self.isNum(v0)) or (not self.isNum(v1)) or (not self.isNum(v2)):
             raise TypeError("Incorrect type set for quaternion")
         self.s = s
-        self.v[0] = v0
-        self.v[1] = v1
-        self.v[2] = v2
+        self.v0 = v0
+        self.v1 = v1
+        self.v2 = v2
 
     def multiply(self, q):
         """
@@ -52,11 +105,11 @@ class Quaternion:
         if not isinstance(q, Quaternion):
             raise TypeError("Quaternion can only multiply Quaternion")
         # s = s1*s2 - v1.v2
-        new_s = self.s * q.s - self.v[0] * q.v[0] - self.v[1] * q.v[1] - self.v[2] * q.v[2]
+        new_s = self.s * q.s - self.v0 * q.v0 - self.v1 * q.v1 - self.v2 * q.v2
         # v = s1 v2 + s2 v1 + v1 x v2
-        new_v0 = (self.s * q.v[0]) + (q.s * self.v[0]) + (self.v[1] * q.v[2] - self.v[2] * q.v[1])
-        new_v1 = (self.s * q.v[1]) + (q.s * self.v[1]) + (self.v[2] * q.v[0] - self.v[0] * q.v[2])
-        new_v2 = (self.s * q.v[2]) + (q.s * self.v[2]) + (self.v[0] * q.v[1] - self.v[1] * q.v[0])
+        new_v0 = (self.s * q.v0) + (q.s * self.v0) + (self.v1 * q.v2 - self.v2 * q.v1)
+        new_v1 = (self.s * q.v1) + (q.s * self.v1) + (self.v2 * q.v0 - self.v0 * q.v2)
+        new_v2 = (self.s * q.v2) + (q.s * self.v2) + (self.v0 * q.v1 - self.v1 * q.v0)
         return Quaternion(new_s, new_v0, new_v1, new_v2)
 
     def norm(self):
@@ -65,7 +118,7 @@ class Quaternion:
         :return: norm of this quaternion
         :rtype: float
         """
-        return math.sqrt(self.s * self.s + self.v[0] * self.v[0] + self.v[1] * self.v[1] + self.v[2] * self.v[2])
+        return math.sqrt(self.s * self.s + self.v0 * self.v0 + self.v1 * self.v1 + self.v2 * self.v2)
 
     def normalize(self):
         """
@@ -77,9 +130,9 @@ class Quaternion:
         # Set a threshold for mag, to avoid divided by 0
         if mag > 1e-6:
             self.s /= mag
-            self.v[0] /= mag
-            self.v[1] /= mag
-            self.v[2] /= mag
+            self.v0 /= mag
+            self.v1 /= mag
+            self.v2 /= mag
         return self
 
     def reset(self):
@@ -88,9 +141,9 @@ class Quaternion:
         :return: None
         """
         self.s = 1
-        self.v[0] = 0
-        self.v[1] = 0
-        self.v[2] = 0
+        self.v0 = 0
+        self.v1 = 0
+        self.v2 = 0
 
     def toMatrix(self):
         """
@@ -100,9 +153,9 @@ class Quaternion:
         """
         q_matrix = np.zeros((4, 4), dtype=np.float64)
         s = self.s
-        a = self.v[0]
-        b = self.v[1]
-        c = self.v[2]
+        a = self.v0
+        b = self.v1
+        c = self.v2
         q_matrix[0, 0] = 1 - 2 * b * b - 2 * c * c
         q_matrix[1, 0] = 2 * a * b + 2 * s * c
         q_matrix[2, 0] = 2 * a * c - 2 * s * b
@@ -116,6 +169,312 @@ class Quaternion:
         return q_matrix
 
 
+class QuaternionArray:
+    """
+    N quaternions stored as the rows (s, v0, v1, v2) of one float array, with batched versions of the Quaternion
+    operations. Methods that change the array in place return self, like Quaternion.normalize
+    """
+    # (N, 4) float array, one quaternion per row
+    data = None
+
+    def __init__(self, data=None, copy=True):
+        """
+        :param data: quaternions as (N, 4) rows, a single (4,) quaternion, or a list of Quaternion. Empty if None
+        :type data: numpy.ndarray or list
+        :param copy: copy data even if it's already a float array
+        :type copy: bool
+        """
+        if data is None:
+            data = np.zeros((0, 4))
+        elif isinstance(data, (list, tuple)) and len(data) > 0 and isinstance(data[0], Quaternion):
+            data = [(q.s, *q.v) for q in data]
+        data = np.array(data, dtype=np.float64) if copy else np.asarray(data, dtype=np.float64)
+        if data.ndim == 1:
+            data = data.reshape(1, 4)
+        if data.ndim != 2 or data.shape[1] != 4:
+            raise ValueError("QuaternionArray needs (N, 4) data")
+        self.data = data
+
+    @classmethod
+    def identity(cls, n):
+        result = cls(np.zeros((n, 4)), copy=False)
+        result.data[:, 0] = 1
+        return result
+
+    @classmethod
+    def fromQuaternions(cls, quaternions):
+        """
+        :param quaternions: list of Quaternion
+        :type quaternions: list
+        :rtype: QuaternionArray
+        """
+        return cls([(q.s, *q.v) for q in quaternions] or None, copy=False)
+
+    def toQuaternions(self):
+        """
+        :return: one Quaternion per row
+        :rtype: list<Quaternion>
+        """
+        return [Quaternion(*map(float, row)) for row in self.data]
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        """
+        An int index returns a Quaternion copy of that row, anything else a QuaternionArray of the selected rows
+        """
+        if isinstance(index, (int, np.integer)):
+            return Quaternion(*map(float, self.data[index]))
+        return QuaternionArray(self.data[index], copy=False)
+
+    def __setitem__(self, index, value):
+        if isinstance(value, Quaternion):
+            value = (value.s, *value.v)
+        elif isinstance(value, QuaternionArray):
+            value = value.data
+        self.data[index] = value
+
+    def __repr__(self):
+        return f"QuaternionArray({self.data!r})"
+
+    def copy(self):
+        return QuaternionArray(self.data)
+
+    @property
+    def s(self):
+        # (N,) view of the scalar parts
+        return self.data[:, 0]
+
+    @property
+    def v(self):
+        # (N, 3) view of the vector parts
+        return self.data[:, 1:]
+
+    def multiply(self, q):
+        """
+        Row-wise product with another QuaternionArray (or a Quaternion / single row, broadcast to every row)
+
+        :return: a new QuaternionArray
+        :rtype: QuaternionArray
+        """
+        if isinstance(q, QuaternionArray):
+            other = q.data
+        elif isinstance(q, Quaternion):
+            other = np.array([(q.s, *q.v)], dtype=np.float64)
+        else:
+            other = QuaternionArray(q, copy=False).data
+        s1, v1 = self.data[:, :1], self.data[:, 1:]
+        s2, v2 = other[:, :1], other[:, 1:]
+        result = np.empty(np.broadcast_shapes(self.data.shape, other.shape))
+        # s = s1*s2 - v1.v2
+        result[:, :1] = s1 * s2 - (v1 * v2).sum(axis=1, keepdims=True)
+        # v = s1 v2 + s2 v1 + v1 x v2
+        result[:, 1:] = s1 * v2 + s2 * v1 + np.cross(v1, v2)
+        return QuaternionArray(result, copy=False)
+
+    def conjugate(self):
+        """
+        :return: a new QuaternionArray with negated vector parts, the inverse of unit quaternions
+        :rtype: QuaternionArray
+        """
+        result = QuaternionArray(self.data)
+        result.data[:, 1:] *= -1
+        return result
+
+    def norm(self):
+        """
+        :return: norm of every quaternion
+        :rtype: numpy.ndarray (N,)
+        """
+        return np.sqrt(np.einsum("ij,ij->i", self.data, self.data))
+
+    def normalize(self):
+        """
+        Normalize every quaternion whose norm is greater than 0
+        :return: this QuaternionArray
+        :rtype: QuaternionArray
+        """
+        mag = self.norm()
+        # Set a threshold for mag, to avoid divided by 0
+        valid = mag > 1e-6
+        self.data[valid] /= mag[valid, None]
+        return self
+
+    def dot(self, q):
+        """
+        :return: row-wise 4D dot product with q
+        :rtype: numpy.ndarray (N,)
+        """
+        return (self.data * q.data).sum(axis=1)
+
+    def nlerp(self, q, t):
+        """
+        Normalized linear interpolation towards q along the shorter arc. Cheaper than slerp, with non-uniform speed
+
+        :param q: targets, one per row or a single row
+        :type q: QuaternionArray
+        :param t: interpolation parameter, scalar or one per row
+        :type t: float or numpy.ndarray
+        :rtype: QuaternionArray
+        """
+        t = np.reshape(t, (-1, 1))
+        target = np.where((self.dot(q) < 0)[:, None], -q.data, q.data)
+        return QuaternionArray((1 - t) * self.data + t * target, copy=False).normalize()
+
+    def slerp(self, q, t):
+        """
+        Spherical linear interpolation towards q along the shorter arc, for unit quaternions.
+        Rows that are almost parallel fall back to nlerp.
+
+        :param q: targets, one per row or a single row
+        :type q: QuaternionArray
+        :param t: interpolation parameter, scalar or one per row
+        :type t: float or numpy.ndarray
+        :rtype: QuaternionArray
+        """
+        t = np.reshape(t, (-1, 1))
+        d = self.dot(q)
+        target = np.where((d < 0)[:, None], -q.data, q.data)
+        d = np.abs(d)[:, None]
+        theta = np.arccos(np.clip(d, -1, 1))
+        sinTheta = np.sin(theta)
+        close = sinTheta < 1e-6
+        sinTheta[close] = 1
+        w0 = np.where(close, 1 - t, np.sin((1 - t) * theta) / sinTheta)
+        w1 = np.where(close, t, np.sin(t * theta) / sinTheta)
+        return QuaternionArray(w0 * self.data + w1 * target, copy=False).normalize()
+
+    @classmethod
+    def fromAxisAngle(cls, axes, angles, degrees=True):
+        """
+        :param axes: rotation axes, normalized here
+        :type axes: numpy.ndarray (N, 3)
+        :param angles: rotation angles
+        :type angles: numpy.ndarray (N,)
+        :param degrees: angles are in degrees rather than radians
+        :type degrees: bool
+        :rtype: QuaternionArray
+        """
+        axes = np.asarray(axes, dtype=np.float64).reshape(-1, 3)
+        angles = np.asarray(angles, dtype=np.float64).reshape(-1)
+        halfRad = (np.radians(angles) if degrees else angles) * 0.5
+        length = np.linalg.norm(axes, axis=1, keepdims=True)
+        length[length < 1e-12] = 1
+        data = np.empty((max(len(axes), len(angles)), 4))
+        data[:, 0] = np.cos(halfRad)
+        data[:, 1:] = np.sin(halfRad)[:, None] * axes / length
+        return cls(data, copy=False)
+
+    def toAxisAngle(self, degrees=True):
+        """
+        :return: unit rotation axes (x axis for identity rotations) and angles in [0, 360) degrees or [0, 2pi)
+        :rtype: tuple[numpy.ndarray (N, 3), numpy.ndarray (N,)]
+        """
+        q = QuaternionArray(self.data).normalize().data
+        angles = 2 * np.arctan2(np.linalg.norm(q[:, 1:], axis=1), q[:, 0])
+        axes = q[:, 1:].copy()
+        length = np.linalg.norm(axes, axis=1)
+        degenerate = length < 1e-12
+        axes[degenerate] = (1, 0, 0)
+        length[degenerate] = 1
+        axes /= length[:, None]
+        angles = np.mod(angles, 2 * math.pi)
+        return axes, (np.degrees(angles) if degrees else angles)
+
+    @classmethod
+    def fromEuler(cls, angles, degrees=True):
+        """
+        Rotations about x, then y, then z, so that toMatrix gives Rz @ Ry @ Rx, the rotation Component builds from
+        its u, v and w angles under the default axes. Component applies quaternions transposed (as the inverse
+        rotation) though, so use fromComponentAngles to get quaternions for Component.setQuaternion
+
+        :param angles: (N, 3) angles about x, y and z
+        :type angles: numpy.ndarray
+        :rtype: QuaternionArray
+        """
+        angles = np.asarray(angles, dtype=np.float64).reshape(-1, 3)
+        half = (np.radians(angles) if degrees else angles) * 0.5
+        c, s = np.cos(half), np.sin(half)
+        cx, cy, cz = c[:, 0], c[:, 1], c[:, 2]
+        sx, sy, sz = s[:, 0], s[:, 1], s[:, 2]
+        data = np.empty((len(angles), 4))
+        data[:, 0] = cx * cy * cz + sx * sy * sz
+        data[:, 1] = sx * cy * cz - cx * sy * sz
+        data[:, 2] = cx * sy * cz + sx * cy * sz
+        data[:, 3] = cx * cy * sz - sx * sy * cz
+        return cls(data, copy=False)
+
+    def toEuler(self, degrees=True):
+        """
+        Inverse of fromEuler. At gimbal lock (y = +-90 degrees) the x angle is set to 0
+
+        :return: (N, 3) angles about x, y and z
+        :rtype: numpy.ndarray
+        """
+        r = self.toMatrix3()
+        result = np.empty((len(self.data), 3))
+        sy = np.clip(-r[:, 2, 0], -1, 1)
+        result[:, 1] = np.arcsin(sy)
+        locked = np.abs(sy) > 1 - 1e-9
+        result[:, 0] = np.where(locked, 0, np.arctan2(r[:, 2, 1], r[:, 2, 2]))
+        result[:, 2] = np.where(locked, np.arctan2(-r[:, 0, 1], r[:, 1, 1]), np.arctan2(r[:, 1, 0], r[:, 0, 0]))
+        return np.degrees(result) if degrees else result
+
+    def rotateVectors(self, vectors):
+        """
+        Rotate one vector per row by its unit quaternion, the same as toMatrix3() @ vector
+
+        :type vectors: numpy.ndarray (N, 3)
+        :rtype: numpy.ndarray (N, 3)
+        """
+        s, v = self.data[:, :1], self.data[:, 1:]
+        t = 2 * np.cross(v, vectors)
+        return vectors + s * t + np.cross(v, t)
+
+    def toMatrix3(self):
+        """
+        :return: (N, 3, 3) rotation matrices, laid out like the upper left of Quaternion.toMatrix
+        :rtype: numpy.ndarray
+        """
+        s, a, b, c = self.data[:, 0], self.data[:, 1], self.data[:, 2], self.data[:, 3]
+        result = np.empty((len(self.data), 3, 3))
+        result[:, 0, 0] = 1 - 2 * b * b - 2 * c * c
+        result[:, 1, 0] = 2 * a * b + 2 * s * c
+        result[:, 2, 0] = 2 * a * c - 2 * s * b
+        result[:, 0, 1] = 2 * a * b - 2 * s * c
+        result[:, 1, 1] = 1 - 2 * a * a - 2 * c * c
+        result[:, 2, 1] = 2 * b * c + 2 * s * a
+        result[:, 0, 2] = 2 * a * c + 2 * s * b
+        result[:, 1, 2] = 2 * b * c - 2 * s * a
+        result[:, 2, 2] = 1 - 2 * a * a - 2 * b * b
+        return result
+
+    @classmethod
+    def fromComponentAngles(cls, angles, degrees=True):
+        """
+        Quaternions that rotate a Component under setQuaternion the same way its u, v and w angles do under the
+        default axes. Component uses the transpose of toMatrix, so these are the conjugates of fromEuler
+
+        :param angles: (N, 3) u, v and w angles
+        :type angles: numpy.ndarray
+        :rtype: QuaternionArray
+        """
+        return cls.fromEuler(angles, degrees).conjugate()
+
+    def toMatrix(self):
+        """
+        Batched Quaternion.toMatrix
+        Component applies the transpose of these matrices, see fromComponentAngles
+        :return: (N, 4, 4) matrices
+        :rtype: numpy.ndarray
+        """
+        result = np.zeros((len(self.data), 4, 4))
+        result[:, :3, :3] = self.toMatrix3()
+        result[:, 3, 3] = 1
+        return result
+
+
 if __name__ == "__main__":
     t1 = time.time()
     for _ in range(1000000):
@@ -131,3 +490,18 @@ if __name__ == "__main__":
     c = a.multiply(b).normalize()
     print(c.toMatrix())
     print("Cost time: ", t2 - t1)
+
+    # one by one against batched, for many joints or frames at once
+    n = 100000
+    rng = np.random.default_rng(0)
+    qa = QuaternionArray(rng.normal(size=(n, 4))).normalize()
+    qb = QuaternionArray(rng.normal(size=(n, 4))).normalize()
+    listA = qa.toQuaternions()
+    listB = qb.toQuaternions()
+    t1 = time.time()
+    loopResult = [x.multiply(y).toMatrix() for x, y in zip(listA, listB)]
+    t2 = time.time()
+    batchResult = qa.multiply(qb).toMatrix()
+    t3 = time.time()
+    assert np.allclose(np.array(loopResult), batchResult)
+    print(f"multiply + toMatrix of {n} quaternions: loop {t2 - t1:.3f} s, batched {t3 - t2:.3f} s")
@@ -0,0 +1,325 @@
+"""
+Headless replay of recorded input, to time the per-frame work of Sketch without a window.
+Record a session with "python Sketch.py --record session.rec.gz" (or press "I" in the window), then run
+"python Replay.py session.rec.gz". Events are applied between the same frames they arrived between, and animations
+read the recorded frame times, so every run does the same work. By default nothing is drawn; with --offscreen the
+frames are also rendered into an offscreen EGL surface, which needs a GL driver but no display.
+"""
+
+import os
+import sys
+import time
+
+# both only matter with --offscreen, and must be set before PyOpenGL is imported
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+
+import numpy as np
+
+from Component import Component
+from FrameScheduler import FrameScheduler
+from InputRecorder import InputRecorder, loadRecording
+from Point import Point
+from SketchScene import SketchScene
+
+try:
+    import OpenGL
+
+    try:
+        import OpenGL.GL as gl
+        import OpenGL.GLU as glu
+    except ImportError:
+        from ctypes import util
+
+        orig_util_find_library = util.find_library
+
+        def new_util_find_library(name):
+            res = orig_util_find_library(name)
+            if res:
+                return res
+            return "/System/Library/Frameworks/" + name + ".framework/" + name
+
+        util.find_library = new_util_find_library
+        import OpenGL.GL as gl
+        import OpenGL.GLU as glu
+except ImportError:
+    raise ImportError("Required dependency PyOpenGL not present")
+
+
+class OffscreenContext:
+    """
+    OpenGL 3.3 core context on an EGL pbuffer surface
+    """
+    display = None
+    surface = None
+    context = None
+
+    def __init__(self, width, height):
+        """
+        :param width: surface width in pixels
+        :type width: int
+        :param height: surface height in pixels
+        :type height: int
+        """
+        import ctypes
+
+        from OpenGL import EGL
+
+        self.display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        major, minor = EGL.EGLint(), EGL.EGLint()
+        if not EGL.eglInitialize(self.display, ctypes.pointer(major), ctypes.pointer(minor)):
+            raise RuntimeError("Cannot initialize EGL")
+        attributes = [
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8, EGL.EGL_BLUE_SIZE, 8,
+            EGL.EGL_DEPTH_SIZE, 24,
+            EGL.EGL_NONE,
+        ]
+        config = EGL.EGLConfig()
+        configCount = EGL.EGLint()
+        if not EGL.eglChooseConfig(self.display, (EGL.EGLint * len(attributes))(*attributes),
+                                   ctypes.pointer(config), 1, ctypes.pointer(configCount)) \
+                or configCount.value == 0:
+            raise RuntimeError("No EGL config with an OpenGL pbuffer")
+        surfaceAttributes = [EGL.EGL_WIDTH, int(width), EGL.EGL_HEIGHT, int(height), EGL.EGL_NONE]
+        self.surface = EGL.eglCreatePbufferSurface(self.display, config,
+                                                   (EGL.EGLint * len(surfaceAttributes))(*surfaceAttributes))
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        contextAttributes = [
+            EGL.EGL_CONTEXT_MAJOR_VERSION, 3,
+            EGL.EGL_CONTEXT_MINOR_VERSION, 3,
+            EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT,
+            EGL.EGL_NONE,
+        ]
+        self.context = EGL.eglCreateContext(self.display, config, EGL.EGL_NO_CONTEXT,
+                                            (EGL.EGLint * len(contextAttributes))(*contextAttributes))
+        if not self.context or not EGL.eglMakeCurrent(self.display, self.surface, self.surface, self.context):
+            raise RuntimeError("Cannot create an OpenGL 3.3 core context")
+
+
+class HeadlessSketch(SketchScene):
+    """
+    The scene of Sketch without a window. Time is virtual: it is whatever the replay sets virtualTime to
+    """
+    size = None
+    topLevelComponent = None
+    scheduler = None
+    virtualTime = 0.0
+    offscreen = None  # OffscreenContext, None to skip drawing
+
+    def __init__(self, size, offscreen=False):
+        """
+        :param size: canvas width and height
+        :type size: tuple[int, int]
+        :param offscreen: render every frame into an offscreen surface
+        :type offscreen: bool
+        """
+        self.size = [max(1, int(size[0])), max(1, int(size[1]))]
+        self.topLevelComponent = Component(Point((0, 0, 0)))
+        self.scheduler = FrameScheduler(-1, clock=self.now)
+        self.virtualTime = 0.0
+        self.clock = self.now
+        self.initScene()
+
+        shaderProg = None
+        if offscreen:
+            from GLProgram import GLProgram
+
+            self.offscreen = OffscreenContext(*self.size)
+            GLProgram.resetBinding()
+            shaderProg = GLProgram()
+            shaderProg.compile()
+            gl.glClearDepth(1.0)
+            gl.glEnable(gl.GL_DEPTH_TEST)
+        self.buildScene(shaderProg)
+        self.resize(*self.size)
+        if shaderProg is not None:
+            shaderProg.setMat4("modelMat", np.identity(4))
+
+    def now(self):
+        return self.virtualTime
+
+    def resize(self, width, height):
+        self.size = [max(1, int(width)), max(1, int(height))]
+        super(HeadlessSketch, self).resize(*self.size)
+        if self.offscreen is not None:
+            # the pbuffer keeps its size, only the projection follows
+            gl.glViewport(0, 0, self.size[0], self.size[1])
+            self.shaderProg.setMat4("projectionMat", self.perspMat)
+
+    def requestRedraw(self):
+        self.scheduler.requestRedraw()
+
+    def drawFrame(self, now):
+        """
+        Advance to time now and draw, or only cull without a GL context
+
+        :param now: virtual time of the frame
+        :type now: float
+        """
+        self.virtualTime = now
+        self.advanceFrame(now)
+        if self.offscreen is not None:
+            gl.glClearColor(*self.backgroundColor, 1.0)
+            gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
+            self.renderFrame()
+            start = time.perf_counter()
+            # wait for the GPU, so the frame's cost is measured rather than queued
+            gl.glFinish()
+            self.frameTimes["finish"] = time.perf_counter() - start
+        elif self.useCulling:
+            start = time.perf_counter()
+            self.topLevelComponent.getSceneGraph().cull(self.camera.frustum)
+            self.frameTimes["cull"] = time.perf_counter() - start
+        self.scheduler.frameDrawn()
+
+
+class Replayer:
+    """
+    Plays a recording into a HeadlessSketch and keeps the stage times of every frame
+    """
+    header = None
+    events = None  # list<InputEvent>
+    scene = None  # HeadlessSketch
+    frames = None  # list<dict<str, float>>, seconds per stage of every frame
+    skippedEvents = 0  # events calling an Interrupt_* method the scene doesn't have
+
+    def __init__(self, path, offscreen=False):
+        """
+        :param path: recording written by InputRecorder
+        :type path: str
+        :param offscreen: render the frames with an offscreen GL context
+        :type offscreen: bool
+        """
+        self.header, self.events = loadRecording(path)
+        self.offscreen = offscreen
+
+    def run(self):
+        """
+        Replay the whole recording with a fresh scene
+
+        :return: stage times of every frame
+        :rtype: list<dict<str, float>>
+        """
+        self.scene = HeadlessSketch(self.header["size"], self.offscreen)
+        self.frames = []
+        self.skippedEvents = 0
+        handling = 0.0
+        for event in self.events:
+            if event.name == InputRecorder.FRAME:
+                start = time.perf_counter()
+                self.scene.drawFrame(event.time)
+                times = dict(self.scene.frameTimes)
+                times["events"] = handling
+                times["frame"] = time.perf_counter() - start + handling
+                self.frames.append(times)
+                handling = 0.0
+                continue
+            self.scene.virtualTime = event.time
+            if event.name == InputRecorder.RESIZE:
+                self.scene.resize(*event.args)
+                continue
+            handler = getattr(self.scene, event.name, None)
+            if handler is None:
+                self.skippedEvents += 1
+                continue
+            self.scene.dragging_event = event.dragging
+            self.scene.new_dragging_event = event.newDragging
+            start = time.perf_counter()
+            handler(*event.args)
+            handling += time.perf_counter() - start
+        return self.frames
+
+    def summary(self):
+        """
+        :return: count, mean, median, 95th percentile and maximum in milliseconds of every stage
+        :rtype: dict<str, dict<str, float>>
+        """
+        result = {}
+        stages = []
+        for times in self.frames:
+            stages.extend(s for s in times if s not in stages)
+        for stage in stages:
+            ms = 1e3 * np.array([times[stage] for times in self.frames if stage in times])
+            result[stage] = {
+                "count": len(ms),
+                "mean": float(ms.mean()),
+                "median": float(np.median(ms)),
+                "p95": float(np.percentile(ms, 95)),
+                "max": float(ms.max()),
+            }
+        return result
+
+    def report(self):
+        print(f"{len(self.frames)} frames, {len(self.events) - len(self.frames)} events"
+              + (f", {self.skippedEvents} without a handler" if self.skippedEvents else "")
+              + (", rendered offscreen" if self.offscreen else ", not rendered"))
+        print(f"{'stage':<10} {'mean':>8} {'median':>8} {'p95':>8} {'max':>8}  ms")
+        for stage, values in self.summary().items():
+            print(f"{stage:<10} {values['mean']:8.3f} {values['median']:8.3f} {values['p95']:8.3f} "
+                  f"{values['max']:8.3f}")
+
+    def writeCSV(self, path):
+        """
+        One row per frame, one column per stage, in milliseconds
+        """
+        stages = list(self.summary())
+        with open(path, "w") as file:
+            file.write(",".join(["index"] + stages) + "\n")
+            for i, times in enumerate(self.frames):
+                file.write(",".join([str(i)] + [f"{1e3 * times[s]:.4f}" if s in times else "" for s in stages])
+                           + "\n")
+
+
+def writeDemoRecording(path, seconds=4.0, fps=60, size=(500, 500)):
+    """
+    Write a synthetic session: the spider walks with planted feet while the camera orbits and zooms
+
+    :param path: recording file to write
+    :type path: str
+    """
+    now = [0.0]
+    recorder = InputRecorder(path, size, clock=lambda: now[0])
+    recorder.record("Interrupt_Keyboard", (ord("w"),))
+    recorder.record("Interrupt_Keyboard", (ord("f"),))
+    frames = int(seconds * fps)
+    for i in range(frames):
+        now[0] = i / fps
+        # a few motion events arrive between two frames
+        for j in range(3):
+            x, y = 250 + 100 * np.cos(0.02 * (3 * i + j)), 250 + 50 * np.sin(0.03 * (3 * i + j))
+            if i < frames // 2:
+                recorder.record("Interrupt_MouseMoving", (int(x), int(y)))
+            else:
+                recorder.record("Interrupt_MouseMiddleDragging", (int(x), int(y)), True, i == frames // 2 and j == 0)
+        if i % 30 == 0:
+            recorder.record("Interrupt_Scroll", (120 if i % 60 == 0 else -120,))
+        recorder.frame()
+    recorder.close()
+    return recorder
+
+
+if __name__ == "__main__":
+    # python Replay.py recording.rec.gz [--offscreen] [--csv frames.csv]
+    # python Replay.py --demo recording.rec.gz writes a synthetic recording first
+    args = sys.argv[1:]
+    if not args:
+        print(__doc__)
+        sys.exit(1)
+    offscreen = "--offscreen" in args
+    csvPath = args[args.index("--csv") + 1] if "--csv" in args else None
+    if "--demo" in args:
+        path = args[args.index("--demo") + 1]
+        recorder = writeDemoRecording(path)
+        print(f"Wrote {recorder.eventCount} events over {recorder.frameCount} frames to {path}")
+    else:
+        path = args[0]
+
+    replayer = Replayer(path, offscreen)
+    start = time.perf_counter()
+    replayer.run()
+    print(f"replayed in {time.perf_counter() - start:.2f} s")
+    replayer.report()
+    if csvPath is not None:
+        replayer.writeCSV(csvPath)
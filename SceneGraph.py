@@ -0,0 +1,490 @@
+"""
+Array-backed storage for a Component hierarchy.
+The tree is packed in breadth-first order into contiguous numpy arrays, so forward kinematics can be evaluated
+one depth level at a time with a single batched matrix product per level instead of a Python recursion.
+
+Component objects keep working as before: their transform attributes (angles, position, scale, quaternion,
+pre/post rotation and transformationMat) are thin views into one row of these arrays.
+"""
+
+import numpy as np
+
+from GLUtility import GLUtility
+from Quaternion import QuaternionArray
+
+# half size of the box given to displayObjs without bounds, so they are never culled
+UNBOUNDED = 1e30
+
+
+class SceneGraph:
+    """
+    Contiguous arrays for every Component under a root, in breadth-first order
+
+    Per-component local parameters are stored as rows, world matrices as an (N, 4, 4) array. update() only
+    rebuilds the local matrices of dirty rows, then walks down from them one depth level at a time and recomputes
+    the world matrices of the dirty rows and of their subtrees. Rows outside those subtrees are never visited.
+    """
+
+    nodes = None  # list<Component>, breadth-first order, nodes[0] is the root
+    parents = None  # (N,) int, parent index of every row, -1 for the root
+    levels = None  # list<(start, end)>, row ranges of every depth level
+    depths = None  # (N,) int, depth level of every row
+    # breadth-first order keeps the children of a row next to each other
+    firstChild = None  # (N,) int, row of the first child
+    childCounts = None  # (N,) int, number of children
+    subtreeSizes = None  # (N,) int, number of rows in the row's subtree, itself included
+
+    positions = None  # (N, 3) translation from the parent
+    scales = None  # (N, 3) scaling along three axes
+    angles = None  # (N, 3) u, v, w angles in degrees
+    axes = None  # (N, 3, 3) u, v, w rotation axes
+    quats = None  # (N, 4) quaternion rotation, used instead of the angles where useQuat is set
+    useQuat = None  # (N,) bool
+    preMats = None  # (N, 4, 4) pre-rotation matrices
+    postMats = None  # (N, 4, 4) post-rotation matrices
+
+    localMats = None  # (N, 4, 4) cached local transformations
+    worldMats = None  # (N, 4, 4) world transformations
+    dirty = None  # (N,) bool, row's local parameters changed since the last update
+
+    localMins = None  # (N, 3) bounding box of the row's own displayObj in its local space, inf if it has none
+    localMaxs = None  # (N, 3) -inf if it has none
+    drawables = None  # (N,) bool, row has a displayObj
+    ownMins = None  # (N, 3) world bounding box of the row's own displayObj
+    ownMaxs = None
+    worldMins = None  # (N, 3) world bounding box of the row and everything below it
+    worldMaxs = None
+
+    visible = None  # (N,) bool, result of the last cull
+    culledDraws = 0  # number of displayObjs skipped by the last cull
+    cullKey = None  # (frustum, boundsVersion) the last cull was computed for
+    boundsVersion = 0  # incremented every time world bounds are refitted
+    # rows whose world matrix changed since the last refit. Bounds are refitted when they are read, by cull,
+    # refreshBounds or Component.getWorldBounds, so all the updates between two frames share one refit
+    boundsPending = None  # (N,) bool
+    boundsStale = False  # some row of boundsPending is set
+    # up to this many changed drawables, bounds are refitted row by row up the ancestor chains, stopping where
+    # they no longer change; more are refitted one depth level at a time
+    chainRefitLimit = 4
+    # up to this many dirty rows, local matrices are built one row at a time with GLUtility.trs, which is much
+    # cheaper than the fixed overhead of the batched builders for a single-joint edit
+    scalarRowLimit = 4
+    # up to this many rows below the dirty ones, world matrices are recomputed row by row instead of one depth
+    # level at a time
+    scalarWalkLimit = 64
+
+    # scratch buffers reused by every update, so evaluating the transforms allocates no per-frame (N, 4, 4) arrays
+    _rotations = None  # (N, 3, 3)
+    _tsr = None  # (N, 4, 4)
+    _product = None  # (N, 4, 4)
+
+    # row values of a component nobody changed, also held by components before their storage is built
+    rowDefaults = {
+        "positions": np.zeros(3),
+        "scales": np.ones(3),
+        "angles": np.zeros(3),
+        "axes": np.identity(3),
+        "quats": np.array([1.0, 0.0, 0.0, 0.0]),
+        "preMats": np.identity(4),
+        "postMats": np.identity(4),
+        "worldMats": np.identity(4),
+    }
+
+    rootParentMat = None  # world matrix applied above the root
+    stale = False  # the hierarchy changed, this storage must be rebuilt from the root
+    recomputedCount = 0  # number of rows recomputed by the last update
+
+    def __init__(self, root):
+        """
+        Pack the tree under root into arrays, copying every component's current transform state and
+        rebinding the components to the new rows.
+
+        :param root: top of the hierarchy
+        :type root: Component
+        """
+        self.nodes = [root]
+        parents = [-1]
+        depths = [0]
+        firstChild = []
+        self.levels = []
+        start = 0
+        while start < len(self.nodes):
+            end = len(self.nodes)
+            self.levels.append((start, end))
+            for i in range(start, end):
+                firstChild.append(len(self.nodes))
+                for c in self.nodes[i].children:
+                    self.nodes.append(c)
+                    parents.append(i)
+                    depths.append(len(self.levels))
+            start = end
+        self.parents = np.array(parents, dtype=np.intp)
+        self.depths = np.array(depths, dtype=np.intp)
+        self.firstChild = np.array(firstChild, dtype=np.intp)
+        self.childCounts = np.bincount(self.parents[1:], minlength=len(self.nodes)).astype(np.intp)
+        self.subtreeSizes = np.ones(len(self.nodes), dtype=np.intp)
+        for start, end in self.levels[:0:-1]:
+            np.add.at(self.subtreeSizes, self.parents[start:end], self.subtreeSizes[start:end])
+
+        n = len(self.nodes)
+        self.positions = np.zeros((n, 3))
+        self.scales = np.ones((n, 3))
+        self.angles = np.zeros((n, 3))
+        self.axes = np.tile(np.identity(3), (n, 1, 1))
+        self.quats = np.tile([1.0, 0.0, 0.0, 0.0], (n, 1))
+        self.useQuat = np.zeros(n, dtype=bool)
+        self.preMats = np.tile(np.identity(4), (n, 1, 1))
+        self.postMats = np.tile(np.identity(4), (n, 1, 1))
+        self.localMats = np.tile(np.identity(4), (n, 1, 1))
+        self.worldMats = np.tile(np.identity(4), (n, 1, 1))
+        # the structure changed, so everything is recomputed once
+        self.dirty = np.ones(n, dtype=bool)
+        self.rootParentMat = np.identity(4)
+        self._rotations = np.empty((n, 3, 3))
+        self._tsr = np.empty((n, 4, 4))
+        self._product = np.empty((n, 4, 4))
+
+        self.localMins = np.full((n, 3), np.inf)
+        self.localMaxs = np.full((n, 3), -np.inf)
+        self.drawables = np.zeros(n, dtype=bool)
+        self.ownMins = np.full((n, 3), np.inf)
+        self.ownMaxs = np.full((n, 3), -np.inf)
+        self.worldMins = np.full((n, 3), np.inf)
+        self.worldMaxs = np.full((n, 3), -np.inf)
+        self.visible = np.ones(n, dtype=bool)
+        self.boundsPending = np.zeros(n, dtype=bool)
+        self.loadBounds()
+
+        for i, node in enumerate(self.nodes):
+            old = node._scene
+            if old is not None:
+                j = node._index
+                self.positions[i] = old.positions[j]
+                self.scales[i] = old.scales[j]
+                self.angles[i] = old.angles[j]
+                self.axes[i] = old.axes[j]
+                self.quats[i] = old.quats[j]
+                self.useQuat[i] = old.useQuat[j]
+                self.preMats[i] = old.preMats[j]
+                self.postMats[i] = old.postMats[j]
+                self.worldMats[i] = old.worldMats[j]
+                if i == 0 and old.nodes[0] is node:
+                    self.rootParentMat = old.rootParentMat
+            elif node._pending is not None:
+                for name, value in node._pending.items():
+                    getattr(self, name)[i] = value
+            node._pending = None
+            node._scene = self
+            node._index = i
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def loadBounds(self, rows=None):
+        """
+        Read the local bounding boxes of the rows' displayObjs. The world bounds follow once the next update has run and they are read.
+
+        :param rows: row indices, every row if None
+        :type rows: list or None
+        """
+        for i in range(len(self.nodes)) if rows is None else rows:
+            displayObj = self.nodes[i].displayObj
+            bounds = None if displayObj is None else displayObj.getBounds()
+            self.drawables[i] = displayObj is not None
+            if displayObj is None:
+                self.localMins[i], self.localMaxs[i] = np.inf, -np.inf
+            elif bounds is None:
+                # never cull what we can't bound
+                self.localMins[i], self.localMaxs[i] = -UNBOUNDED, UNBOUNDED
+            else:
+                self.localMins[i], self.localMaxs[i] = bounds
+            self.dirty[i] = True
+
+    def childRows(self, rows):
+        """
+        Rows of the children of the given rows
+
+        :param rows: row indices
+        :type rows: numpy.ndarray
+        :return: children of rows[0], then of rows[1] and so on. Sorted if rows is sorted
+        :rtype: numpy.ndarray
+        """
+        counts = self.childCounts[rows]
+        total = int(counts.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.intp)
+        # every child's row is its parent's firstChild plus its position among the siblings
+        skipped = np.cumsum(counts) - counts
+        return np.arange(total, dtype=np.intp) + np.repeat(self.firstChild[rows] - skipped, counts)
+
+    def setRootParent(self, mat):
+        """
+        Set the world matrix the root is attached to. Only marks the root dirty if the value changed.
+
+        :type mat: numpy.ndarray
+        """
+        if not np.array_equal(self.rootParentMat, mat):
+            self.rootParentMat = np.array(mat, dtype=float)
+            self.dirty[0] = True
+
+    def updateLocal(self, rows):
+        """
+        Rebuild postRotation @ T @ S @ Rw @ Rv @ Ru @ preRotation for the given rows in one batch
+
+        :param rows: row indices
+        :type rows: numpy.ndarray
+        """
+        n = len(rows)
+        if n <= self.scalarRowLimit:
+            for row in rows.tolist():
+                self.updateLocalRow(row)
+            return
+        full = n == len(self.nodes)
+        if full:
+            # plain views instead of gathered copies
+            rows = slice(None)
+        rotations = GLUtility.rotateBatch(self.angles[rows], self.axes[rows], out=self._rotations[:n])
+
+        useQuat = self.useQuat[rows]
+        if useQuat.any():
+            # quaternions override the Euler angles
+            quats = QuaternionArray(self.quats[rows][useQuat], copy=False)
+            rotations[useQuat] = quats.toMatrix3().transpose(0, 2, 1)
+
+        tsr = GLUtility.trsBatch(self.positions[rows], self.scales[rows], rotations, out=self._tsr[:n])
+        product = np.matmul(self.postMats[rows], tsr, out=self._product[:n])
+        if full:
+            np.matmul(product, self.preMats, out=self.localMats)
+        else:
+            self.localMats[rows] = np.matmul(product, self.preMats[rows], out=tsr)
+
+    def updateLocalRow(self, row):
+        """
+        updateLocal for a single row
+
+        :type row: int
+        """
+        tsr = self._tsr[0]
+        if self.useQuat[row]:
+            s, a, b, c = self.quats[row].tolist()
+            tsr.fill(0)
+            # the conjugate, since quaternion rows use the transposed rotation, see updateLocal
+            GLUtility.writeRotation(tsr, (s, -a, -b, -c), self.scales[row].tolist())
+            tsr[0:3, 3] = self.positions[row]
+            tsr[3, 3] = 1
+        else:
+            GLUtility.trs(self.positions[row], self.scales[row].tolist(), self.angles[row].tolist(),
+                          self.axes[row].tolist(), out=tsr)
+        product = np.matmul(self.postMats[row], tsr, out=self._product[0])
+        np.matmul(product, self.preMats[row], out=self.localMats[row])
+
+    def update(self):
+        """
+        Recompute the world matrices of every dirty row and of everything below it
+
+        :return: number of rows recomputed
+        :rtype: int
+        """
+        dirtyRows = np.flatnonzero(self.dirty)
+        if len(dirtyRows) == 0:
+            self.recomputedCount = 0
+            return 0
+        self.updateLocal(dirtyRows)
+        self.dirty[dirtyRows] = False
+
+        if self.subtreeSizes[dirtyRows].sum() <= self.scalarWalkLimit:
+            changed = self.updateWorldRows(dirtyRows)
+            self.boundsPending[changed] = True
+            self.boundsStale = True
+            self.recomputedCount = len(changed)
+            return self.recomputedCount
+
+        # walk down from the shallowest dirty row. At every level, recompute the dirty rows there and the children
+        # of the rows recomputed one level up
+        recomputed = []
+        above = dirtyRows[:0]
+        taken = 0
+        for depth in range(self.depths[dirtyRows[0]], len(self.levels)):
+            start, end = self.levels[depth]
+            last = int(np.searchsorted(dirtyRows, end))
+            own = dirtyRows[taken:last]
+            taken = last
+            rows = self.childRows(above) if len(above) > 0 else above
+            if len(own) > 0:
+                rows = np.union1d(rows, own) if len(rows) > 0 else own
+            if len(rows) == 0:
+                if taken == len(dirtyRows):
+                    break
+            elif depth == 0:
+                # root level has no parent row
+                np.matmul(self.rootParentMat, self.localMats[0], out=self.worldMats[0])
+            elif len(rows) == end - start:
+                parents = self.parents[start:end]
+                np.matmul(self.worldMats[parents], self.localMats[start:end], out=self.worldMats[start:end])
+            else:
+                self.worldMats[rows] = self.worldMats[self.parents[rows]] @ self.localMats[rows]
+            recomputed.append(rows)
+            above = rows
+
+        changed = np.concatenate(recomputed)
+        self.boundsPending[changed] = True
+        self.boundsStale = True
+        self.recomputedCount = len(changed)
+        return self.recomputedCount
+
+    def updateWorldRows(self, dirtyRows):
+        """
+        The world matrix step of update for a few rows: recompute the dirty rows and their subtrees one row at a
+        time, parents first
+
+        :param dirtyRows: sorted row indices
+        :type dirtyRows: numpy.ndarray
+        :return: recomputed rows, sorted
+        :rtype: numpy.ndarray
+        """
+        rows = set()
+        stack = dirtyRows.tolist()
+        while stack:
+            row = stack.pop()
+            if row in rows:
+                continue
+            rows.add(row)
+            first = int(self.firstChild[row])
+            stack.extend(range(first, first + int(self.childCounts[row])))
+        rows = sorted(rows)
+        worldMats = self.worldMats
+        for row in rows:
+            # children have higher rows than their parents, so the parent is already up to date
+            parentMat = self.rootParentMat if row == 0 else worldMats[self.parents[row]]
+            np.matmul(parentMat, self.localMats[row], out=worldMats[row])
+        return np.array(rows, dtype=np.intp)
+
+    def refreshBounds(self):
+        """
+        Refit the bounds of every row whose world matrix changed since the last refit, see refitBounds
+        """
+        if not self.boundsStale:
+            return
+        changed = np.flatnonzero(self.boundsPending)
+        self.boundsPending[changed] = False
+        self.boundsStale = False
+        self.refitBounds(changed)
+
+    def refitBounds(self, changed):
+        """
+        Transform the boxes of changed rows to world space, then rebuild the hierarchical bounds of those rows and
+        of their ancestors, bottom-up. Every other row keeps its bounds. Nothing is done if no drawable row changed
+
+        :param changed: rows whose world matrix was recomputed
+        :type changed: numpy.ndarray
+        """
+        drawable = self.drawables[changed]
+        rows = changed[drawable]
+        # rows that lost their displayObj still hold the box of the old one
+        emptied = changed[~drawable]
+        emptied = emptied[self.ownMins[emptied, 0] <= self.ownMaxs[emptied, 0]]
+        if len(rows) == 0 and len(emptied) == 0:
+            return
+        if len(rows) > 0:
+            mats = self.worldMats[rows]
+            centers = (self.localMins[rows] + self.localMaxs[rows]) * 0.5
+            extents = (self.localMaxs[rows] - self.localMins[rows]) * 0.5
+            # box around the transformed box: rotate the center, project the extents onto the world axes
+            worldCenters = np.einsum("nij,nj->ni", mats[:, :3, :3], centers) + mats[:, :3, 3]
+            worldExtents = np.einsum("nij,nj->ni", np.abs(mats[:, :3, :3]), extents)
+            self.ownMins[rows] = worldCenters - worldExtents
+            self.ownMaxs[rows] = worldCenters + worldExtents
+        if len(emptied) > 0:
+            self.ownMins[emptied] = np.inf
+            self.ownMaxs[emptied] = -np.inf
+            rows = np.union1d(rows, emptied)
+
+        if len(rows) <= self.chainRefitLimit:
+            # children have higher rows than their parents, so the highest pending row never waits for another
+            pending = set(rows.tolist())
+            while pending:
+                row = max(pending)
+                pending.remove(row)
+                if self.mergeRowBounds(row) and row > 0:
+                    pending.add(int(self.parents[row]))
+            self.boundsVersion += 1
+            return
+
+        # deepest level first, so every subtree is complete before it is merged into its parent.
+        # Rows are sorted, and so are the parents of sorted rows
+        above = rows[:0]
+        last = len(rows)
+        for depth in range(self.depths[rows[-1]], -1, -1):
+            start, end = self.levels[depth]
+            first = int(np.searchsorted(rows, start))
+            level = rows[first:last]
+            last = first
+            if len(above) > 0:
+                level = np.union1d(level, above) if len(level) > 0 else above
+            if len(level) == 0:
+                continue
+            self.mergeChildBounds(level)
+            above = np.unique(self.parents[level]) if depth > 0 else level[:0]
+        self.boundsVersion += 1
+
+    def mergeRowBounds(self, row):
+        """
+        mergeChildBounds for a single row
+
+        :type row: int
+        :return: whether the row's subtree bounds changed
+        :rtype: bool
+        """
+        mins = self.ownMins[row]
+        maxs = self.ownMaxs[row]
+        count = self.childCounts[row]
+        if count > 0:
+            first = self.firstChild[row]
+            mins = np.minimum(mins, self.worldMins[first:first + count].min(axis=0))
+            maxs = np.maximum(maxs, self.worldMaxs[first:first + count].max(axis=0))
+        if (mins == self.worldMins[row]).all() and (maxs == self.worldMaxs[row]).all():
+            return False
+        self.worldMins[row] = mins
+        self.worldMaxs[row] = maxs
+        return True
+
+    def mergeChildBounds(self, rows):
+        """
+        Set the subtree bounds of rows to their own box merged with the subtree bounds of their children
+
+        :param rows: row indices, sorted
+        :type rows: numpy.ndarray
+        """
+        mins = self.ownMins[rows]
+        maxs = self.ownMaxs[rows]
+        counts = self.childCounts[rows]
+        inner = counts > 0
+        if inner.any():
+            counts = counts[inner]
+            children = self.childRows(rows[inner])
+            offsets = np.cumsum(counts) - counts
+            mins[inner] = np.minimum(mins[inner], np.minimum.reduceat(self.worldMins[children], offsets))
+            maxs[inner] = np.maximum(maxs[inner], np.maximum.reduceat(self.worldMaxs[children], offsets))
+        self.worldMins[rows] = mins
+        self.worldMaxs[rows] = maxs
+
+    def cull(self, frustum):
+        """
+        Mark every row whose subtree bound lies outside the frustum, or whose ancestor's does, as invisible.
+        Repeated calls with the same frustum and unchanged bounds reuse the previous result.
+
+        :param frustum: view frustum in world space
+        :type frustum: Frustum
+        :return: visibility of every row
+        :rtype: numpy.ndarray (N,) bool
+        """
+        self.refreshBounds()
+        key = (frustum, self.boundsVersion)
+        if self.cullKey == key:
+            return self.visible
+        self.visible = ~frustum.outsideAABBs(self.worldMins, self.worldMaxs)
+        for start, end in self.levels[1:]:
+            self.visible[start:end] &= self.visible[self.parents[start:end]]
+        self.culledDraws = int(np.count_nonzero(self.drawables & ~self.visible))
+        self.cullKey = key
+        return self.visible
@@ -6,6 +6,9 @@ Modified by Daniel Scrivener 09/2023
 
 from collada import *
 from DisplayableMesh import DisplayableMesh
+from MeshCache import MeshCache
+from GeometryRegistry import GeometryRegistry
+from LOD import loadDecimated
 from Component import Component
 import GLUtility
 import ColorType
@@ -13,7 +16,27 @@ import numpy as np
 
 
 def getVertexData(filename):
-
+    """
+    Load the first triangle set of a .dae file, from the on-disk mesh cache when it is up to date
+
+    :param filename: .dae file to import
+    :type filename: string
+    :return: see parseVertexData. Arrays coming from the cache are read-only
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
+    return MeshCache.load(filename, parseVertexData)
+
+
+def parseVertexData(filename):
+    """
+    Parse the first triangle set of a .dae file
+
+    :param filename: .dae file to import
+    :type filename: string
+    :return: flattened vertices with 11 floats per vertex (position, empty normal, color and UV), \
+        and flattened triangle indices
+    :rtype: tuple[numpy.ndarray, numpy.ndarray]
+    """
     colladaData = Collada(filename)
 
     # generate vertices from model data
@@ -21,33 +44,42 @@ def getVertexData(filename):
 
     geo = colladaData.geometries[0]
     tridata = geo.primitives[0]
-    trilist = list(tridata)
-
-    # construct vertex list
-    vertices = np.array([])
 
-    for vert in tridata.vertex:
-        vert = np.concatenate((vert, [0.0, 0.0, 0.0]), axis=0)  # empty normals
-        vert = np.concatenate((vert, [0.0, 0.0, 0.0]), axis=0)  # color
-        vert = np.concatenate((vert, [0.0, 0.0]), axis=0)  # empty UV
-        vertices = np.append(vertices, vert)
+    # construct vertex list: positions followed by empty normals, color and UV
+    positions = np.asarray(tridata.vertex, dtype=np.float64)
+    vertices = np.zeros((len(positions), 11))
+    vertices[:, 0:3] = positions
 
-    # construct indices
-    indices = np.array([])
+    # construct indices, one row per triangle in tridata.vertex_index
+    indices = np.asarray(tridata.vertex_index, dtype=np.int32).reshape(-1)
 
-    for tri in trilist:
-        indices = np.append(indices, tri.indices)
-
-    return (vertices, indices)
+    return (vertices.reshape(-1), indices)
 
 
 class Shape(Component):
+    __slots__ = [
+        "mesh",  # DisplayableMesh
+    ]
+
     vertexData = None
     indexData = None
-    mesh = None
+
+    # .dae files of the full and low-poly geometry, loaded through GeometryRegistry on first use
+    pathname = None
+    pathnameLP = None
+    # optional extra detail levels generated by vertex clustering, as grid resolutions, see LOD.decimate
+    decimationCells = ()
 
     def __init__(
-        self, position, shaderProg, size, vertexData, indexData, color=ColorType.YELLOW
+        self,
+        position,
+        shaderProg,
+        size,
+        vertexData,
+        indexData,
+        color=ColorType.YELLOW,
+        geometryKey=None,
+        lodLevels=None,
     ):
         """
         :param position: location of the object
@@ -63,21 +95,59 @@ class Shape(Component):
         :param limb: sets the rotation behavior of the object. if true, rotations happen "at the joint" \
             rather than the object's center
         :type limb: boolean
+        :param geometryKey: shapes with the same key share one GPU copy of their geometry, see DisplayableMesh
+        :type geometryKey: hashable
+        :param lodLevels: GeometryRegistry keys of coarser detail levels, see DisplayableMesh
+        :type lodLevels: list or None
         """
-        self.mesh = DisplayableMesh(shaderProg, size, vertexData, indexData, color)
+        self.mesh = DisplayableMesh(
+            shaderProg, size, vertexData, indexData, color, geometryKey, lodLevels
+        )
         super(Shape, self).__init__(position, self.mesh)
 
+    @classmethod
+    def getGeometryKey(cls, lowPoly=False):
+        """
+        Registry key of this primitive's geometry, see GeometryRegistry
+
+        :param lowPoly: use the low-poly variant if the primitive has one
+        :type lowPoly: bool
+        :rtype: str
+        """
+        if lowPoly and cls.pathnameLP is not None:
+            return cls.pathnameLP
+        return cls.pathname
+
+    @classmethod
+    def getLODLevels(cls, lowPoly=False):
+        """
+        Coarser detail levels the shape can switch to at runtime: the low-poly variant, then the decimated levels.
+        Only their keys are returned; DisplayableMesh loads a level when it is first drawn at it.
+        A shape created with lowPoly stays at that level.
+
+        :param lowPoly: the shape always uses its low-poly variant
+        :type lowPoly: bool
+        :return: GeometryRegistry keys, from finer to coarser
+        :rtype: list
+        """
+        if lowPoly:
+            return []
+        keys = [] if cls.pathnameLP is None else [cls.pathnameLP]
+        # fewer grid cells merge more vertices, so the coarsest level comes last. Decimated levels are expected to
+        # be coarser than the low-poly variant
+        for cells in sorted(cls.decimationCells, reverse=True):
+            key = (cls.pathname, cells)
+            if not GeometryRegistry.isRegistered(key):
+                GeometryRegistry.register(key, loadDecimated, cls.pathname, getVertexData, cells)
+            keys.append(key)
+        return keys
+
 
 class Cone(Shape):
+    __slots__ = ()
 
     pathname = "assets/cone0.dae"
     pathnameLP = "assets/coneLP.dae"
-    data = getVertexData(pathname)
-    dataLP = getVertexData(pathnameLP)
-    vertices = data[0]
-    verticesLP = dataLP[0]
-    indices = data[1]
-    indicesLP = dataLP[1]
 
     def __init__(
         self,
@@ -98,31 +168,17 @@ class Cone(Shape):
         :param color: vertex color to be applied uniformly
         :type color: ColorType
         """
-        if lowPoly:
-            super(Cone, self).__init__(
-                position,
-                shaderProg,
-                size,
-                self.verticesLP.copy(),
-                self.indicesLP.copy(),
-                color,
-            )
-        else:
-            super(Cone, self).__init__(
-                position,
-                shaderProg,
-                size,
-                self.vertices.copy(),
-                self.indices.copy(),
-                color,
-            )
+        key = self.getGeometryKey(lowPoly)
+        vertices, indices = GeometryRegistry.get(key)
+        super(Cone, self).__init__(
+            position, shaderProg, size, vertices, indices, color, key, self.getLODLevels(lowPoly)
+        )
 
         # translate object by -z extent of the new component so that rotations occur @ the joint
         # rather than around the object's true center
-        glutility = GLUtility.GLUtility()
         if limb:
-            tIn = glutility.translate(0, 0, size[2], False)
-            tOut = glutility.translate(0, 0, -size[2], False)
+            tIn = GLUtility.GLUtility.translate(0, 0, size[2], False)
+            tOut = GLUtility.GLUtility.translate(0, 0, -size[2], False)
         else:
             tIn = np.identity(4)
             tOut = np.identity(4)
@@ -131,11 +187,9 @@ class Cone(Shape):
 
 
 class Cube(Shape):
+    __slots__ = ()
 
     pathname = "assets/cube0.dae"
-    data = getVertexData(pathname)
-    vertices = data[0]
-    indices = data[1]
 
     def __init__(self, position, shaderProg, size, color=ColorType.RED, limb=True):
         """
@@ -148,15 +202,16 @@ class Cube(Shape):
         :param color: vertex color to be applied uniformly
         :type color: ColorType
         """
+        key = self.getGeometryKey()
+        vertices, indices = GeometryRegistry.get(key)
         super(Cube, self).__init__(
-            position, shaderProg, size, self.vertices.copy(), self.indices.copy(), color
+            position, shaderProg, size, vertices, indices, color, key, self.getLODLevels()
         )
         # translate object by -z extent of the new component so that rotations occur @ the joint
         # rather than around the object's true center
-        glutility = GLUtility.GLUtility()
         if limb:
-            tIn = glutility.translate(0, 0, size[2] / 2, False)
-            tOut = glutility.translate(0, 0, -size[2] / 2, False)
+            tIn = GLUtility.GLUtility.translate(0, 0, size[2] / 2, False)
+            tOut = GLUtility.GLUtility.translate(0, 0, -size[2] / 2, False)
         else:
             tIn = np.identity(4)
             tOut = np.identity(4)
@@ -165,15 +220,10 @@ class Cube(Shape):
 
 
 class Cylinder(Shape):
+    __slots__ = ()
 
     pathname = "assets/cylinder0.dae"
     pathnameLP = "assets/cylinderLP.dae"
-    data = getVertexData(pathname)
-    dataLP = getVertexData(pathnameLP)
-    vertices = data[0]
-    verticesLP = dataLP[0]
-    indices = data[1]
-    indicesLP = dataLP[1]
 
     def __init__(
         self,
@@ -194,30 +244,16 @@ class Cylinder(Shape):
         :param color: vertex color to be applied uniformly
         :type color: ColorType
         """
-        if lowPoly:
-            super(Cylinder, self).__init__(
-                position,
-                shaderProg,
-                size,
-                self.verticesLP.copy(),
-                self.indicesLP.copy(),
-                color,
-            )
-        else:
-            super(Cylinder, self).__init__(
-                position,
-                shaderProg,
-                size,
-                self.vertices.copy(),
-                self.indices.copy(),
-                color,
-            )
+        key = self.getGeometryKey(lowPoly)
+        vertices, indices = GeometryRegistry.get(key)
+        super(Cylinder, self).__init__(
+            position, shaderProg, size, vertices, indices, color, key, self.getLODLevels(lowPoly)
+        )
         # translate object by -z extent of the new component so that rotations occur @ the joint
         # rather than around the object's true center
-        glutility = GLUtility.GLUtility()
         if limb:
-            tIn = glutility.translate(0, 0, size[2], False)
-            tOut = glutility.translate(0, 0, -size[2], False)
+            tIn = GLUtility.GLUtility.translate(0, 0, size[2], False)
+            tOut = GLUtility.GLUtility.translate(0, 0, -size[2], False)
         else:
             tIn = np.identity(4)
             tOut = np.identity(4)
@@ -226,15 +262,10 @@ class Cylinder(Shape):
 
 
 class Sphere(Shape):
+    __slots__ = ()
 
     pathname = "assets/sphere0.dae"
     pathnameLP = "assets/sphereLP.dae"
-    data = getVertexData(pathname)
-    dataLP = getVertexData(pathnameLP)
-    vertices = data[0]
-    verticesLP = dataLP[0]
-    indices = data[1]
-    indicesLP = dataLP[1]
 
     def __init__(
         self, position, shaderProg, size, color=ColorType.BLUE, limb=True, lowPoly=False
@@ -253,32 +284,63 @@ class Sphere(Shape):
             Set this to False for eyes or other ball joints.
         :type limb: boolean
         """
-        if lowPoly:
-            super(Sphere, self).__init__(
-                position,
-                shaderProg,
-                size,
-                self.verticesLP.copy(),
-                self.indicesLP.copy(),
-                color,
-            )
-        else:
-            super(Sphere, self).__init__(
-                position,
-                shaderProg,
-                size,
-                self.vertices.copy(),
-                self.indices.copy(),
-                color,
-            )
+        key = self.getGeometryKey(lowPoly)
+        vertices, indices = GeometryRegistry.get(key)
+        super(Sphere, self).__init__(
+            position, shaderProg, size, vertices, indices, color, key, self.getLODLevels(lowPoly)
+        )
         # translate object by -z extent of the new component so that rotations occur @ the joint
         # rather than around the object's true center
-        glutility = GLUtility.GLUtility()
         if limb:
-            tIn = glutility.translate(0, 0, size[2], False)
-            tOut = glutility.translate(0, 0, -size[2], False)
+            tIn = GLUtility.GLUtility.translate(0, 0, size[2], False)
+            tOut = GLUtility.GLUtility.translate(0, 0, -size[2], False)
         else:
             tIn = np.identity(4)
             tOut = np.identity(4)
         self.setPreRotation(tIn)
         self.setPostRotation(tOut)
+
+
+# geometry is only parsed when the first shape using it is created, or when it is preloaded
+for _shape in (Cone, Cube, Cylinder, Sphere):
+    for _pathname in (_shape.pathname, _shape.pathnameLP):
+        if _pathname is not None:
+            GeometryRegistry.register(_pathname, getVertexData, _pathname)
+
+
+if __name__ == "__main__":
+    import glob
+    import time
+
+    def getVertexDataLoop(filename):
+        # previous implementation, growing the arrays one vertex and one triangle at a time
+        tridata = Collada(filename).geometries[0].primitives[0]
+        vertices = np.array([])
+        for vert in tridata.vertex:
+            vert = np.concatenate((vert, [0.0] * 8), axis=0)
+            vertices = np.append(vertices, vert)
+        indices = np.array([])
+        for tri in list(tridata):
+            indices = np.append(indices, tri.indices)
+        return (vertices, indices)
+
+    repeat = 20
+    for pathname in sorted(glob.glob("assets/*.dae")):
+        t1 = time.perf_counter()
+        for _ in range(repeat):
+            old = getVertexDataLoop(pathname)
+        t2 = time.perf_counter()
+        for _ in range(repeat):
+            new = parseVertexData(pathname)
+        t3 = time.perf_counter()
+        getVertexData(pathname)  # make sure the cache entry exists
+        for _ in range(repeat):
+            cached = getVertexData(pathname)
+        t4 = time.perf_counter()
+        assert np.array_equal(old[0], new[0]) and np.array_equal(old[1], new[1])
+        assert np.array_equal(cached[0], new[0]) and np.array_equal(cached[1], new[1])
+        print(
+            f"{pathname}: {len(new[0]) // 11} vertices, {len(new[1]) // 3} triangles, "
+            f"loop {(t2 - t1) / repeat * 1000:.2f} ms, vectorised {(t3 - t2) / repeat * 1000:.2f} ms, "
+            f"cached {(t4 - t3) / repeat * 1000:.2f} ms"
+        )
@@ -0,0 +1,716 @@
+"""
+The scene and interaction logic of Sketch, without any dependency on wx.
+Sketch mixes it into its canvas; the headless replayer in Replay.py drives it directly, so recorded sessions can be
+played back and timed without a window.
+"""
+
+import math
+import time
+
+import numpy as np
+
+from ModelAxes import ModelAxes
+from ModelLinkage import *
+
+import ColorType
+from Point import Point
+from InstancedMesh import InstancedMesh
+from SkinnedMesh import SkinnedMesh
+from Animation import Clip, AnimationPlayer
+from IK import IKSolver
+from Picking import Picker
+from Collision import SelfCollision
+from Camera import Camera
+from InputCoalescer import InputCoalescer
+
+
+class SketchScene:
+    """
+    Scene state, per-frame work and the Interrupt_* handlers of Sketch.
+    The host provides topLevelComponent, scheduler and size, calls initScene once, buildScene once a shader program
+    (or None, without GL) is available, then advanceFrame and renderFrame for every frame.
+
+    Variable Instruction:
+        * debug(int): Define debug level for log printing
+
+        * 0 for stable version, minimum log is printed
+        * 1 will print general logs for lines and triangles
+        * 2 will print more details and do some type checking, which might be helpful in debugging
+    """
+
+    debug = 1
+
+    last_mouse_leftPosition = None
+    last_mouse_middlePosition = None
+    components = None
+
+    shaderProg = None
+
+    backgroundColor = None
+    # lookAtPt, upVector, cameraDis, cameraTheta, cameraPhi, viewMat and perspMat are properties forwarding to it
+    camera = None  # Camera
+    uploadedView = None  # camera.viewVersion of the view matrix last uploaded to the shader
+    clock = time.perf_counter  # time source of the animations, replaced by the recorded frame times in a replay
+
+    recomputedNodes = 0  # number of components whose transformation was rebuilt in the last frame
+    useLOD = True  # pick every mesh's detail level from its size on screen
+    useCulling = True  # skip parts outside the view frustum
+    culledDraws = 0  # number of parts skipped by culling in the last frame
+    frameTimes = None  # dict<str, float>, seconds spent in every stage of the last frame
+
+    # set by the canvas from mouse motion, see CanvasBase.OnMouseMotion
+    dragging_event = False
+    new_dragging_event = False
+
+    select_obj_index = -1  # index of selected component in self.components
+    select_axis_index = -1  # index of selected axis
+    select_color = [
+        ColorType.ColorType(1, 0, 0),
+        ColorType.ColorType(0, 1, 0),
+        ColorType.ColorType(0, 0, 1),
+    ]
+
+    # key codes of the non-character keys, the values wx uses
+    KEY_RETURN = 13
+    KEY_ESCAPE = 27
+    KEY_LEFT = 314
+    KEY_UP = 315
+    KEY_RIGHT = 316
+    KEY_DOWN = 317
+
+    # If you are having trouble rotating the camera, try increasing this parameter
+    # (Windows users with trackpads may need this)
+    MOUSE_ROTATE_SPEED = 1
+    MOUSE_SCROLL_SPEED = 2.5
+
+    def initScene(self):
+        """
+        Set the parameters that don't need the model or a GL context
+        """
+        # Initialize Parameters
+        self.last_mouse_leftPosition = [0, 0]
+        self.last_mouse_middlePosition = [0, 0]
+        self.backgroundColor = ColorType.BLUEGREEN
+        self.frameTimes = {}
+
+        self.camera = Camera()
+        self.resetView()
+
+        self.multi_mode = False
+        self.multi_index: list[int] = []
+
+    def resetView(self):
+        self.lookAtPt = [0, 0, 0]
+        self.upVector = [0, 1, 0]
+        self.cameraDis = 6
+        self.cameraPhi = math.pi / 6
+        self.cameraTheta = math.pi / 2
+
+    @property
+    def lookAtPt(self):
+        return self.camera.lookAtPt
+
+    @lookAtPt.setter
+    def lookAtPt(self, point):
+        self.camera.lookAtPt = point
+
+    @property
+    def upVector(self):
+        return self.camera.upVector
+
+    @upVector.setter
+    def upVector(self, vector):
+        self.camera.upVector = vector
+
+    # use these three to control camera position, mainly used in mouse dragging
+    @property
+    def cameraDis(self):
+        return self.camera.distance
+
+    @cameraDis.setter
+    def cameraDis(self, distance):
+        self.camera.distance = distance
+
+    @property
+    def cameraTheta(self):
+        # theta on horizontal sphere cut, in range [0, 2pi]
+        return self.camera.theta
+
+    @cameraTheta.setter
+    def cameraTheta(self, theta):
+        self.camera.theta = theta
+
+    @property
+    def cameraPhi(self):
+        # in range [-pi, pi], for smooth purpose
+        return self.camera.phi
+
+    @cameraPhi.setter
+    def cameraPhi(self, phi):
+        self.camera.phi = phi
+
+    @property
+    def viewMat(self):
+        return self.camera.viewMat
+
+    @property
+    def perspMat(self):
+        return self.camera.projectionMat
+
+    def getCameraPos(self):
+        return self.camera.getPosition()
+
+    def buildScene(self, shaderProg):
+        """
+        Create the model and everything that works on it
+
+        :param shaderProg: compiled shader program, None to build the scene without uploading anything to GL
+        :type shaderProg: GLProgram or None
+        """
+        self.shaderProg = shaderProg
+
+        ##### TODO 3: Initialize your model
+        # You should initialize your model here.
+        # self.topLevelComponent should refer to your model
+        # and self.components should refer to your model's components.
+        # Optionally, you can create a dictionary (self.cDict) to index your model's components by name.
+
+        # model = ModelLinkage(self, Point((0, 0, 0)), self.shaderProg)
+        self.model = Spider(self, Point((0, 0, 0)), self.shaderProg)
+        axes = ModelAxes(self, Point((-1, -1, -1)), self.shaderProg)
+
+        self.topLevelComponent.clear()
+        self.topLevelComponent.addChild(self.model)
+        self.topLevelComponent.addChild(axes)
+        if shaderProg is not None:
+            self.topLevelComponent.initialize()
+        else:
+            self.topLevelComponent.update()
+
+        # model edits from input handlers are queued and applied once per frame, see update and advanceFrame
+        self.input = InputCoalescer(self.topLevelComponent)
+
+        # the whole spider as one continuous mesh with smooth joints, toggled with "k"
+        self.skin = SkinnedMesh(self.shaderProg, self.model)
+        if shaderProg is not None:
+            self.skin.initialize()
+        self.model.skin = self.skin
+
+        # a copy, since picked parts are appended to it
+        self.components: list[Component] = list(self.model.componentList)
+        self.cDict: dict[str, Tail | Head | Body] = self.model.componentDict
+
+        # poses are played as keyframe animations, advanced once per frame in advanceFrame
+        self.animator = AnimationPlayer(self.model, clock=self.clock)
+        self.scheduler.addAnimationSource(self.animator.isPlaying)
+        self.walkClip = self.buildWalkClip()
+
+        # feet planted with "f" stay at their world positions while the body moves, solved every frame
+        body = self.cDict["body"]
+        self.legIK = IKSolver(
+            [[leg, leg.link1, leg.link2, leg.link3] for leg in (body.leftLegs | body.rightLegs).values()],
+            dofs=["v", "u", "u", "u"],
+        )
+        self.footTargets = None
+
+        # parts under the mouse are found by ray casting, see pick
+        self.picker = Picker(self.model)
+
+        # rotations that would push parts into each other are shortened, "x" switches the behavior
+        self.collision = SelfCollision(self.model)
+        self.model.collision = self.collision
+
+    def resize(self, width, height):
+        """
+        Fit the camera to a new canvas size. The GL viewport is the host's business
+
+        :type width: int
+        :type height: int
+        """
+        self.camera.setViewport(width, height)
+
+    def advanceFrame(self, now=None):
+        """
+        Everything a frame does before drawing: apply queued input, advance the animation, solve the planted feet
+        and update the hierarchy. Stage times go to frameTimes
+
+        :param now: clock time of the frame, read from clock if None
+        :type now: float or None
+        """
+        start = time.perf_counter()
+        self.input.flush()
+        inputDone = time.perf_counter()
+        self.animator.tick(now)
+        animationDone = time.perf_counter()
+        if self.footTargets is not None:
+            self.legIK.solve(self.footTargets)
+        ikDone = time.perf_counter()
+        self.recomputedNodes = self.topLevelComponent.update(np.identity(4))
+        updateDone = time.perf_counter()
+        self.frameTimes = {
+            "input": inputDone - start,
+            "animation": animationDone - inputDone,
+            "ik": ikDone - animationDone,
+            "update": updateDone - ikDone,
+        }
+
+    def renderFrame(self):
+        """
+        Draw the updated scene with the current GL context
+        """
+        start = time.perf_counter()
+        # the viewing matrix is only rebuilt and uploaded after the camera moved
+        if self.uploadedView != self.camera.viewVersion:
+            self.shaderProg.setMat4("viewMat", self.viewMat)
+            self.uploadedView = self.camera.viewVersion
+
+        lodView = self.camera.lodView if self.useLOD else None
+        # the same frustum object while the camera stands still, so the cull result is reused
+        frustum = self.camera.frustum if self.useCulling else None
+        self.topLevelComponent.draw(self.shaderProg, lodView, frustum)
+        self.culledDraws = self.topLevelComponent.getSceneGraph().culledDraws if frustum is not None else 0
+        # one draw call per primitive type for everything queued by draw()
+        InstancedMesh.drawAll(self.shaderProg)
+        self.frameTimes["draw"] = time.perf_counter() - start
+        if self.debug > 1:
+            print(f"frame: {self.recomputedNodes} nodes updated, {self.culledDraws} draws culled, "
+                  f"{InstancedMesh.drawCalls} instanced draw calls, {InstancedMesh.trianglesDrawn} triangles, "
+                  f"{1e6 * self.animator.lastSampleTime:.0f} us animation sampling, "
+                  f"{self.input.lastFlushEvents} input events applied as {self.input.lastFlushEdits} edits")
+            if self.footTargets is not None:
+                print(f"foot planting: {self.legIK.lastResult}")
+
+    def toggleRecording(self):
+        """
+        Start or stop recording the input, only possible on a live canvas
+        """
+        print("Input recording needs a live canvas")
+
+    def Interrupt_MouseMoving(self, x, y):
+        ##### TODO 6 (CS680 Required, CS480 Extra Credit): Eye movement
+        # Make your creature's eyes follow the cursor.
+        # The eye rotation only needs to work correctly when the creature is looking toward the viewer.
+        # You do not need to account for other camera orientations.
+        # Try to implement this using quaternions for additional credit!
+
+        head = self.cDict["head"]
+        leftEye: Eye = head.componentDict["leftEye"]
+        rightEye: Eye = head.componentDict["rightEye"]
+
+        x_diff_left = x - 212
+        x_diff_right = x - 288
+        y_diff = y - 180
+
+        left_theta = np.arctan(np.abs(y_diff / (x_diff_left + 0.01)))
+        right_theta = np.arctan(np.abs(y_diff / (x_diff_right + 0.01)))
+
+        left_pupil: Sphere = leftEye.componentDict["pupil"]
+        right_pupil: Sphere = rightEye.componentDict["pupil"]
+
+        # print(f"{x=}, {y=}")
+        # print(f"{x_diff_left=}, {x_diff_right=}, {y_diff=}")
+        # print(f"{left_theta=:.3f}, {right_theta=:.3f}")
+
+        self.input.setPosition(
+            left_pupil,
+            Point(
+                (
+                    0.03 * np.cos(left_theta) * (-1 if x_diff_left < 0 else 1),
+                    0.03 * np.sin(left_theta) * (-1 if y_diff < 0 else 1),
+                    left_pupil.currentPos.coords[2],
+                )
+            )
+        )
+
+        self.input.setPosition(
+            right_pupil,
+            Point(
+                (
+                    0.03 * np.cos(right_theta) * (-1 if x_diff_right < 0 else 1),
+                    0.03 * np.sin(right_theta) * (-1 if y_diff < 0 else 1),
+                    right_pupil.currentPos.coords[2],
+                )
+            )
+        )
+
+        return
+
+    def Interrupt_Scroll(self, wheelRotation):
+        """
+        When mouse wheel rotating detected, do following things
+
+        :param wheelRotation: mouse wheel changes, normally +120 or -120
+        :return: None
+        """
+        if wheelRotation == 0:
+            return
+        wheelChange = wheelRotation / abs(wheelRotation)  # normalize wheel change
+        if self.multi_mode:
+            for index in self.multi_index:
+                self.input.rotate(
+                    self.components[index],
+                    wheelChange * self.MOUSE_SCROLL_SPEED,
+                    self.components[self.select_obj_index].axisBucket[
+                        self.select_axis_index
+                    ],
+                )
+        elif len(self.components) > 0 and self.select_obj_index >= 0:
+            self.input.rotate(
+                self.components[self.select_obj_index],
+                wheelChange * self.MOUSE_SCROLL_SPEED,
+                self.components[self.select_obj_index].axisBucket[
+                    self.select_axis_index
+                ],
+            )
+        self.update()
+
+    def unprojectCanvas(self, x, y, u=0.5):
+        """
+        unproject a canvas point to world coordiantes. 2D -> 3D
+        you need give an extra parameter u, to tell the method how far are you from znear
+        u is the proportion of distance to znear / zfar-znear
+        in the gluUnProject, the distribution of z is not linear when using perspective projection,
+        so z=0.5 is not in the middle,
+        that's why we compute out the ray and use linear interpolation and u to get the point
+
+        :param u: u is the proportion to the znear/, in range [0, 1]
+        :type u: float
+        """
+        result1 = self._unproject(x, y, 0.0)
+        result2 = self._unproject(x, y, 1.0)
+        result = Point([(1 - u) * r1 + u * r2 for r1, r2 in zip(result1, result2)])
+        return result
+
+    def _unproject(self, x, y, z):
+        # the viewport always covers the whole canvas, see resize
+        return self.camera.unproject(x, y, z)
+
+    def Interrupt_MouseL(self, x, y):
+        """
+        When mouse click detected, store current position in last_mouse_leftPosition
+
+        :param x: Mouse click's x coordinate
+        :type x: int
+        :param y: Mouse click's y coordinate
+        :type y: int
+        :return: None
+        """
+        self.last_mouse_leftPosition[0] = x
+        self.last_mouse_leftPosition[1] = y
+        if self.dragging_event:
+            # the end of a camera drag, not a click
+            return
+
+        # select the part under the mouse, as if it had been selected with Enter
+        hit = self.pick(x, y)
+        if hit is None:
+            return
+        if hit.component not in self.components:
+            self.components.append(hit.component)
+        if self.select_obj_index >= 0:
+            self.components[self.select_obj_index].reset("color")
+        self.select_obj_index = self.components.index(hit.component)
+        self.select_axis_index = 0
+        hit.component.setCurrentColor(self.select_color[self.select_axis_index])
+        if self.debug > 0:
+            print(f"picked {hit} in {1e3 * self.picker.lastPickTime:.2f} ms, "
+                  f"{self.picker.partsTested} parts and {self.picker.trianglesTested} triangles tested")
+
+    def pick(self, x, y):
+        """
+        Nearest model part under a canvas point
+
+        :param x: canvas x coordinate
+        :type x: int
+        :param y: canvas y coordinate, from the bottom
+        :type y: int
+        :return: the hit, None if nothing is under the point
+        :rtype: PickResult or None
+        """
+        near, far = self.camera.unprojectRay(x, y)
+        return self.picker.pick(near, far - near)
+
+    def Interrupt_MouseMiddleDragging(self, x, y):
+        """
+        When mouse drag motion with middle key detected, interrupt with new mouse position
+
+        :param x: Mouse drag new position's x coordinate
+        :type x: int
+        :param y: Mouse drag new position's x coordinate
+        :type y: int
+        :return: None
+        """
+
+        if self.new_dragging_event:
+            self.last_mouse_middlePosition[0] = x
+            self.last_mouse_middlePosition[1] = y
+            return
+
+        dx = x - self.last_mouse_middlePosition[0]
+        dy = y - self.last_mouse_middlePosition[1]
+
+        originalMidPt = self.unprojectCanvas(*self.last_mouse_middlePosition, 0.5)
+
+        self.last_mouse_middlePosition[0] = x
+        self.last_mouse_middlePosition[1] = y
+
+        currentMidPt = self.unprojectCanvas(x, y, 0.5)
+        changes = currentMidPt - originalMidPt
+        moveSpeed = 0.185 * self.cameraDis / 6
+        self.lookAtPt = [
+            self.lookAtPt[0] - changes[0] * moveSpeed,
+            self.lookAtPt[1] - changes[1] * moveSpeed,
+            self.lookAtPt[2] - changes[2] * moveSpeed,
+        ]
+
+    def Interrupt_MouseLeftDragging(self, x, y):
+        """
+        When mouse drag motion detected, interrupt with new mouse position
+
+        :param x: Mouse drag new position's x coordinate
+        :type x: int
+        :param y: Mouse drag new position's x coordinate
+        :type y: int
+        :return: None
+        """
+
+        if self.new_dragging_event:
+            self.last_mouse_leftPosition[0] = x
+            self.last_mouse_leftPosition[1] = y
+            return
+
+        # Change viewing angle when dragging happened
+        dx = x - self.last_mouse_leftPosition[0]
+        dy = y - self.last_mouse_leftPosition[1]
+
+        # restrict phi movement range, stop cameraphi changes at pole points
+        self.cameraPhi = min(math.pi / 2, max(-math.pi / 2, self.cameraPhi - dy / 50))
+        self.cameraTheta += dx / 100 * (self.MOUSE_ROTATE_SPEED)
+
+        self.cameraTheta = self.cameraTheta % (2 * math.pi)
+
+        self.last_mouse_leftPosition[0] = x
+        self.last_mouse_leftPosition[1] = y
+
+    def update(self):
+        """
+        Update current canvas. The hierarchy is updated once at the start of the next frame, together with every
+        other queued input edit, however often this is called in between
+        :return: None
+        """
+        self.input.requestUpdate()
+
+    def buildWalkClip(self, period=1.2):
+        """
+        Looping walk cycle: every leg swings back and forth around its rest angle, neighbouring legs in opposite
+        phase, and lifts its first segment while swinging forward
+
+        :param period: seconds per step cycle
+        :type period: float
+        :rtype: Clip
+        """
+        body = self.cDict["body"]
+        frames = []
+        for t in np.linspace(0, period, 9):
+            phase = 2 * math.pi * t / period
+            pose = {}
+            for sign, legs in ((1, body.leftLegs), (-1, body.rightLegs)):
+                for i, (name, offset) in enumerate(zip(legs, [20, 0, -20])):
+                    # right legs step half a cycle after the left leg facing them
+                    swing = math.sin(phase + math.pi * (i + (sign < 0)))
+                    pose[f"body/{name}"] = {"v": sign * (90 + offset + 15 * swing)}
+                    pose[f"body/{name}/link1"] = {"u": -50 - 15 * max(0.0, swing)}
+            frames.append((float(t), pose))
+        return Clip.fromPoses("walk", frames)
+
+    def Interrupt_Keyboard(self, keycode):
+        # sourcery skip: extract-duplicate-method, extract-method
+        """
+        Keyboard interrupt bindings
+
+        :param keycode: wxpython keyboard event's keycode
+        :return: None
+        """
+
+        ##### TODO 5: Set up your poses and finish the user interface
+        # Define keyboard events to make your creature act in different ways when keys are pressed.
+        # Create five unique poses to demonstrate your creature's joint rotations.
+        # HINT: selecting individual components is easier if you create a dictionary of components (self.cDict)
+        # that can be indexed by name (e.g. self.cDict["leg1"] instead of self.components[10])
+
+        if keycode in [self.KEY_RETURN]:
+            # enter component editing mode
+
+            self.select_axis_index = 0
+
+            if len(self.components) > 0:
+                # reset color of last selected component
+                self.components[self.select_obj_index].reset("color")
+                # set new selected component & its color
+                self.select_obj_index = (self.select_obj_index + 1) % len(
+                    self.components
+                )
+                self.components[self.select_obj_index].setCurrentColor(
+                    self.select_color[self.select_axis_index]
+                )
+
+            self.update()
+        if keycode in [self.KEY_LEFT]:
+            self.select_axis_index = (self.select_axis_index - 1) % 3
+            if self.multi_mode:
+                for index in self.multi_index:
+                    self.components[index].setCurrentColor(
+                        self.select_color[self.select_axis_index]
+                    )
+            elif self.select_obj_index >= 0:
+                self.components[self.select_obj_index].setCurrentColor(
+                    self.select_color[self.select_axis_index]
+                )
+            self.update()
+        if keycode in [self.KEY_RIGHT]:
+            self.select_axis_index = (self.select_axis_index + 1) % 3
+            if self.multi_mode:
+                for index in self.multi_index:
+                    self.components[index].setCurrentColor(
+                        self.select_color[self.select_axis_index]
+                    )
+            elif self.select_obj_index >= 0:
+                self.components[self.select_obj_index].setCurrentColor(
+                    self.select_color[self.select_axis_index]
+                )
+            self.update()
+        if keycode in [self.KEY_UP]:
+            # Increase rotation angle
+            self.Interrupt_Scroll(1)
+            self.update()
+        if keycode in [self.KEY_DOWN]:
+            # Decrease rotation angle
+            self.Interrupt_Scroll(-1)
+            self.update()
+        if keycode in [self.KEY_ESCAPE]:
+            # exit component editing mode
+            self.components[self.select_obj_index].reset("color")
+            self.select_obj_index = -1
+            self.select_axis_index = -1
+            self.update()
+        if chr(keycode) in "r":
+            # reset viewing angle only
+            print("Reset View")
+            self.resetView()
+        if chr(keycode) in "R":
+            # reset everything
+            print("Reset Everything")
+            self.input.discard()
+            self.multi_mode = False
+            self.multi_index = []
+            self.model.setCurrentPosition(self.model.initPos)
+            for c in self.components:
+                c.reset()
+            self.animator.stop()
+            self.footTargets = None
+            self.resetView()
+            self.select_obj_index = -1
+            self.select_axis_index = -1
+            self.update()
+        if chr(keycode) in "a":
+            # attack
+            print("Attack!")
+            self.animator.transition(
+                {
+                    "tail": {"u": -30},
+                    "tail/link2": {"u": -70},
+                    "tail/link4": {"u": 0},
+                    "tail/needle": {"u": 10},
+                },
+                0.3,
+            )
+        if chr(keycode) in "A":
+            # attack
+            print("Reset Attack!")
+            self.animator.stop()
+            tail = self.cDict["tail"]
+            tail.reset("all")
+        if chr(keycode) in "o":
+            # open mouth
+            print("Open Mouth")
+            self.animator.transition({"head/leftTooth": {"v": 20}, "head/rightTooth": {"v": -20}}, 0.2)
+        if chr(keycode) in "c":
+            # close mouth
+            print("Close Mouth")
+            self.animator.transition({"head/leftTooth": {"v": -20}, "head/rightTooth": {"v": 20}}, 0.2)
+        if chr(keycode) in "j":
+            # jump
+            print("Jump")
+            pose = {"": {"position": (0, 1, 0)}}
+            for name, leg in (self.cDict["body"].leftLegs | self.cDict["body"].rightLegs).items():
+                pose[f"body/{name}/link2"] = {"u": 130}
+                pose[f"body/{name}/link3"] = {"u": -10}
+                # the jump also sets the foot's default angle, as it did before the pose was animated
+                leg.componentDict["link3"].default_uAngle = -10
+            self.animator.transition(pose, 0.4)
+        if chr(keycode) in "w":
+            # walk, press again to stop
+            if self.animator.clip is self.walkClip and self.animator.isPlaying():
+                print("Stop Walking")
+                self.animator.stop()
+            else:
+                print("Walk")
+                self.animator.play(self.walkClip, speed=1.0, loop=True)
+        if chr(keycode) in "f":
+            # plant or release the feet
+            if self.footTargets is None:
+                # plant them where the queued edits put them
+                self.input.flush()
+                self.footTargets = self.legIK.effectorPositions()
+                print("Feet planted")
+            else:
+                self.footTargets = None
+                print("Feet released")
+        if chr(keycode) in "+-":
+            # change playback speed of the running animation
+            self.animator.speed *= 1.25 if chr(keycode) == "+" else 0.8
+            print(f"Animation speed {self.animator.speed:.2f}x")
+
+        if chr(keycode) in "k":
+            self.skin.enabled = not self.skin.enabled
+            print(f"Skinned mesh {'on' if self.skin.enabled else 'off'}: "
+                  f"{len(self.skin.bones)} bones, {len(self.skin.indices) // 3} triangles")
+
+        if chr(keycode) in "x":
+            modes = SelfCollision.MODES
+            self.collision.mode = modes[(modes.index(self.collision.mode) + 1) % len(modes)]
+            print(f"Self-collision {self.collision.mode}: {len(self.collision.pairs)} pairs, "
+                  f"{self.collision.rejectedMoves} moves and {self.collision.rejectedBatchJoints} batched joints "
+                  f"limited so far")
+
+        if chr(keycode) in "I":
+            # record the input of this session, see Replay.py to play it back
+            self.toggleRecording()
+
+        if chr(keycode) in "M":
+            print("Exiting Multi-Select Mode")
+            self.multi_mode = False
+
+            for index in self.multi_index:
+                self.components[index].resetColor()
+
+            self.multi_index = []
+        if chr(keycode) in "m":
+            print("Entering Multi-Select Mode")
+            print(
+                f"press number key from 0-{len(self.components)-1} to select/unselect components"
+            )
+            print("press M to exit multi-select model")
+            self.multi_mode = True
+            self.select_axis_index = 0
+        if chr(keycode) in "0123456789":
+            if not self.multi_mode:
+                print("not in multi-select mode")
+            else:
+                self.multi_index.append(int(chr(keycode)))
+
+                if len(self.components) > 0:
+                    for index in self.multi_index:
+                        self.components[index].setCurrentColor(
+                            self.select_color[self.select_axis_index]
+                        )
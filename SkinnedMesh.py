@@ -0,0 +1,177 @@
+"""
+Skinned meshes: every part of a hierarchy merged into one continuous mesh, drawn with a single draw call.
+Each vertex is moved by a blend of two bones, the part it belongs to and that part's parent, so the mesh bends
+smoothly at the joints instead of showing rigid segments. Bone matrices come from the hierarchy's world transforms
+and are uploaded as one uniform array per frame.
+"""
+
+import numpy as np
+
+from Displayable import Displayable
+from DisplayableMesh import DisplayableMesh
+from GLBuffer import VAO, VBO, EBO
+from GLProgram import GLProgram
+
+
+class SkinnedMesh(Displayable):
+    """
+    One mesh for a whole Component subtree, with two joint indices and weights per vertex.
+    Vertices are stored in the bind pose, the pose of the hierarchy when the skin was built, and bone i moves them by
+    worldMat_i @ inverse(bindWorldMat_i).
+
+    To draw it instead of the parts, assign it to the root's skin and set enabled, see Component.draw
+    """
+    shaderProg = None
+    root = None  # Component the skin was built from
+    bones = None  # list<Component>, bone i is bones[i]
+    inverseBindMats = None  # (B, 4, 4) inverse world matrices of the bones in the bind pose
+    palette = None  # (B, 4, 4) bone matrices of the current frame
+    colors = None  # (B, 3) bone colors of the current frame
+
+    vertices = None  # (N, 11) bind pose vertices in world space, same layout as DisplayableMesh
+    joints = None  # (N, 4) two bone indices followed by their weights
+    indices = None  # flattened triangle indices
+
+    enabled = False  # Component.draw draws the skin instead of the parts while this is set
+    blendFraction = 0.35  # length of the blended region at a joint, as a fraction of the part's largest extent
+
+    boneScene = None  # SceneGraph boneRows were resolved in
+    boneRows = None  # (B,) int, scene rows of the bones
+
+    vao = None
+    vbo = None
+    jointVbo = None
+    ebo = None
+
+    def __init__(self, shaderProg, root, blendFraction=0.35):
+        """
+        Merge the meshes of root and everything below it, in the hierarchy's current pose
+
+        :param shaderProg: compiled shader program
+        :type shaderProg: GLProgram
+        :param root: top of the subtree to skin
+        :type root: Component
+        :param blendFraction: see the class attribute
+        :type blendFraction: float
+        """
+        super(SkinnedMesh, self).__init__()
+        self.shaderProg = shaderProg
+        self.root = root
+        self.blendFraction = blendFraction
+        self.bones = []
+        boneIndex = {}
+
+        def getBone(component):
+            if id(component) not in boneIndex:
+                boneIndex[id(component)] = len(self.bones)
+                self.bones.append(component)
+            return boneIndex[id(component)]
+
+        root.update()
+        vertexArrays = []
+        jointArrays = []
+        indexArrays = []
+        vertexCount = 0
+        stack = [root]
+        while stack:
+            part = stack.pop()
+            stack.extend(reversed(part.children))
+            mesh = part.displayObj
+            if not isinstance(mesh, DisplayableMesh):
+                continue
+            if mesh.instanced:
+                vertexData, indexData = mesh.levels[0].vertices, mesh.levels[0].indices
+            else:
+                vertexData, indexData = mesh.vertices, mesh.indices
+
+            # move the part's vertices into the bind pose
+            modelMat = mesh.getModelMatrix(part.transformationMat)
+            vertices = np.array(vertexData, dtype=np.float64).reshape(-1, 11)
+            vertices[:, 0:3] = vertices[:, 0:3] @ modelMat[:3, :3].T + modelMat[:3, 3]
+            normals = vertices[:, 3:6] @ np.linalg.inv(modelMat[:3, :3])
+            vertices[:, 3:6] = normals / np.maximum(np.linalg.norm(normals, axis=1), 1e-12)[:, None]
+
+            joints = np.zeros((len(vertices), 4))
+            joints[:, 0] = getBone(part)
+            joints[:, 2] = 1.0
+            if part is not root and part.parent is not None:
+                # the joint is the point the part rotates around, where its pre-rotation moves the origin to
+                pivot = (part.transformationMat @ np.linalg.inv(part.preRotationMat))[:3, 3]
+                radius = self.blendFraction * max(float(np.ptp(vertices[:, 0:3], axis=0).max()), 1e-12)
+                distances = np.linalg.norm(vertices[:, 0:3] - pivot, axis=1)
+                # half parent, half part right at the joint, only the part beyond radius
+                weights = 0.5 + 0.5 * np.clip(distances / radius, 0.0, 1.0)
+                joints[:, 1] = getBone(part.parent)
+                joints[:, 2] = weights
+                joints[:, 3] = 1.0 - weights
+
+            vertexArrays.append(vertices)
+            jointArrays.append(joints)
+            indexArrays.append(np.asarray(indexData).reshape(-1) + vertexCount)
+            vertexCount += len(vertices)
+
+        if len(self.bones) > GLProgram.maxBones:
+            raise Exception(f"Cannot skin {len(self.bones)} bones, the shader holds at most {GLProgram.maxBones}")
+
+        self.vertices = np.concatenate(vertexArrays) if vertexArrays else np.zeros((0, 11))
+        self.joints = np.concatenate(jointArrays) if jointArrays else np.zeros((0, 4))
+        self.indices = np.concatenate(indexArrays) if indexArrays else np.zeros(0, dtype=np.int32)
+        self.inverseBindMats = np.linalg.inv(np.array([b.transformationMat for b in self.bones]).reshape(-1, 4, 4))
+        self.palette = np.tile(np.identity(4), (len(self.bones), 1, 1))
+        self.colors = np.ones((len(self.bones), 3))
+
+    def updatePalette(self):
+        """
+        Read the bone matrices and colors of the current frame from the hierarchy
+
+        :return: bone matrices, row-major
+        :rtype: numpy.ndarray (B, 4, 4)
+        """
+        scene = self.root.getSceneGraph()
+        if scene is not self.boneScene:
+            # rows change whenever the hierarchy storage is rebuilt
+            self.boneRows = np.array([b._index for b in self.bones], dtype=np.intp)
+            self.boneScene = scene
+        np.matmul(scene.worldMats[self.boneRows], self.inverseBindMats, out=self.palette)
+        for i, bone in enumerate(self.bones):
+            self.colors[i] = bone.current_color
+        return self.palette
+
+    def draw(self):
+        """
+        Upload the bone palette and draw the whole mesh in one call
+        """
+        self.updatePalette()
+        self.shaderProg.setBool("useSkinning", True)
+        self.shaderProg.setMat4Array("bonePalette", self.palette.transpose(0, 2, 1))
+        self.shaderProg.setVec3Array("boneColors", self.colors)
+        self.vao.bind()
+        self.ebo.draw()
+        self.vao.unbind()
+        self.shaderProg.setBool("useSkinning", False)
+
+    def initialize(self):
+        self.vao = VAO()
+        self.vbo = VBO()
+        self.jointVbo = VBO()
+        self.ebo = EBO()
+
+        self.vao.bind()
+        self.vbo.setBuffer(self.vertices, 11)
+        self.ebo.setBuffer(self.indices)
+
+        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexPos"),
+                                  stride=11, offset=0, attribSize=3)
+        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexNormal"),
+                                  stride=11, offset=3, attribSize=3)  # unused
+        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexColor"),
+                                  stride=11, offset=6, attribSize=3)
+        self.vbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexTexture"),
+                                  stride=11, offset=9, attribSize=2)  # unused
+
+        self.jointVbo.setBuffer(self.joints, 4)
+        self.jointVbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexJoints"),
+                                       stride=4, offset=0, attribSize=2)
+        self.jointVbo.setAttribPointer(self.shaderProg.getAttribLocation("vertexJointWeights"),
+                                       stride=4, offset=2, attribSize=2)
+        self.vao.unbind()